@@ -0,0 +1,95 @@
+import uuid
+from collections import namedtuple
+
+from flask_login import UserMixin
+from sqlalchemy.exc import IntegrityError
+
+from app import app, db
+from models import User
+from cache import TTLCache, invalidate_on_commit
+import replicas
+
+# Guest accounts. Checking out without an account records the order against
+# a User row that has no password hash: creating it costs one INSERT and no
+# password hashing, and nobody can log in to it. The guest becomes a real
+# account when they sign up with the same email address.
+#
+# Logged-in requests see the user through a small cached UserIdentity
+# rather than the ORM row, so Flask-Login doesn't query the user table on
+# every request.
+
+
+def get_or_create_guest(email, name=None):
+    """
+    Get the ID of the account for a checkout email, creating a guest account if there is none.
+
+    The caller commits the session. Two checkouts racing to create the same
+    guest both succeed: the loser's insert is rolled back to a savepoint and
+    it uses the winner's row.
+
+    Args:
+        email: Email address given at checkout
+        name: Customer name, used as the start of the guest's username
+
+    Returns:
+        ID of the existing or new user
+    """
+    user_id = db.session.query(User.id).filter_by(email=email).scalar()
+    if user_id is not None:
+        return user_id
+
+    base = (name or email.split('@')[0]).strip()[:48] or 'guest'
+    user = User(username=f'{base}-{uuid.uuid4().hex[:8]}', email=email)
+    try:
+        with db.session.begin_nested():
+            db.session.add(user)
+    except IntegrityError:
+        return db.session.query(User.id).filter_by(email=email).scalar()
+    return user.id
+
+
+def get_guest(email):
+    """Get the guest account for an email address, or None if there is none or it has a password."""
+    user = User.query.filter_by(email=email).first()
+    return user if user is not None and user.is_guest else None
+
+
+class UserIdentity(UserMixin, namedtuple('UserIdentity', ['id', 'username', 'accessibility_prefs'])):
+    """
+    The logged-in user as seen by Flask-Login's current_user: just the
+    columns requests need, detached from any database session.
+    """
+
+
+# Process-local cache of user id -> UserIdentity, so authenticated requests
+# don't load the user row on every request
+_identities = TTLCache(maxsize=app.config['USER_CACHE_SIZE'], ttl=app.config['USER_CACHE_TTL'])
+
+
+def load_identity(user_id):
+    """
+    Get the identity of a user for Flask-Login.
+
+    Args:
+        user_id: User ID stored in the login session
+
+    Returns:
+        UserIdentity, or None if the user doesn't exist
+    """
+    identity = _identities.get(user_id)
+    if identity is None:
+        with replicas.on_primary():
+            row = db.session.query(User.id, User.username, User.accessibility_prefs).filter_by(id=user_id).first()
+        if row is None:
+            return None
+        identity = UserIdentity(row.id, row.username, row.accessibility_prefs)
+        _identities.set(user_id, identity)
+    return identity
+
+
+def invalidate_identities(changes):
+    for _, user_id in changes:
+        _identities.pop(user_id)
+
+
+invalidate_on_commit(User, invalidate_identities)
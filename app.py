@@ -5,16 +5,21 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from sqlalchemy.orm import DeclarativeBase
+from jinja2 import FileSystemBytecodeCache
 from werkzeug.middleware.proxy_fix import ProxyFix
 
+import db_engine
+import replicas
+import server_session
+
 # Set up logging
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper())
 
 class Base(DeclarativeBase):
     pass
 
 
-db = SQLAlchemy(model_class=Base)
+db = SQLAlchemy(model_class=Base, session_options={"class_": replicas.RoutingSession})
 login_manager = LoginManager()
 
 # Create the app
@@ -32,27 +37,119 @@ elif database_url.startswith("postgres://"):
     database_url = database_url.replace("postgres://", "postgresql://", 1)
 
 app.config["SQLALCHEMY_DATABASE_URI"] = database_url
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
+# PostgreSQL connection pool: connections kept open, extra connections
+# allowed under load, seconds to wait for one, and seconds before a
+# connection is replaced. Pre-ping (a round trip per checkout) is off by default.
+app.config["DB_POOL_SIZE"] = int(os.environ.get("DB_POOL_SIZE", 5))
+app.config["DB_MAX_OVERFLOW"] = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+app.config["DB_POOL_TIMEOUT"] = int(os.environ.get("DB_POOL_TIMEOUT", 30))
+app.config["DB_POOL_RECYCLE"] = int(os.environ.get("DB_POOL_RECYCLE", 300))
+app.config["DB_POOL_PRE_PING"] = os.environ.get("DB_POOL_PRE_PING", "0") == "1"
+# PostgreSQL statement timeout in milliseconds (0 disables it)
+app.config["DB_STATEMENT_TIMEOUT_MS"] = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", 30000))
+# Executions after which psycopg 3 prepares a statement server-side (unset: driver default)
+prepare_threshold = os.environ.get("DB_PREPARE_THRESHOLD")
+app.config["DB_PREPARE_THRESHOLD"] = int(prepare_threshold) if prepare_threshold else None
+
+# SQLite pragmas applied to every new connection (an empty value skips one)
+app.config["SQLITE_JOURNAL_MODE"] = os.environ.get("SQLITE_JOURNAL_MODE", "WAL")
+app.config["SQLITE_SYNCHRONOUS"] = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+app.config["SQLITE_BUSY_TIMEOUT_MS"] = os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000")
+# Negative values are KiB, so -64000 is a 64 MB page cache per connection
+app.config["SQLITE_CACHE_SIZE"] = os.environ.get("SQLITE_CACHE_SIZE", "-64000")
+app.config["SQLITE_MMAP_SIZE"] = os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))
+
+# Read replicas for read-only views (comma-separated URLs; unset reads from the primary)
+app.config["DATABASE_REPLICA_URLS"] = [
+    url.strip() for url in os.environ.get("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+# Seconds between health checks of each replica
+app.config["REPLICA_HEALTH_CHECK_INTERVAL"] = int(os.environ.get("REPLICA_HEALTH_CHECK_INTERVAL", 10))
+# Seconds a client reads from the primary after a write, longer than the replicas' lag
+app.config["READ_AFTER_WRITE_SECONDS"] = int(os.environ.get("READ_AFTER_WRITE_SECONDS", 10))
+
+# Product listing page sizes
+app.config["PRODUCTS_PER_PAGE"] = int(os.environ.get("PRODUCTS_PER_PAGE", 24))
+app.config["PRODUCTS_MAX_PER_PAGE"] = int(os.environ.get("PRODUCTS_MAX_PER_PAGE", 96))
+
+# Seconds before the process-local category cache is reloaded
+app.config["CATEGORY_CACHE_TTL"] = int(os.environ.get("CATEGORY_CACHE_TTL", 300))
+
+# Seconds shared caches (a CDN or reverse proxy) may serve catalog pages to anonymous visitors
+app.config["CATALOG_PAGE_SHARED_MAX_AGE"] = int(os.environ.get("CATALOG_PAGE_SHARED_MAX_AGE", 60))
+
+# Serve the plain static files instead of the built, fingerprinted assets
+app.config["ASSETS_DEBUG"] = os.environ.get("ASSETS_DEBUG", "0") == "1"
+
+# Number of rendered product cards kept in the fragment cache
+app.config["PRODUCT_CARD_CACHE_SIZE"] = int(os.environ.get("PRODUCT_CARD_CACHE_SIZE", 5000))
+
+# Seconds before the in-memory product name index is rebuilt from the database
+app.config["PRODUCT_NAME_INDEX_TTL"] = int(os.environ.get("PRODUCT_NAME_INDEX_TTL", 600))
+
+# Maximum number of utterances accepted by /process_voice_commands
+app.config["VOICE_BATCH_LIMIT"] = int(os.environ.get("VOICE_BATCH_LIMIT", 50))
+
+# Stripe webhook signing secret. Without one, paid checkout sessions are
+# fulfilled on the payment success page instead of by the webhook worker.
+app.config["STRIPE_WEBHOOK_SECRET"] = os.environ.get("STRIPE_WEBHOOK_SECRET")
+app.config["FULFILL_INLINE"] = os.environ.get(
+    "FULFILL_INLINE", "0" if app.config["STRIPE_WEBHOOK_SECRET"] else "1") == "1"
+
+# Number of fulfilled checkout sessions whose order id is kept in memory
+app.config["FULFILLED_SESSION_CACHE_SIZE"] = int(os.environ.get("FULFILLED_SESSION_CACHE_SIZE", 4096))
+
+# Add a Server-Timing header (app, db and template time) to every response
+app.config["SERVER_TIMING"] = os.environ.get("SERVER_TIMING", "0") == "1"
+# Bearer token required to read /metrics (404 when unset)
+app.config["METRICS_TOKEN"] = os.environ.get("METRICS_TOKEN")
+
+# Record each request's SQL statements and warn about N+1 patterns and views
+# over their query budget (always on when app.testing is set)
+app.config["QUERY_PROFILER"] = os.environ.get("QUERY_PROFILER", "0") == "1"
+# Times one statement shape may repeat in a request before it is reported
+app.config["QUERY_N_PLUS_ONE_THRESHOLD"] = int(os.environ.get("QUERY_N_PLUS_ONE_THRESHOLD", 5))
+
+# Most password hashes computed at once per process (0 for no limit)
+app.config["PASSWORD_HASH_WORKERS"] = int(os.environ.get("PASSWORD_HASH_WORKERS", 2))
+
+# Logged-in user identities cached per process (seconds, entries)
+app.config["USER_CACHE_TTL"] = int(os.environ.get("USER_CACHE_TTL", 300))
+app.config["USER_CACHE_SIZE"] = int(os.environ.get("USER_CACHE_SIZE", 10000))
+
+# Where session data is kept: 'cookie' is Flask's signed cookie session,
+# 'sqlite' stores it server-side and only puts a signed session id in the
+# cookie. The SQLite file is local to one host, so only use it where every
+# request reaches the same host (not on autoscale deployments)
+app.config["SESSION_BACKEND"] = os.environ.get("SESSION_BACKEND", "cookie")
+# SQLite file for the 'sqlite' backend (defaults to instance/sessions.db)
+app.config["SESSION_DB_PATH"] = os.environ.get("SESSION_DB_PATH")
+
 # Initialize the app with the extensions
+db_engine.init_app(app)
 db.init_app(app)
+replicas.init_app(app)
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 login_manager.login_message = 'Please log in to access this page.'
+server_session.init_app(app)
 
 @login_manager.user_loader
 def load_user(user_id):
-    from models import User
-    return User.query.get(int(user_id))
-
-with app.app_context():
-    # Import models here
-    import models  # noqa: F401
-    import routes
-    
-    db.create_all()
-    routes.create_sample_data()
+    import accounts
+    return accounts.load_identity(int(user_id))
+
+# Compiled templates are kept on disk so new workers don't recompile them
+# (set JINJA_BYTECODE_CACHE_DIR to an empty value to disable)
+jinja_cache_dir = os.environ.get("JINJA_BYTECODE_CACHE_DIR", os.path.join(app.instance_path, "jinja_cache"))
+if jinja_cache_dir:
+    os.makedirs(jinja_cache_dir, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(jinja_cache_dir)
+
+# Register models, routes and CLI commands. Importing the app does no
+# database work: the schema and sample data are created by the explicit
+# `flask init-db` and `flask seed-db` commands.
+import models  # noqa: F401, E402
+import routes  # noqa: F401, E402
+import database  # noqa: F401, E402
@@ -0,0 +1,289 @@
+import os
+import re
+import gzip
+import json
+import hashlib
+import logging
+import threading
+
+import click
+from flask import url_for, request, send_from_directory, abort
+
+from app import app
+
+try:
+    import brotli
+except ImportError:  # Optional: without it only .gz copies are built
+    brotli = None
+
+# Static asset pipeline. `flask --app main assets build` minifies the CSS and
+# JavaScript under static/, writes each file under a name containing a hash
+# of its contents to static/dist/ with precompressed .gz (and .br, when the
+# brotli package is installed) copies, and records the names in a manifest.
+# asset_url() emits the hashed URL so browsers can cache the files forever;
+# without a build it falls back to the plain static URL.
+
+ASSET_EXTENSIONS = ('.css', '.js')
+DIST_DIR = os.path.join(app.static_folder, 'dist')
+MANIFEST_PATH = os.path.join(DIST_DIR, 'manifest.json')
+
+# Hashed file names never change content, so they may be cached for a year
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+_manifest = None
+_manifest_lock = threading.Lock()
+
+_IDENTIFIER_CHAR = re.compile(r'[\w$\\]')
+# Characters after which a slash starts a regular expression rather than a division
+_REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^')
+_REGEX_KEYWORDS = ('return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'void', 'delete', 'throw', 'new')
+
+
+def minify_js(source):
+    """
+    Strip comments and indentation from JavaScript.
+
+    Strings, template literals and regular expressions are copied verbatim.
+    Line breaks are kept (collapsed to one) so automatic semicolon insertion
+    behaves exactly as in the source; other whitespace is dropped unless it
+    separates two identifiers or two operators that would otherwise merge.
+    """
+    out = []
+    i, n = 0, len(source)
+    pending_space = pending_newline = False
+    templates = []  # brace depth inside each open template literal ${...}
+
+    def last_significant():
+        text = ''.join(out[-3:]).rstrip()
+        return text[-1] if text else ''
+
+    def ends_with_postfix_operator():
+        # `i++ / 2`: after a postfix ++ or -- a slash is a division
+        return ''.join(out[-2:]).rstrip().endswith(('++', '--'))
+
+    def ends_with_keyword():
+        text = ''.join(out[-12:])
+        return any(re.search(rf'(^|[^\w$]){keyword}$', text) for keyword in _REGEX_KEYWORDS)
+
+    def emit(text):
+        nonlocal pending_space, pending_newline
+        if out:
+            prev = out[-1][-1]
+            if pending_newline:
+                out.append('\n')
+            elif pending_space and (
+                    (_IDENTIFIER_CHAR.match(prev) and _IDENTIFIER_CHAR.match(text[0]))
+                    or (prev in '+-' and text[0] == prev)):
+                out.append(' ')
+        pending_space = pending_newline = False
+        out.append(text)
+
+    def copy_template(start):
+        # Copy template literal text from start up to and including the closing
+        # backtick, or up to an opening ${ whose expression is then minified
+        j = start
+        while j < n:
+            if source[j] == '\\':
+                j += 2
+            elif source[j] == '`':
+                return j + 1, False
+            elif source.startswith('${', j):
+                return j + 2, True
+            else:
+                j += 1
+        return n, False
+
+    while i < n:
+        char = source[i]
+        if char in ' \t\r\n':
+            if char == '\n':
+                pending_newline = True
+            else:
+                pending_space = True
+            i += 1
+        elif source.startswith('//', i):
+            end = source.find('\n', i)
+            i = n if end == -1 else end
+        elif source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            comment = source[i:n if end == -1 else end]
+            i = n if end == -1 else end + 2
+            # A comment spanning lines counts as a line break for semicolon insertion
+            if '\n' in comment:
+                pending_newline = True
+            else:
+                pending_space = True
+        elif char in '\'"':
+            j = i + 1
+            while j < n and source[j] != char:
+                j += 2 if source[j] == '\\' else 1
+            emit(source[i:j + 1])
+            i = j + 1
+        elif char == '`':
+            end, opens_expression = copy_template(i + 1)
+            emit(source[i:end])
+            if opens_expression:
+                templates.append(0)
+            i = end
+        elif char == '}' and templates and templates[-1] == 0:
+            # End of a ${...} expression: continue the template literal
+            templates.pop()
+            end, opens_expression = copy_template(i + 1)
+            emit(source[i:end])
+            if opens_expression:
+                templates.append(0)
+            i = end
+        elif char == '/' and not ends_with_postfix_operator() and (
+                last_significant() in _REGEX_PRECEDERS or not out or ends_with_keyword()):
+            j, in_class = i + 1, False
+            while j < n and (in_class or source[j] != '/'):
+                if source[j] == '\\':
+                    j += 1
+                elif source[j] == '[':
+                    in_class = True
+                elif source[j] == ']':
+                    in_class = False
+                j += 1
+            j += 1
+            while j < n and source[j].isalpha():  # flags
+                j += 1
+            emit(source[i:j])
+            i = j
+        else:
+            if templates:
+                if char == '{':
+                    templates[-1] += 1
+                elif char == '}':
+                    templates[-1] -= 1
+            emit(char)
+            i += 1
+    return ''.join(out).strip() + '\n'
+
+
+def minify_css(source):
+    """Strip comments and insignificant whitespace from CSS."""
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    source = re.sub(r'\s*([{};,>])\s*', r'\1', source)
+    source = re.sub(r':\s+', ':', source)
+    return source.replace(';}', '}').strip() + '\n'
+
+
+_MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+def _source_files():
+    for root, dirs, files in os.walk(app.static_folder):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != DIST_DIR)
+        for filename in sorted(files):
+            if filename.endswith(ASSET_EXTENSIONS):
+                path = os.path.join(root, filename)
+                yield os.path.relpath(path, app.static_folder).replace(os.sep, '/'), path
+
+
+def build_assets():
+    """
+    Build minified, content-hashed and precompressed copies of the static assets.
+
+    Returns:
+        The manifest: dict of source name (e.g. 'js/voice_control.js') -> hashed name
+    """
+    global _manifest
+    manifest = {}
+    for name, path in _source_files():
+        with open(path, encoding='utf-8') as f:
+            source = f.read()
+        stem, extension = os.path.splitext(name)
+        data = _MINIFIERS[extension](source).encode('utf-8')
+        hashed = f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{extension}'
+
+        target = os.path.join(DIST_DIR, hashed)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(data)
+        with open(target + '.gz', 'wb') as f:
+            f.write(gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(target + '.br', 'wb') as f:
+                f.write(brotli.compress(data, quality=11))
+
+        manifest[name] = hashed
+        logging.info(f"Built {hashed}: {len(source)} -> {len(data)} bytes")
+
+    with open(MANIFEST_PATH, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    _manifest = None
+    return manifest
+
+
+def _load_manifest():
+    """Get (manifest, digest) for the built assets, read from disk on first use."""
+    global _manifest
+    if _manifest is None:
+        with _manifest_lock:
+            if _manifest is None:
+                try:
+                    with open(MANIFEST_PATH, 'rb') as f:
+                        raw = f.read()
+                    _manifest = (json.loads(raw), hashlib.sha1(raw).hexdigest())
+                except (OSError, ValueError):
+                    _manifest = ({}, None)
+    return _manifest
+
+
+def manifest_digest():
+    """Hash of the current asset manifest, or None if the assets haven't been built."""
+    return _load_manifest()[1]
+
+
+def asset_url(filename):
+    """
+    URL for a file under static/, like url_for('static', filename=...).
+
+    Built assets get their hashed, long-cached URL; anything else (or every
+    file, before `flask assets build` has run) gets the plain static URL.
+    """
+    hashed = _load_manifest()[0].get(filename)
+    if hashed is None or app.config['ASSETS_DEBUG']:
+        return url_for('static', filename=filename)
+    return url_for('built_asset', filename=hashed)
+
+
+@app.route('/assets/<path:filename>')
+def built_asset(filename):
+    """Serve a built asset, precompressed if the client accepts it, with immutable cache headers."""
+    if filename.endswith(('.gz', '.br')):
+        abort(404)
+
+    encodings = request.accept_encodings
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if encodings[encoding] and os.path.isfile(os.path.join(DIST_DIR, filename + suffix)):
+            response = send_from_directory(DIST_DIR, filename + suffix,
+                                           mimetype=_mimetype(filename), max_age=31536000)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(DIST_DIR, filename, max_age=31536000)
+
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def _mimetype(filename):
+    return 'text/css' if filename.endswith('.css') else 'text/javascript'
+
+
+app.add_template_global(asset_url)
+
+
+@app.cli.group('assets')
+def assets_cli():
+    """Build the static asset bundle."""
+
+
+@assets_cli.command('build')
+def build_command():
+    """Minify, fingerprint and precompress the CSS and JavaScript under static/."""
+    manifest = build_assets()
+    click.echo(f"Built {len(manifest)} assets into {DIST_DIR}")
@@ -0,0 +1,103 @@
+"""
+Benchmark the order write path.
+
+Measures orders per second for carts of 1, 10 and 100 lines using the bulk
+write path in orders.create_order, next to the previous per-row ORM path
+(flush the Order for its id, then add each OrderItem) for comparison.
+
+Usage:
+    python benchmarks/bench_orders.py [--orders N] [--database-url URL]
+
+Without --database-url a throwaway SQLite file is used.
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import importlib
+import tempfile
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def legacy_create_order(db, Order, OrderItem, user_id, cart_items, total, address):
+    order = Order(user_id=user_id, total_amount=total, shipping_address=address)
+    db.session.add(order)
+    db.session.flush()
+    for item in cart_items:
+        product = item['product']
+        db.session.add(OrderItem(
+            order_id=order.id,
+            product_id=product.id,
+            product_name=product.name,
+            quantity=item['quantity'],
+            price=product.price
+        ))
+    return order.id
+
+
+def run(orders_per_size, sizes):
+    from app import app, db
+    from models import User, Product, Category, Order, OrderItem
+    import orders
+
+    with app.app_context():
+        category = Category.query.first()
+        needed = max(sizes) - Product.query.count()
+        for i in range(max(needed, 0)):
+            db.session.add(Product(name=f'Benchmark product {i}', description='Synthetic product',
+                                   price=9.99, category_id=category.id))
+        user = User.query.filter_by(username='bench-orders').first()
+        if not user:
+            user = User(username='bench-orders', email='bench-orders@example.com')
+            db.session.add(user)
+        db.session.commit()
+
+        # Plain copies, so commits don't expire them and add reload queries to the timings
+        products = [SimpleNamespace(id=p.id, name=p.name, price=p.price)
+                    for p in Product.query.order_by(Product.id).limit(max(sizes))]
+        writers = {
+            'legacy': lambda *args: legacy_create_order(db, Order, OrderItem, *args),
+            'bulk': orders.create_order,
+        }
+
+        print(f"{'lines':>6} {'path':>8} {'orders/s':>10}")
+        for size in sizes:
+            cart_items = [{'product': p, 'quantity': 2, 'subtotal': p.price * 2} for p in products[:size]]
+            total = sum(item['subtotal'] for item in cart_items)
+            for name, write in writers.items():
+                start = time.perf_counter()
+                for _ in range(orders_per_size):
+                    write(user.id, cart_items, total, '1 Benchmark Road')
+                    db.session.commit()
+                elapsed = time.perf_counter() - start
+                print(f"{size:>6} {name:>8} {orders_per_size / elapsed:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--orders', type=int, default=200, help='orders written per cart size and path')
+    parser.add_argument('--database-url', help='database to write to (default: temporary SQLite file)')
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_orders.db')
+
+    logging.disable(logging.INFO)
+    importlib.import_module('main')  # registers the models and routes
+
+    import database
+    from app import app
+    with app.app_context():
+        database.init_db()
+        database.seed_db()
+
+    run(args.orders, [1, 10, 100])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark worker startup: import-to-first-request time.
+
+Starts fresh Python processes that import the app the way a gunicorn worker
+does and then serve one request for the home page, and reports how long the
+import and the first request took. The database is created and seeded once
+beforehand with the init-db and seed-db commands, as in a deployment.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs N] [--path /] [--json FILE]
+
+Without --database-url a throwaway SQLite file is used.
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run in each child process; prints the timings as JSON
+WORKER_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+response = main.app.test_client().get(sys.argv[1])
+served = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({'import_ms': (imported - start) * 1000, 'first_request_ms': (served - imported) * 1000}))
+"""
+
+
+def run_worker(path, env):
+    result = subprocess.run([sys.executable, '-c', WORKER_SCRIPT, path], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10, help='worker processes to start')
+    parser.add_argument('--path', default='/', help='URL requested as the first request')
+    parser.add_argument('--database-url', help='database to use (default: temporary SQLite file)')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    env = dict(os.environ, PYTHONPATH=ROOT, LOG_LEVEL='WARNING',
+               SESSION_DB_PATH=os.path.join(workdir, 'sessions.db'),
+               JINJA_BYTECODE_CACHE_DIR=os.path.join(workdir, 'jinja_cache'))
+    env['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(workdir, 'bench_startup.db')
+
+    for command in ('init-db', 'seed-db'):
+        subprocess.run([sys.executable, '-m', 'flask', '--app', 'main', command], cwd=ROOT, env=env,
+                       capture_output=True, check=True)
+
+    runs = [run_worker(args.path, env) for _ in range(args.runs)]
+
+    results = {}
+    print(f"{'phase':>16} {'median ms':>10} {'min ms':>8} {'max ms':>8}")
+    for phase in ('import_ms', 'first_request_ms', 'total_ms'):
+        values = [run['import_ms'] + run['first_request_ms'] if phase == 'total_ms' else run[phase]
+                  for run in runs]
+        results[phase] = {'median': statistics.median(values), 'min': min(values), 'max': max(values)}
+        print(f"{phase:>16} {results[phase]['median']:>10.1f} {results[phase]['min']:>8.1f} "
+              f"{results[phase]['max']:>8.1f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'path': args.path, 'runs': args.runs, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+"""
+Benchmark the voice command parser.
+
+Compares commands per second of voice_commands.process_command against the
+previous implementation, which rebuilt its rule tables and ran up to a dozen
+separate re.search calls per command, and checks that both return the same
+results for every command in the corpus.
+
+Usage:
+    python benchmarks/bench_voice_commands.py [--rounds N]
+"""
+import os
+import re
+import sys
+import time
+import logging
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import voice_commands  # noqa: E402
+
+CORPUS = [
+    'search for audio books',
+    'Search braille t-shirt',
+    'show me electronics products',
+    'show clothing category',
+    'add accessible smartphone to my cart',
+    'add the kitchen timer to cart',
+    'go to my cart',
+    'go to checkout',
+    'go home',
+    'next page',
+    'go to the previous page',
+    'go back',
+    'go forward',
+    'pay now',
+    'complete my purchase',
+    'proceed to payment',
+    'increase text size',
+    'decrease text size',
+    'enable high contrast',
+    'disable voice commands',
+    'read this page',
+    'describe page',
+    'what time is it',
+    'hello there',
+    'please add tactile timer to cart and then search for audio',
+    '   SHOW ME BOOKS PRODUCTS   ',
+]
+
+
+def legacy_process_command(command_text):
+    """Voice command parser as it was before the grammar was compiled at import."""
+    command = command_text.lower().strip()
+    logging.debug(f"Processing voice command: {command}")
+    
+    # Search commands
+    search_match = re.search(r'search (?:for )?(.*)', command)
+    if search_match:
+        search_term = search_match.group(1).strip()
+        return {
+            'success': True,
+            'action': 'search',
+            'data': {'search_term': search_term},
+            'message': f'Searching for {search_term}'
+        }
+    
+    # Category navigation
+    category_match = re.search(r'show (?:me )?(.*?)(?:\s+products|category)', command)
+    if category_match:
+        category = category_match.group(1).strip()
+        return {
+            'success': True,
+            'action': 'navigate',
+            'data': {'location': 'category', 'category': category},
+            'message': f'Showing {category} products'
+        }
+    
+    # Add to cart
+    cart_match = re.search(r'add (.*?) to (?:my )?cart', command)
+    if cart_match:
+        product = cart_match.group(1).strip()
+        return {
+            'success': True,
+            'action': 'cart',
+            'data': {'operation': 'add', 'product': product},
+            'message': f'Adding {product} to your cart'
+        }
+    
+    # Navigation commands
+    nav_matches = {
+        r'go to (?:my )?(cart|checkout|home|products)': lambda m: (
+            'navigate', {'location': m.group(1)}, f'Going to {m.group(1)}'
+        ),
+        r'(?:go to )?(?:the )?(next|previous) page': lambda m: (
+            'navigate', {'page': m.group(1)}, f'Going to {m.group(1)} page'
+        ),
+        r'go (back|forward)': lambda m: (
+            'navigate', {'direction': m.group(1)}, f'Going {m.group(1)}'
+        ),
+        r'(checkout|pay now|proceed to payment|complete( my)? purchase)': lambda m: (
+            'navigate', {'location': 'checkout'}, 'Proceeding to checkout'
+        )
+    }
+    
+    for pattern, handler in nav_matches.items():
+        match = re.search(pattern, command)
+        if match:
+            action, data, message = handler(match)
+            return {'success': True, 'action': action, 'data': data, 'message': message}
+    
+    # Accessibility commands
+    accessibility_matches = {
+        r'(increase|decrease) text size': lambda m: (
+            'accessibility', {'setting': 'text_size', 'value': m.group(1)}, 
+            f'{m.group(1).capitalize()}ing text size'
+        ),
+        r'(enable|disable) high contrast': lambda m: (
+            'accessibility', 
+            {'setting': 'high_contrast', 'value': m.group(1) == 'enable'}, 
+            f'{"Enabling" if m.group(1) == "enable" else "Disabling"} high contrast mode'
+        ),
+        r'(enable|disable) voice commands': lambda m: (
+            'accessibility', 
+            {'setting': 'voice_commands', 'value': m.group(1) == 'enable'}, 
+            f'{"Enabling" if m.group(1) == "enable" else "Disabling"} voice commands'
+        ),
+        r'(read|describe) (this|page)': lambda m: (
+            'accessibility', {'setting': 'read_page', 'value': True},
+            'Reading page content'
+        )
+    }
+    
+    for pattern, handler in accessibility_matches.items():
+        match = re.search(pattern, command)
+        if match:
+            action, data, message = handler(match)
+            return {'success': True, 'action': action, 'data': data, 'message': message}
+    
+    # If no command matched
+    return {
+        'success': False,
+        'message': "I didn't understand that command. Please try again."
+    }
+
+
+def measure(parse, commands, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for command in commands:
+            parse(command)
+    elapsed = time.perf_counter() - start
+    return rounds * len(commands) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the voice command parser')
+    parser.add_argument('--rounds', type=int, default=2000, help='passes over the command corpus')
+    args = parser.parse_args()
+
+    logging.disable(logging.DEBUG)
+
+    mismatches = [command for command in CORPUS
+                  if voice_commands.process_command(command) != legacy_process_command(command)]
+    if mismatches:
+        print('Results differ from the previous implementation for:')
+        for command in mismatches:
+            print(f'  {command!r}')
+        sys.exit(1)
+
+    results = [('previous', measure(legacy_process_command, CORPUS, args.rounds))]
+
+    # Measure the compiled grammar alone by bypassing the parse cache
+    cached_parse = voice_commands._parse
+    voice_commands._parse = cached_parse.__wrapped__
+    try:
+        results.append(('compiled', measure(voice_commands.process_command, CORPUS, args.rounds)))
+    finally:
+        voice_commands._parse = cached_parse
+    results.append(('compiled+cache', measure(voice_commands.process_command, CORPUS, args.rounds)))
+
+    print(f"{'parser':>16} {'commands/s':>12} {'speedup':>8}")
+    for name, rate in results:
+        print(f"{name:>16} {rate:>12.0f} {rate / results[0][1]:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
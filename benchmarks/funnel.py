@@ -0,0 +1,317 @@
+"""
+Load-test the shopping funnel and report per-step latency percentiles.
+
+Each virtual user walks the funnel: home page, product search, voice command,
+add to cart, update cart, checkout page, order form, then a second cart paid
+through the fake Stripe gateway (create checkout session and payment success
+page). Steps are timed individually and reported as throughput and
+p50/p95/p99 latency.
+
+The app runs either in this process through the Flask test client
+(--mode inprocess, the default) or in a local gunicorn (--mode gunicorn),
+against a throwaway SQLite database seeded with a synthetic catalog.
+
+Usage:
+    python benchmarks/funnel.py [--users N] [--concurrency N] [--products N] [--cart-lines N]
+                                [--mode inprocess|gunicorn] [--workers N] [--output FILE]
+                                [--baseline FILE]
+    python benchmarks/funnel.py --compare BASELINE.json CURRENT.json
+
+--output saves the results as JSON; --baseline compares the run with saved
+results, and --compare compares two saved files without running anything.
+"""
+import os
+import re
+import sys
+import json
+import time
+import socket
+import random
+import logging
+import argparse
+import tempfile
+import statistics
+import subprocess
+import threading
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+STEPS = ('index', 'search', 'voice_command', 'add_to_cart', 'update_cart', 'checkout',
+         'process_order', 'stripe_checkout', 'payment_success')
+
+SEARCH_TERMS = ('braille', 'audio', 'shirt', 'reader', 'product', 'tactile', 'large print')
+WORDS = ('tactile', 'audio', 'braille', 'large', 'print', 'voice', 'smart', 'cotton', 'reader',
+         'speaker', 'keyboard', 'magnifier', 'watch', 'lamp', 'mug', 'cane', 'guide', 'book')
+
+_token_pattern = re.compile(r'name="checkout_token" value="(\w+)"')
+
+
+class InProcessClient:
+    """Flask test client for one virtual user."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data)
+        return response.status_code, response.headers.get('Location'), response.get_data(as_text=True)
+
+
+class HttpClient:
+    """HTTP client with its own cookie jar for one virtual user."""
+
+    def __init__(self, base_url):
+        import requests
+        self.base_url = base_url
+        self.session = requests.Session()
+
+    def request(self, method, path, data=None):
+        url = path if path.startswith('http') else self.base_url + path
+        response = self.session.request(method, url, data=data, allow_redirects=False, timeout=30)
+        return response.status_code, response.headers.get('Location'), response.text
+
+
+def run_user(client, products, cart_lines, record):
+    """Walk one virtual user through the funnel, recording each step's latency."""
+    def step(name, method, path, data=None, expect=(200,)):
+        start = time.perf_counter()
+        try:
+            status, location, body = client.request(method, path, data)
+        except Exception:
+            record(name, time.perf_counter() - start, False)
+            return None, None
+        record(name, time.perf_counter() - start, status in expect)
+        return location, body
+
+    cart = random.sample(products, min(cart_lines, len(products)))
+
+    step('index', 'GET', '/')
+    step('search', 'GET', f'/products?search={random.choice(SEARCH_TERMS)}')
+    step('voice_command', 'POST', '/process_voice_command',
+         {'command': f'add {random.choice(products)[1]} to cart'})
+    for product_id, _ in cart:
+        step('add_to_cart', 'POST', '/add_to_cart', {'product_id': product_id, 'quantity': 1}, expect=(302,))
+    step('update_cart', 'POST', '/update_cart', {'product_id': cart[0][0], 'quantity': 2}, expect=(302,))
+
+    _, body = step('checkout', 'GET', '/checkout')
+    match = _token_pattern.search(body or '')
+    step('process_order', 'POST', '/process_order', {
+        'name': 'Load Test', 'email': f'load-{random.getrandbits(48):x}@example.com',
+        'address': '1 Test Street', 'checkout_token': match.group(1) if match else ''
+    }, expect=(302,))
+
+    # Second cart, paid through the fake Stripe gateway
+    for product_id, _ in cart:
+        step('add_to_cart', 'POST', '/add_to_cart', {'product_id': product_id, 'quantity': 1}, expect=(302,))
+    location, _ = step('stripe_checkout', 'POST', '/create-checkout-session',
+                       {'checkout_token': f'{random.getrandbits(64):x}'}, expect=(302,))
+    if location:
+        step('payment_success', 'GET', location, expect=(302,))
+
+
+def seed_catalog(product_count):
+    """Create the schema, the sample data and synthetic products up to product_count. Returns [(id, name)]."""
+    from app import app, db
+    from models import Category, Product
+    import database
+
+    with app.app_context():
+        database.init_db()
+        database.seed_db()
+        categories = [category.id for category in Category.query.all()]
+        rng = random.Random(42)
+        missing = product_count - Product.query.count()
+        for i in range(max(missing, 0)):
+            name = ' '.join(rng.sample(WORDS, 3)).title() + f' {i}'
+            db.session.add(Product(name=name, description=f'Synthetic product {i} for load tests',
+                                   price=round(rng.uniform(1, 300), 2), category_id=rng.choice(categories),
+                                   audio_description=f'Audio description of {name}'))
+        db.session.commit()
+        return [(product.id, product.name) for product in Product.query.with_entities(Product.id, Product.name)]
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_gunicorn(workers, env):
+    port = _free_port()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+         '--log-level', 'warning', 'main:app'],
+        cwd=ROOT, env=env)
+    base_url = f'http://127.0.0.1:{port}'
+    import requests
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            requests.get(base_url + '/', timeout=5)
+            return process, base_url
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError('gunicorn did not start')
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples, errors, elapsed):
+    results = {}
+    for name in STEPS:
+        values = sorted(samples.get(name, []))
+        if not values:
+            continue
+        results[name] = {
+            'count': len(values),
+            'errors': errors.get(name, 0),
+            'throughput': len(values) / elapsed,
+            'mean_ms': statistics.fmean(values) * 1000,
+            'p50_ms': percentile(values, 0.50) * 1000,
+            'p95_ms': percentile(values, 0.95) * 1000,
+            'p99_ms': percentile(values, 0.99) * 1000,
+        }
+    return results
+
+
+def print_results(results, journeys_per_second):
+    print(f"{'step':>16} {'count':>6} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, result in results.items():
+        print(f"{name:>16} {result['count']:>6} {result['errors']:>6} {result['throughput']:>8.1f} "
+              f"{result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f}")
+    print(f"funnel journeys/s: {journeys_per_second:.2f}")
+
+
+def compare(baseline, current):
+    """Print the change of each step's throughput and percentiles between two result files."""
+    print(f"{'step':>16} {'req/s':>16} {'p50 ms':>20} {'p95 ms':>20} {'p99 ms':>20}")
+
+    def change(old, new):
+        return f"{new:.2f} ({(new - old) / old * 100:+.0f}%)" if old else f"{new:.2f}"
+
+    for name in STEPS:
+        old, new = baseline['steps'].get(name), current['steps'].get(name)
+        if not old or not new:
+            continue
+        print(f"{name:>16} {change(old['throughput'], new['throughput']):>16} "
+              f"{change(old['p50_ms'], new['p50_ms']):>20} {change(old['p95_ms'], new['p95_ms']):>20} "
+              f"{change(old['p99_ms'], new['p99_ms']):>20}")
+    print(f"funnel journeys/s: {change(baseline['journeys_per_second'], current['journeys_per_second'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--mode', choices=('inprocess', 'gunicorn'), default='inprocess')
+    parser.add_argument('--users', type=int, default=50, help='virtual users, each walking the funnel once')
+    parser.add_argument('--warmup', type=int, default=5, help='untimed users run first')
+    parser.add_argument('--concurrency', type=int, default=1, help='users running at the same time')
+    parser.add_argument('--products', type=int, default=1000, help='catalog size')
+    parser.add_argument('--cart-lines', type=int, default=3, help='products added to each cart')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers (gunicorn mode)')
+    parser.add_argument('--seed', type=int, default=1, help='random seed for the scenario')
+    parser.add_argument('--output', help='save results to this JSON file')
+    parser.add_argument('--baseline', help='compare the results with this saved JSON file')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'),
+                        help='compare two saved result files and exit')
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f, open(args.compare[1]) as g:
+            compare(json.load(f), json.load(g))
+        return
+
+    workdir = tempfile.mkdtemp()
+    os.environ.update({
+        'DATABASE_URL': 'sqlite:///' + os.path.join(workdir, 'funnel.db'),
+        'SESSION_DB_PATH': os.path.join(workdir, 'sessions.db'),
+        'JINJA_BYTECODE_CACHE_DIR': os.path.join(workdir, 'jinja_cache'),
+        'PAYMENT_GATEWAY': 'fake',
+        'LOG_LEVEL': 'WARNING',
+    })
+    os.environ.pop('STRIPE_WEBHOOK_SECRET', None)  # fulfill on the payment success page
+    logging.disable(logging.WARNING)
+    random.seed(args.seed)
+
+    products = seed_catalog(args.products)
+
+    gunicorn = None
+    if args.mode == 'gunicorn':
+        gunicorn, base_url = start_gunicorn(args.workers, dict(os.environ, PYTHONPATH=ROOT))
+        make_client = lambda: HttpClient(base_url)
+    else:
+        from app import app
+        make_client = lambda: InProcessClient(app)
+
+    samples = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    recording = False
+
+    def record(name, seconds, ok):
+        if not recording:
+            return
+        with lock:
+            samples[name].append(seconds)
+            if not ok:
+                errors[name] += 1
+
+    def run_users(count):
+        remaining = iter(range(count))
+        remaining_lock = threading.Lock()
+
+        def worker():
+            while True:
+                with remaining_lock:
+                    if next(remaining, None) is None:
+                        return
+                run_user(make_client(), products, args.cart_lines, record)
+
+        threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    try:
+        run_users(args.warmup)
+        recording = True
+        start = time.perf_counter()
+        run_users(args.users)
+        elapsed = time.perf_counter() - start
+    finally:
+        if gunicorn is not None:
+            gunicorn.terminate()
+            gunicorn.wait()
+
+    results = {
+        'mode': args.mode,
+        'users': args.users,
+        'concurrency': args.concurrency,
+        'products': args.products,
+        'cart_lines': args.cart_lines,
+        'workers': args.workers if args.mode == 'gunicorn' else None,
+        'elapsed_s': elapsed,
+        'journeys_per_second': args.users / elapsed,
+        'steps': summarize(samples, errors, elapsed),
+    }
+    print_results(results['steps'], results['journeys_per_second'])
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            print()
+            compare(json.load(f), results)
+
+
+if __name__ == '__main__':
+    main()
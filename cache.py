@@ -0,0 +1,113 @@
+import time
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+# Small process-local caching helpers shared by the catalog, account and
+# rendering layers. Each gunicorn worker keeps its own copy, so entries are
+# given a TTL to bound how stale another worker's writes can appear.
+
+_MISSING = object()
+_PENDING_KEY = 'pending_commit_callbacks'
+
+
+class TTLCache:
+    """
+    Thread-safe mapping with optional per-entry expiry and LRU eviction.
+
+    Args:
+        maxsize: Maximum number of entries, or None for unbounded
+        ttl: Seconds an entry stays valid, or None to keep it until evicted
+    """
+
+    def __init__(self, maxsize=None, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            value, expires = entry
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            if self.maxsize is not None:
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+
+    def get_or_set(self, key, factory):
+        """Return the cached value for key, computing and storing it with factory() on a miss."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self.set(key, value)
+        return value
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+def invalidate_on_commit(model, callback, snapshot=None):
+    """
+    Call ``callback(changes)`` after any commit that inserted, updated or deleted ``model`` rows.
+
+    Changes are collected while the session flushes and only delivered once
+    the transaction commits, so a rolled-back write never evicts a cache entry
+    and a reader cannot re-cache the old row between the flush and the commit.
+
+    Args:
+        model: Mapped class to watch
+        callback: Function receiving a list of (operation, value) tuples, where
+            operation is 'insert', 'update' or 'delete'
+        snapshot: Function turning the written object into the value passed to
+            the callback. Defaults to the object's ``id``.
+    """
+    def record(operation):
+        def listener(mapper, connection, target):
+            value = snapshot(target) if snapshot else target.id
+            session = object_session(target)
+            if session is None:
+                callback([(operation, value)])
+                return
+            pending = session.info.setdefault(_PENDING_KEY, {})
+            pending.setdefault(callback, []).append((operation, value))
+        return listener
+
+    for operation in ('insert', 'update', 'delete'):
+        event.listen(model, f'after_{operation}', record(operation))
+
+
+@event.listens_for(Session, 'after_commit')
+def _run_commit_callbacks(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        for callback, changes in pending.items():
+            callback(changes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_commit_callbacks(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,87 @@
+from collections import namedtuple
+
+from flask import g, has_app_context
+from sqlalchemy import event, update, insert
+from sqlalchemy.orm import Session, object_session
+
+from app import app, db
+from models import Category, Product, CatalogVersion
+from cache import TTLCache, invalidate_on_commit
+import replicas
+
+# Process-local cache of catalog navigation data. Categories are read on
+# nearly every browse request but change very rarely, so they are loaded
+# once per TTL and dropped whenever a Category row is written.
+#
+# The catalog version is a database counter bumped in the same transaction
+# as any product or category write. Pages and fragments derived from the
+# catalog use it to tell whether they are still current.
+
+CategoryInfo = namedtuple('CategoryInfo', ['id', 'name', 'description'])
+
+_categories = TTLCache(ttl=app.config['CATEGORY_CACHE_TTL'])
+
+
+def _load_category_map():
+    with replicas.on_primary():
+        rows = db.session.query(Category.id, Category.name, Category.description).order_by(Category.id).all()
+    return {row.id: CategoryInfo(row.id, row.name, row.description) for row in rows}
+
+
+def get_category_map():
+    """Get all categories as a dict of id -> CategoryInfo, in id order."""
+    return _categories.get_or_set('categories', _load_category_map)
+
+
+def get_categories():
+    """Get all categories as a list of CategoryInfo."""
+    return list(get_category_map().values())
+
+
+def category_name(category_id):
+    """Look up a category's name by id, or return None if it doesn't exist."""
+    category = get_category_map().get(category_id)
+    return category.name if category else None
+
+
+def invalidate_categories(changes=None):
+    _categories.clear()
+
+
+invalidate_on_commit(Category, invalidate_categories)
+
+
+_VERSION_BUMPED_KEY = 'catalog_version_bumped'
+
+
+def catalog_version():
+    """Get the current catalog version number. It is read once per request."""
+    if 'catalog_version' not in g:
+        g.catalog_version = db.session.query(CatalogVersion.version).filter_by(id=1).scalar() or 0
+    return g.catalog_version
+
+
+def _bump_catalog_version(mapper, connection, target):
+    # Bump once per flush, inside the flush's transaction
+    session = object_session(target)
+    if session is not None and session.info.get(_VERSION_BUMPED_KEY):
+        return
+    bumped = connection.execute(
+        update(CatalogVersion).where(CatalogVersion.id == 1).values(version=CatalogVersion.version + 1)
+    ).rowcount
+    if not bumped:
+        connection.execute(insert(CatalogVersion).values(id=1, version=1))
+    if has_app_context():
+        g.pop('catalog_version', None)
+    if session is not None:
+        session.info[_VERSION_BUMPED_KEY] = True
+
+
+@event.listens_for(Session, 'after_flush')
+def _reset_catalog_version_flag(session, flush_context):
+    session.info.pop(_VERSION_BUMPED_KEY, None)
+
+
+for _model in (Product, Category):
+    for _operation in ('insert', 'update', 'delete'):
+        event.listen(_model, f'after_{_operation}', _bump_catalog_version)
@@ -0,0 +1,40 @@
+import click
+
+from app import app, db
+import routes
+import migrations
+
+# Database setup commands. These used to run on every import of the app, so
+# each gunicorn worker repeated them at startup and raced the others on the
+# sample data inserts; now they run once, before the server starts:
+#
+#     flask --app main init-db
+#     flask --app main seed-db
+#
+# A database created by an earlier release is brought up to date with
+# `flask --app main db-upgrade` (see migrations.py).
+
+
+def init_db():
+    """Create any missing tables, then bring an existing database's schema up to date."""
+    db.create_all()
+    migrations.upgrade()
+
+
+def seed_db():
+    """Load the sample categories and products into an empty catalog."""
+    routes.create_sample_data()
+
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create the database tables and apply pending migrations."""
+    init_db()
+    click.echo('Database initialized')
+
+
+@app.cli.command('seed-db')
+def seed_db_command():
+    """Load the sample catalog if the database has no categories yet."""
+    seed_db()
+    click.echo('Sample data loaded')
@@ -0,0 +1,85 @@
+import sqlite3
+import logging
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+
+# Backend-specific engine settings. SQLite connections get pragmas on
+# connect: WAL journaling so readers aren't blocked by a writer, NORMAL
+# sync (safe with WAL, one fsync per checkpoint instead of per commit), a
+# busy timeout so concurrent writers wait instead of failing, and a larger
+# page cache and memory map. SQLite connections are local, so they are not
+# pinged or recycled. PostgreSQL gets a sized pool with an overflow limit, a
+# server-side statement timeout and, with psycopg 3, prepared statements.
+# Pool pre-ping costs a round trip per checkout and is off by default;
+# recycling connections covers idle disconnects.
+
+
+def _postgresql_options(config, url):
+    options = {
+        "pool_size": config["DB_POOL_SIZE"],
+        "max_overflow": config["DB_MAX_OVERFLOW"],
+        "pool_timeout": config["DB_POOL_TIMEOUT"],
+        "pool_recycle": config["DB_POOL_RECYCLE"],
+        "pool_pre_ping": config["DB_POOL_PRE_PING"],
+    }
+    connect_args = {}
+    if config["DB_STATEMENT_TIMEOUT_MS"]:
+        connect_args["options"] = f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT_MS']}"
+    if config["DB_PREPARE_THRESHOLD"] is not None:
+        if url.get_driver_name() == "psycopg":
+            connect_args["prepare_threshold"] = config["DB_PREPARE_THRESHOLD"]
+        else:
+            logging.warning(f"DB_PREPARE_THRESHOLD needs the psycopg 3 driver, not {url.get_driver_name()}; ignored")
+    if connect_args:
+        options["connect_args"] = connect_args
+    return options
+
+
+def engine_options(database_url, config):
+    """
+    Build SQLAlchemy engine options for a database URL.
+
+    Args:
+        database_url: SQLAlchemy database URL
+        config: App config holding the DB_* and SQLITE_* settings
+
+    Returns:
+        Dict for SQLALCHEMY_ENGINE_OPTIONS
+    """
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if backend == "sqlite":
+        # Local file: the default pool without pre-ping or recycling
+        return {}
+    if backend == "postgresql":
+        return _postgresql_options(config, url)
+    return {"pool_recycle": config["DB_POOL_RECYCLE"], "pool_pre_ping": True}
+
+
+def _sqlite_pragmas(config):
+    pragmas = [
+        ("journal_mode", config["SQLITE_JOURNAL_MODE"]),
+        ("synchronous", config["SQLITE_SYNCHRONOUS"]),
+        ("busy_timeout", config["SQLITE_BUSY_TIMEOUT_MS"]),
+        ("cache_size", config["SQLITE_CACHE_SIZE"]),
+        ("mmap_size", config["SQLITE_MMAP_SIZE"]),
+    ]
+    return [f"PRAGMA {name} = {value}" for name, value in pragmas if value not in (None, "")]
+
+
+def init_app(app):
+    """Set SQLALCHEMY_ENGINE_OPTIONS for the configured database and apply SQLite pragmas on connect."""
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config["SQLALCHEMY_DATABASE_URI"], app.config)
+    pragmas = _sqlite_pragmas(app.config)
+
+    @event.listens_for(Engine, "connect")
+    def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
@@ -31,5 +31,5 @@ class SignupForm(FlaskForm):
             
     def validate_email(self, email):
         user = User.query.filter_by(email=email.data).first()
-        if user:
+        if user and not user.is_guest:
             raise ValidationError('Email already registered. Please use a different one or log in.')
\ No newline at end of file
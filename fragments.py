@@ -0,0 +1,47 @@
+from flask import session
+from markupsafe import Markup
+
+from app import app
+from models import Product
+from cache import TTLCache, invalidate_on_commit
+import catalog
+
+# Rendered HTML fragment cache for product cards. Listing pages render one
+# card per product, which is most of their template time, so each card's
+# markup is kept in an LRU cache and listings mostly concatenate cached HTML.
+# Cards are keyed by the catalog version, so a product written by any
+# worker makes every worker re-render, and by the accessibility mode so a
+# card can depend on text size or contrast.
+
+CARD_TEMPLATE = '_product_card.html'
+
+_cards = TTLCache(maxsize=app.config['PRODUCT_CARD_CACHE_SIZE'])
+
+
+def cached_product_card(product, variant):
+    """
+    Render a product card, or reuse its cached markup.
+
+    Args:
+        product: Product (or any object with its columns) to render
+        variant: Name of the card macro in _product_card.html, e.g. 'listing'
+
+    Returns:
+        Card HTML as Markup
+    """
+    settings = session.get('accessibility') or {}
+    key = (variant, product.id, catalog.catalog_version(),
+           settings.get('text_size', 'medium'), bool(settings.get('high_contrast', False)))
+    html = _cards.get(key)
+    if html is None:
+        macro = getattr(app.jinja_env.get_template(CARD_TEMPLATE).module, variant)
+        html = Markup(macro(product))
+        _cards.set(key, html)
+    return html
+
+
+def invalidate_product_cards(changes=None):
+    _cards.clear()
+
+
+invalidate_on_commit(Product, invalidate_product_cards)
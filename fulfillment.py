@@ -0,0 +1,225 @@
+import time
+import logging
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import click
+from sqlalchemy import update, or_, and_
+from sqlalchemy.exc import IntegrityError
+
+from app import app, db
+from models import CartItem, PaymentSession, WebhookEvent
+from cache import TTLCache
+import orders
+import accounts
+
+# Order fulfillment for Stripe checkout. When a checkout session is created
+# the cart is snapshotted into a PaymentSession row. Stripe's
+# checkout.session.completed webhook is verified and stored in the
+# WebhookEvent queue table, and a worker turns each paid session into an
+# Order. The payment success page then only has to look the order up.
+
+# Event types that mean a checkout session has been paid for
+FULFILLMENT_EVENTS = ('checkout.session.completed', 'checkout.session.async_payment_succeeded')
+
+# Attempts before a failing event is parked as 'failed'
+MAX_ATTEMPTS = 5
+
+# Seconds after which an event claimed by a worker that died is retried
+LOCK_TIMEOUT = 300
+
+# Stripe session id -> order id for sessions already fulfilled. A session's
+# order never changes once written, so entries don't need to expire.
+_fulfilled_sessions = TTLCache(maxsize=app.config['FULFILLED_SESSION_CACHE_SIZE'])
+
+
+def record_checkout(stripe_session_id, user_id, cart_items, total):
+    """
+    Snapshot the cart sent to Stripe for a checkout session. The caller commits the session.
+
+    A retried checkout with the same idempotency key gets the same Stripe
+    session back, whose snapshot already exists and is kept as it is.
+
+    Args:
+        stripe_session_id: The Stripe checkout session ID
+        user_id: ID of the logged-in user, or None for guest checkout
+        cart_items: Cart lines from shopping_cart.load_cart()
+        total: Cart total
+    """
+    line_items = [{
+        'product_id': item['product'].id,
+        'name': item['product'].name,
+        'price': item['product'].price,
+        'quantity': item['quantity']
+    } for item in cart_items]
+    if db.session.query(PaymentSession.id).filter_by(stripe_session_id=stripe_session_id).first():
+        return
+    db.session.add(PaymentSession(stripe_session_id=stripe_session_id, user_id=user_id,
+                                  line_items=line_items, total_amount=total))
+
+
+def order_for_session(stripe_session_id):
+    """
+    Get the order written for a checkout session.
+
+    Returns:
+        Tuple of (known, order_id): known is False if no checkout was recorded
+        for the session, and order_id is None until the session is fulfilled
+    """
+    order_id = _fulfilled_sessions.get(stripe_session_id)
+    if order_id is not None:
+        return True, order_id
+
+    payment = db.session.query(PaymentSession.order_id).filter_by(stripe_session_id=stripe_session_id).first()
+    if payment is None:
+        return False, None
+    if payment.order_id is not None:
+        _fulfilled_sessions.set(stripe_session_id, payment.order_id)
+    return True, payment.order_id
+
+
+def fulfill_session(stripe_session_id, email, name, address):
+    """
+    Write the order for a paid checkout session.
+
+    Safe to call more than once for the same session, and concurrently from
+    the webhook worker and the success page: only one order is ever written.
+
+    Args:
+        stripe_session_id: The Stripe checkout session ID
+        email: Customer email collected by Stripe (used for guest checkout)
+        name: Customer name collected by Stripe
+        address: First line of the shipping address
+
+    Returns:
+        ID of the session's order, or None if the session is unknown
+    """
+    payment = PaymentSession.query.filter_by(stripe_session_id=stripe_session_id).first()
+    if payment is None:
+        return None
+    if payment.order_id is not None:
+        _fulfilled_sessions.set(stripe_session_id, payment.order_id)
+        return payment.order_id
+
+    user_id = payment.user_id
+    if user_id is None:
+        # Record the order against a guest account for the email from Stripe checkout
+        user_id = accounts.get_or_create_guest(email, name)
+
+    cart_items = [{
+        'product': SimpleNamespace(id=line['product_id'], name=line['name'], price=line['price']),
+        'quantity': line['quantity']
+    } for line in payment.line_items]
+    order_id = orders.create_order(user_id, cart_items, payment.total_amount, address or '', status='Paid')
+
+    # Claim the session; if another process got there first keep its order instead
+    claimed = db.session.execute(
+        update(PaymentSession)
+        .where(PaymentSession.id == payment.id, PaymentSession.order_id.is_(None))
+        .values(order_id=order_id)
+    ).rowcount
+    if not claimed:
+        db.session.rollback()
+        return order_for_session(stripe_session_id)[1]
+
+    if payment.user_id is not None:
+        CartItem.query.filter_by(user_id=payment.user_id).delete()
+
+    db.session.commit()
+    _fulfilled_sessions.set(stripe_session_id, order_id)
+    return order_id
+
+
+def enqueue_event(event):
+    """
+    Store a verified webhook event for the worker. Duplicate deliveries are ignored.
+
+    Returns:
+        True if the event was queued, False if it was already known or not relevant
+    """
+    if event.get('type') not in FULFILLMENT_EVENTS:
+        return False
+
+    db.session.add(WebhookEvent(event_id=event['id'], event_type=event['type'], payload=event))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return False
+    return True
+
+
+def _handle_event(event):
+    checkout_session = event['payload']['data']['object']
+    if checkout_session.get('payment_status') not in ('paid', 'no_payment_required'):
+        return
+    details = checkout_session.get('customer_details') or {}
+    address = details.get('address') or {}
+    order_id = fulfill_session(checkout_session['id'], details.get('email'), details.get('name'),
+                               address.get('line1'))
+    if order_id is None:
+        raise LookupError(f"No checkout recorded for session {checkout_session['id']}")
+
+
+def process_pending_events(limit=50):
+    """
+    Fulfill queued webhook events, oldest first.
+
+    Each event is claimed with a conditional UPDATE so several workers can
+    run side by side. Failures are retried up to MAX_ATTEMPTS times.
+
+    Returns:
+        Number of events processed
+    """
+    now = datetime.utcnow()
+    claimable = or_(
+        WebhookEvent.status == 'pending',
+        and_(WebhookEvent.status == 'processing', WebhookEvent.locked_at < now - timedelta(seconds=LOCK_TIMEOUT))
+    )
+    event_ids = [event_id for (event_id,) in
+                 db.session.query(WebhookEvent.id).filter(claimable).order_by(WebhookEvent.id).limit(limit)]
+
+    processed = 0
+    for event_id in event_ids:
+        claimed = db.session.execute(
+            update(WebhookEvent)
+            .where(WebhookEvent.id == event_id, claimable)
+            .values(status='processing', locked_at=datetime.utcnow(), attempts=WebhookEvent.attempts + 1)
+        ).rowcount
+        db.session.commit()
+        if not claimed:
+            continue
+
+        event = db.session.get(WebhookEvent, event_id)
+        try:
+            _handle_event({'payload': event.payload})
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error fulfilling webhook event {event.event_id}: {str(e)}")
+            event = db.session.get(WebhookEvent, event_id)
+            event.status = 'failed' if event.attempts >= MAX_ATTEMPTS else 'pending'
+            event.last_error = str(e)
+        else:
+            event = db.session.get(WebhookEvent, event_id)
+            event.status = 'done'
+            event.processed_at = datetime.utcnow()
+        db.session.commit()
+        processed += 1
+
+    return processed
+
+
+@app.cli.command('fulfillment-worker')
+@click.option('--poll-interval', default=2.0, help='Seconds to wait when the queue is empty.')
+@click.option('--once', is_flag=True, help='Process the queued events and exit.')
+def fulfillment_worker(poll_interval, once):
+    """Fulfill paid Stripe checkout sessions from the webhook queue."""
+    while True:
+        processed = process_pending_events()
+        if processed:
+            logging.info(f"Fulfilled {processed} webhook events")
+        if once:
+            break
+        if not processed:
+            time.sleep(poll_interval)
+        db.session.remove()
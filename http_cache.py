@@ -0,0 +1,88 @@
+import os
+import json
+import hashlib
+from functools import wraps
+
+from flask import request, session, make_response
+from flask_login import current_user
+
+from app import app
+import catalog
+import assets
+
+# Conditional GET for catalog pages. A page's ETag is derived from the
+# catalog version, the templates and built asset names, and everything
+# per-visitor the layout renders (accessibility classes, cart badge,
+# username), so a revalidation whose If-None-Match still matches gets a 304
+# without running the view. Pages for anonymous visitors with no session
+# state are identical for everyone and may be kept by shared caches;
+# everything else is private.
+
+
+def _templates_digest():
+    # Changes on deploys that touch templates, so old ETags stop matching
+    digest = hashlib.sha1()
+    for root, _, files in sorted(os.walk(app.jinja_loader.searchpath[0])):
+        for filename in sorted(files):
+            with open(os.path.join(root, filename), 'rb') as f:
+                digest.update(filename.encode('utf-8'))
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+_TEMPLATES_DIGEST = _templates_digest()
+
+
+def _is_shared():
+    """True if the page looks the same to every visitor: anonymous with an empty session."""
+    return not current_user.is_authenticated and not session
+
+
+def _page_etag():
+    parts = [
+        _TEMPLATES_DIGEST,
+        assets.manifest_digest(),
+        catalog.catalog_version(),
+        current_user.get_id() if current_user.is_authenticated else None,
+        current_user.username if current_user.is_authenticated else None,
+        session.get('accessibility'),
+        len(session.get('cart', [])),
+    ]
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def _set_cache_headers(response, shared):
+    if shared:
+        response.cache_control.public = True
+        response.cache_control.max_age = 0
+        response.cache_control.s_maxage = app.config['CATALOG_PAGE_SHARED_MAX_AGE']
+    else:
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+
+
+def catalog_page(view):
+    """
+    Decorate a GET view whose page only depends on the catalog and the visitor's layout state.
+
+    Requests with flashed messages waiting to be shown skip the cache, since
+    the page would display them.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+            return view(*args, **kwargs)
+
+        etag = _page_etag()
+        shared = _is_shared()
+        if request.if_none_match.contains(etag):
+            response = make_response('', 304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        _set_cache_headers(response, shared)
+        return response
+    return wrapper
@@ -1,5 +1,10 @@
 from app import app  # noqa: F401
 import routes  # noqa: F401
+import database
 
 if __name__ == "__main__":
+    # Development server: set up the database first, which the CLI does for gunicorn deployments
+    with app.app_context():
+        database.init_db()
+        database.seed_db()
     app.run(host="0.0.0.0", port=5000, debug=True)
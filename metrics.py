@@ -0,0 +1,204 @@
+import time
+import threading
+from bisect import bisect_left
+
+from flask import g, request, has_request_context, before_render_template, template_rendered, Response, abort
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app import app
+
+# Request instrumentation. Every request records its latency per endpoint,
+# the number and total time of its SQL statements, and the time spent
+# rendering templates; Stripe calls record their latency per API method.
+# Everything is kept in process memory and exposed in the Prometheus text
+# format at /metrics, which only exists when METRICS_TOKEN is set. Each
+# gunicorn worker keeps its own numbers, so a scrape sees the worker that
+# served it. With SERVER_TIMING enabled, the per-request numbers are also
+# sent in a Server-Timing response header.
+
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    """Labelled counter."""
+
+    type = 'counter'
+
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            yield self.name, dict(zip(self.labels, label_values)), value
+
+
+class Histogram:
+    """Labelled histogram with fixed buckets."""
+
+    type = 'histogram'
+
+    def __init__(self, name, help, labels, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._values = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            values = {label_values: list(entry) for label_values, entry in self._values.items()}
+        for label_values, entry in sorted(values.items()):
+            labels = dict(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry):
+                cumulative += count
+                yield f'{self.name}_bucket', dict(labels, le=repr(bound)), cumulative
+            yield f'{self.name}_bucket', dict(labels, le='+Inf'), entry[-1]
+            yield f'{self.name}_sum', labels, entry[-2]
+            yield f'{self.name}_count', labels, entry[-1]
+
+
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'Request latency by endpoint', ('endpoint',))
+REQUESTS = Counter('http_requests_total', 'Requests by endpoint and status code', ('endpoint', 'status'))
+SQL_STATEMENTS = Counter('db_statements_total', 'SQL statements executed by endpoint', ('endpoint',))
+SQL_TIME = Counter('db_statement_seconds_total', 'Time spent executing SQL statements by endpoint', ('endpoint',))
+TEMPLATE_LATENCY = Histogram('template_render_duration_seconds', 'Template render time', ('template',))
+STRIPE_LATENCY = Histogram('stripe_call_duration_seconds', 'Stripe API call latency by method and outcome',
+                           ('method', 'outcome'))
+
+_METRICS = (REQUEST_LATENCY, REQUESTS, SQL_STATEMENTS, SQL_TIME, TEMPLATE_LATENCY, STRIPE_LATENCY)
+
+
+def observe_stripe_call(method, seconds, outcome):
+    """Record the latency of one Stripe API call ('ok' or 'error' outcome)."""
+    STRIPE_LATENCY.observe((method, outcome), seconds)
+
+
+def render_metrics():
+    """Format all metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _METRICS:
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        for name, labels, value in metric.samples():
+            label_text = ','.join(f'{key}="{_escape(str(val))}"' for key, val in labels.items())
+            lines.append(f'{name}{{{label_text}}} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# Per-request bookkeeping
+
+@app.before_request
+def _start_request_timer():
+    g.metrics_start = time.perf_counter()
+    g.sql_statements = 0
+    g.sql_seconds = 0.0
+    g.template_seconds = 0.0
+
+
+@app.after_request
+def _finish_request(response):
+    g.metrics_status = response.status_code
+    if app.config['SERVER_TIMING'] and 'metrics_start' in g:
+        elapsed = time.perf_counter() - g.metrics_start
+        response.headers.add('Server-Timing', ', '.join([
+            f'app;dur={elapsed * 1000:.1f}',
+            f'db;dur={g.sql_seconds * 1000:.1f};desc="{g.sql_statements} queries"',
+            f'tpl;dur={g.template_seconds * 1000:.1f}',
+        ]))
+    return response
+
+
+@app.teardown_request
+def _record_request(exc):
+    # Recorded on teardown rather than in after_request, which an unhandled
+    # exception can skip, so requests that fail with a 500 are counted too
+    start = g.pop('metrics_start', None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    endpoint = request.endpoint or 'unmatched'
+    status = 500 if exc is not None else g.get('metrics_status', 500)
+
+    REQUEST_LATENCY.observe((endpoint,), elapsed)
+    REQUESTS.inc((endpoint, str(status)))
+    if g.sql_statements:
+        SQL_STATEMENTS.inc((endpoint,), g.sql_statements)
+        SQL_TIME.inc((endpoint,), g.sql_seconds)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_statement_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('metrics_statement_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    if has_request_context() and 'sql_statements' in g:
+        g.sql_statements += 1
+        g.sql_seconds += elapsed
+
+
+@event.listens_for(Engine, 'handle_error')
+def _discard_statement_timer(context):
+    starts = context.connection.info.get('metrics_statement_start') if context.connection is not None else None
+    if starts:
+        starts.pop()
+
+
+@before_render_template.connect_via(app)
+def _start_template_timer(sender, template, context, **extra):
+    g.setdefault('template_starts', []).append(time.perf_counter())
+
+
+@template_rendered.connect_via(app)
+def _record_template(sender, template, context, **extra):
+    starts = g.get('template_starts')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    TEMPLATE_LATENCY.observe((template.name,), elapsed)
+    if 'template_seconds' in g and not starts:
+        # Only count the outermost template, since nested renders are part of its time
+        g.template_seconds += elapsed
+
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint. Requires 'Authorization: Bearer <METRICS_TOKEN>'; not found without a token."""
+    token = app.config['METRICS_TOKEN']
+    if not token or request.headers.get('Authorization') != f'Bearer {token}':
+        abort(404)
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
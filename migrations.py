@@ -0,0 +1,189 @@
+import logging
+
+import click
+from sqlalchemy import inspect, select, text
+
+from app import app, db
+from models import (Product, CartItem, Order, OrderItem, PaymentSession, OrderRequest, WebhookEvent,
+                    CatalogVersion, SchemaVersion)
+import search
+
+# Versioned schema migrations. db.create_all() only creates missing tables,
+# so a database created by an earlier release never gets the indexes and
+# constraints added to existing tables since. Each migration below brings an
+# existing database forward one step; the number of the last one applied is
+# kept in the schema_version table, and `flask --app main db-upgrade` (also
+# run by init-db) applies the rest in order, each in its own transaction.
+#
+# Migrations must be safe to run against a database that already has their
+# changes, since a new database gets the full schema from create_all() first.
+
+
+def _create_indexes(connection, table, names):
+    for index in table.indexes:
+        if index.name in names:
+            index.create(connection, checkfirst=True)
+
+
+def _add_search_index(connection):
+    search.init_search(connection)
+
+
+def _add_checkout_tables(connection):
+    tables = [model.__table__ for model in (PaymentSession, OrderRequest, WebhookEvent, CatalogVersion)]
+    db.metadata.create_all(connection, tables=tables, checkfirst=True)
+
+    # payment_session.order_id became unique after the table was introduced
+    existing = inspect(connection)
+    unique_columns = [constraint['column_names'] for constraint in existing.get_unique_constraints('payment_session')]
+    unique_columns += [index['column_names'] for index in existing.get_indexes('payment_session') if index['unique']]
+    if ['order_id'] not in unique_columns:
+        connection.execute(text('CREATE UNIQUE INDEX uq_payment_session_order_id ON payment_session (order_id)'))
+
+
+def _add_unique_cart_lines(connection):
+    # Merge duplicate lines for the same user and product into the oldest one first
+    merged = connection.execute(text("""
+        UPDATE cart_item SET quantity = (
+            SELECT SUM(COALESCE(other.quantity, 1)) FROM cart_item AS other
+            WHERE other.user_id = cart_item.user_id AND other.product_id = cart_item.product_id
+        )
+        WHERE id IN (SELECT MIN(id) FROM cart_item GROUP BY user_id, product_id HAVING COUNT(*) > 1)
+    """)).rowcount
+    if merged:
+        connection.execute(text(
+            'DELETE FROM cart_item WHERE id NOT IN (SELECT MIN(id) FROM cart_item GROUP BY user_id, product_id)'))
+        logging.info(f"Merged duplicate cart lines into {merged} lines")
+    _create_indexes(connection, CartItem.__table__, {'uq_cart_item_user_product'})
+
+
+def _add_lookup_indexes(connection):
+    _create_indexes(connection, CartItem.__table__, {'ix_cart_item_product_id'})
+    _create_indexes(connection, Product.__table__, {'ix_product_category_id', 'ix_product_price_id'})
+    _create_indexes(connection, Order.__table__, {'ix_order_user_id'})
+    _create_indexes(connection, OrderItem.__table__, {'ix_order_item_order_id'})
+
+
+# (version, description, function), in the order they are applied
+MIGRATIONS = [
+    (1, 'Full-text product search index', _add_search_index),
+    (2, 'Payment session, order request, webhook event and catalog version tables', _add_checkout_tables),
+    (3, 'Unique (user_id, product_id) on cart_item', _add_unique_cart_lines),
+    (4, 'Indexes on cart, product, order and order item lookup columns', _add_lookup_indexes),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version():
+    """Number of the last migration applied to the database, or 0 if none has been."""
+    if not inspect(db.engine).has_table(SchemaVersion.__tablename__):
+        return 0
+    return db.session.query(SchemaVersion.version).filter_by(id=1).scalar() or 0
+
+
+def upgrade():
+    """
+    Apply every migration newer than the database's schema version.
+
+    Returns:
+        List of the version numbers applied
+    """
+    SchemaVersion.__table__.create(db.engine, checkfirst=True)
+    applied = []
+    for version, description, migrate in MIGRATIONS:
+        if version <= current_version():
+            continue
+        connection = db.session.connection()
+        migrate(connection)
+        if db.session.get(SchemaVersion, 1) is None:
+            db.session.add(SchemaVersion(id=1, version=version))
+        else:
+            db.session.execute(SchemaVersion.__table__.update().where(SchemaVersion.id == 1).values(version=version))
+        db.session.commit()
+        logging.info(f"Applied migration {version}: {description}")
+        applied.append(version)
+    return applied
+
+
+# EXPLAIN checks: each of the main route queries must be answered through an
+# index rather than a full scan of the table it looks up.
+
+def _explain_queries():
+    return [
+        ('cart lines of a user', 'cart_item',
+         select(CartItem).join(CartItem.product).where(CartItem.user_id == 1).order_by(CartItem.id)),
+        ('cart line for a product', 'cart_item',
+         select(CartItem).where(CartItem.user_id == 1, CartItem.product_id == 1)),
+        ('products in a category', 'product',
+         select(Product).where(Product.category_id == 1).order_by(Product.id.desc()).limit(24)),
+        ('products by price', 'product',
+         select(Product).order_by(Product.price, Product.id).limit(24)),
+        ('items of an order', 'order_item', select(OrderItem).where(OrderItem.order_id == 1)),
+        ('orders of a user', 'order', select(Order).where(Order.user_id == 1)),
+        ('payment session by Stripe id', 'payment_session',
+         select(PaymentSession.order_id).where(PaymentSession.stripe_session_id == 'cs_test')),
+        ('order for an idempotency key', 'order_request',
+         select(OrderRequest.order_id).where(OrderRequest.key == 'key')),
+    ]
+
+
+def _plan(connection, statement):
+    compiled = statement.compile(dialect=connection.dialect)
+    if connection.dialect.name == 'sqlite':
+        rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}', tuple(compiled.params.values()))
+        return [row[-1] for row in rows]
+    rows = connection.exec_driver_sql(f'EXPLAIN {compiled}', compiled.params)
+    return [row[0] for row in rows]
+
+
+def _is_full_scan(connection, plan_line, table):
+    if connection.dialect.name == 'sqlite':
+        # 'SCAN product' reads the whole table; 'SCAN product USING INDEX ...' walks an index in order
+        words = plan_line.split()
+        return words[:2] == ['SCAN', table] and 'INDEX' not in words
+    return f'Seq Scan on {table}' in plan_line or f'Seq Scan on "{table}"' in plan_line
+
+
+def check_query_plans():
+    """
+    EXPLAIN the main route queries and check that each one uses an index.
+
+    On PostgreSQL sequential scans are disabled for the check, since the
+    planner rightly prefers them on small tables; a remaining Seq Scan means
+    no usable index exists.
+
+    Returns:
+        List of (description, plan lines, uses_index) tuples
+    """
+    results = []
+    with db.engine.connect() as connection:
+        if connection.dialect.name == 'postgresql':
+            connection.exec_driver_sql('SET enable_seqscan = off')
+        for description, table, statement in _explain_queries():
+            plan = _plan(connection, statement)
+            uses_index = not any(_is_full_scan(connection, line, table) for line in plan)
+            results.append((description, plan, uses_index))
+        connection.rollback()
+    return results
+
+
+@app.cli.command('db-upgrade')
+def upgrade_command():
+    """Apply pending schema migrations."""
+    applied = upgrade()
+    click.echo(f"Applied migrations {applied}" if applied else 'Database schema is up to date')
+    click.echo(f"Schema version {current_version()}")
+
+
+@app.cli.command('db-explain')
+def explain_command():
+    """Check that the main route queries use indexes."""
+    failed = 0
+    for description, plan, uses_index in check_query_plans():
+        click.echo(f"{'ok' if uses_index else 'FULL SCAN'}: {description}")
+        for line in plan:
+            click.echo(f"    {line}")
+        failed += not uses_index
+    if failed:
+        raise SystemExit(1)
@@ -1,7 +1,7 @@
 from app import db
 from flask_login import UserMixin
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+import passwords
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -18,10 +18,15 @@ class User(UserMixin, db.Model):
     orders = db.relationship('Order', backref='user', lazy=True)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = passwords.hash_password(password)
         
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return passwords.verify_password(self.password_hash, password)
+    
+    @property
+    def is_guest(self):
+        # Accounts created by guest checkout have no password until the guest signs up
+        return self.password_hash is None
 
 class Category(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -34,21 +39,31 @@ class Product(db.Model):
     name = db.Column(db.String(128), nullable=False)
     description = db.Column(db.Text, nullable=False)
     price = db.Column(db.Float, nullable=False)
-    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False, index=True)
     in_stock = db.Column(db.Boolean, default=True)
     # Audio descriptions for visually impaired users
     audio_description = db.Column(db.Text)
 
+    __table_args__ = (
+        # Keyset pagination by price (see pagination.SORT_ORDERS)
+        db.Index('ix_product_price_id', 'price', 'id'),
+    )
+
 class CartItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True)
     quantity = db.Column(db.Integer, default=1)
     product = db.relationship('Product')
 
+    __table_args__ = (
+        # One line per product in a user's cart; also serves lookups by user_id
+        db.Index('uq_cart_item_user_product', 'user_id', 'product_id', unique=True),
+    )
+
 class Order(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     order_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     total_amount = db.Column(db.Float, nullable=False)
     shipping_address = db.Column(db.Text, nullable=False)
@@ -57,9 +72,49 @@ class Order(db.Model):
 
 class OrderItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False, index=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     product_name = db.Column(db.String(128), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     price = db.Column(db.Float, nullable=False)
     product = db.relationship('Product')
+
+class PaymentSession(db.Model):
+    # Cart snapshot sent to Stripe for one checkout session, and the order it became once paid
+    id = db.Column(db.Integer, primary_key=True)
+    stripe_session_id = db.Column(db.String(255), unique=True, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))  # None for guest checkout
+    line_items = db.Column(db.JSON, nullable=False)
+    total_amount = db.Column(db.Float, nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), unique=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class OrderRequest(db.Model):
+    # Idempotency key of a submitted checkout form and the order it created
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(64), unique=True, nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class WebhookEvent(db.Model):
+    # Durable queue of verified Stripe webhook events waiting for the fulfillment worker
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.String(255), unique=True, nullable=False)
+    event_type = db.Column(db.String(64), nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+    status = db.Column(db.String(16), nullable=False, default='pending', index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime)
+    processed_at = db.Column(db.DateTime)
+
+class CatalogVersion(db.Model):
+    # Single row counter bumped in every transaction that writes products or categories
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class SchemaVersion(db.Model):
+    # Single row holding the number of the last migration applied (see migrations.py)
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
@@ -0,0 +1,91 @@
+import uuid
+import hashlib
+
+from sqlalchemy import insert
+
+from app import db
+from models import Order, OrderItem, OrderRequest
+
+# Order write path shared by direct checkout and Stripe payment handling.
+# The order row is inserted with RETURNING to get its id without a flush,
+# and all of its items go out in one executemany/multi-row INSERT.
+#
+# The checkout page embeds a one-time token in its forms. A form submitted
+# twice (double click, refresh, client retry) carries the same token, which
+# is turned into an idempotency key so only one order is ever written for it.
+
+
+def new_checkout_token():
+    """Generate the one-time token embedded in the checkout forms."""
+    return uuid.uuid4().hex
+
+
+def idempotency_key(owner, token, *parts):
+    """
+    Derive an idempotency key from a checkout token.
+
+    Args:
+        owner: User id or email of the customer, so keys can't collide across customers
+        token: Checkout token submitted with the form
+        parts: Anything else the request must match, e.g. the cart contents
+
+    Returns:
+        Hex digest of the key, or None if no token was submitted
+    """
+    if not token:
+        return None
+    return hashlib.sha256(repr((owner, token) + parts).encode('utf-8')).hexdigest()
+
+
+def cart_signature(cart_items):
+    """Summarize cart lines as a tuple of (product id, quantity, price), for idempotency keys."""
+    return tuple(sorted((item['product'].id, item['quantity'], item['product'].price) for item in cart_items))
+
+
+def find_order_for_key(key):
+    """Get the ID of the order already created for an idempotency key, or None."""
+    if not key:
+        return None
+    return db.session.query(OrderRequest.order_id).filter_by(key=key).scalar()
+
+
+def create_order(user_id, cart_items, total, shipping_address, status='Pending', idempotency_key=None):
+    """
+    Insert an order and its items. The caller commits the session.
+
+    Args:
+        user_id: ID of the user placing the order
+        cart_items: Cart lines from shopping_cart.load_cart()
+        total: Order total
+        shipping_address: Shipping address text
+        status: Initial order status
+        idempotency_key: Key from idempotency_key(). If an order already
+            exists for it, sqlalchemy.exc.IntegrityError is raised and the
+            caller should roll back and use find_order_for_key().
+
+    Returns:
+        ID of the new order
+    """
+    order_id = db.session.execute(
+        insert(Order)
+        .values(user_id=user_id, total_amount=total,
+                shipping_address=shipping_address, status=status)
+        .returning(Order.id)
+    ).scalar_one()
+
+    if cart_items:
+        db.session.execute(insert(OrderItem), [
+            {
+                'order_id': order_id,
+                'product_id': item['product'].id,
+                'product_name': item['product'].name,
+                'quantity': item['quantity'],
+                'price': item['product'].price
+            }
+            for item in cart_items
+        ])
+
+    if idempotency_key:
+        db.session.execute(insert(OrderRequest).values(key=idempotency_key, order_id=order_id))
+
+    return order_id
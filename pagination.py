@@ -0,0 +1,192 @@
+import json
+import math
+import base64
+import binascii
+from datetime import date, datetime
+
+from sqlalchemy import and_, or_
+from models import Product
+
+# Keyset (cursor) pagination for product listings. Each page is fetched with
+# a WHERE clause on the sort key of the last row seen instead of an OFFSET,
+# so deep pages cost the same as the first one.
+
+# Sort orders available on listing pages: name -> list of (key name, column, descending)
+SORT_ORDERS = {
+    'newest': [('id', Product.id, True)],
+    'price_low': [('price', Product.price, False), ('id', Product.id, False)],
+    'price_high': [('price', Product.price, True), ('id', Product.id, True)],
+}
+
+SORT_LABELS = {
+    'relevance': 'Best match',
+    'newest': 'Newest first',
+    'price_low': 'Price: low to high',
+    'price_high': 'Price: high to low',
+}
+
+
+class Page:
+    """One page of results plus the cursors needed to reach its neighbours."""
+
+    def __init__(self, items, sort, per_page, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.sort = sort
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def sort_keys(sort, relevance=None):
+    """
+    Get the key columns for a sort order.
+
+    Args:
+        sort: Name of the sort order ('relevance' or a key of SORT_ORDERS)
+        relevance: Relevance expression from search.search_products, if any
+
+    Returns:
+        Tuple of (sort name actually used, list of (name, column, descending))
+    """
+    if sort == 'relevance' and relevance is not None:
+        return sort, [('rank', relevance, False), ('id', Product.id, False)]
+    if sort not in SORT_ORDERS:
+        sort = 'relevance' if relevance is not None else 'newest'
+        return sort_keys(sort, relevance)
+    return sort, SORT_ORDERS[sort]
+
+
+def encode_cursor(sort, values):
+    raw = json.dumps([sort, values], separators=(',', ':'), default=_encode_value).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _encode_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Cannot put {type(value).__name__} in a cursor")
+
+
+def _key_type(column):
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        python_type = object
+    # Untyped expressions (NullType's python_type is object) are numeric, like the full-text rank
+    return float if python_type is object else python_type
+
+
+def _decode_value(value, expected):
+    """Check one cursor value against its column's type; returns the value to compare with, or raises ValueError."""
+    if expected in (date, datetime):
+        if not isinstance(value, str):
+            raise ValueError(value)
+        parsed = datetime.fromisoformat(value)
+        return parsed.date() if expected is date else parsed
+    if isinstance(value, bool):
+        raise ValueError(value)
+    if expected is int and isinstance(value, int):
+        return value
+    if expected is float and isinstance(value, (int, float)) and math.isfinite(value):
+        return value
+    if expected is str and isinstance(value, str):
+        return value
+    raise ValueError(value)
+
+
+def decode_cursor(cursor, sort, keys):
+    """
+    Decode a cursor into its key values.
+
+    Args:
+        cursor: Cursor from a next/previous link
+        sort: Sort order the page is being fetched in
+        keys: Key columns from sort_keys()
+
+    Returns:
+        List of key values, or None if the cursor is invalid, was made for
+        another sort, or doesn't hold one value of the right type per key
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        cursor_sort, values = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError, binascii.Error):
+        return None
+    if cursor_sort != sort or not isinstance(values, list) or len(values) != len(keys):
+        return None
+    try:
+        return [_decode_value(value, _key_type(column)) for value, (_, column, _) in zip(values, keys)]
+    except ValueError:
+        return None
+
+
+def _after(keys, values, reverse=False):
+    """Build the WHERE clause selecting rows that come after ``values`` in key order."""
+    clauses = []
+    for i, (_, column, descending) in enumerate(keys):
+        forward = descending == reverse
+        step = column > values[i] if forward else column < values[i]
+        equal = [keys[j][1] == values[j] for j in range(i)]
+        clauses.append(and_(*equal, step))
+    return or_(*clauses)
+
+
+def paginate(query, sort, keys, per_page, after=None, before=None):
+    """
+    Fetch one page of a query using keyset pagination.
+
+    Args:
+        query: The filtered Product query
+        sort: Sort order name, embedded in cursors
+        keys: Key columns from sort_keys(); the last one must be unique
+        per_page: Maximum number of items on the page
+        after: Cursor of the last row on the previous page (go forward)
+        before: Cursor of the first row on the next page (go back)
+
+    Returns:
+        Page object
+    """
+    after_values = decode_cursor(after, sort, keys)
+    before_values = decode_cursor(before, sort, keys)
+    backwards = before_values is not None and after_values is None
+
+    labels = [column.label(f'_key_{name}') for name, column, _ in keys]
+    query = query.add_columns(*labels)
+
+    if backwards:
+        query = query.filter(_after(keys, before_values, reverse=True))
+    elif after_values is not None:
+        query = query.filter(_after(keys, after_values))
+
+    order = []
+    for _, column, descending in keys:
+        descending = descending != backwards
+        order.append(column.desc() if descending else column.asc())
+
+    rows = query.order_by(None).order_by(*order).limit(per_page + 1).all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    items = [row[0] for row in rows]
+    next_cursor = prev_cursor = None
+    if rows:
+        first_values = list(rows[0][1:])
+        last_values = list(rows[-1][1:])
+        if more or backwards:
+            next_cursor = encode_cursor(sort, last_values)
+        if (more and backwards) or after_values is not None:
+            prev_cursor = encode_cursor(sort, first_values)
+
+    return Page(items, sort, per_page, next_cursor=next_cursor, prev_cursor=prev_cursor)
@@ -0,0 +1,51 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from app import app
+
+# Password hashing is deliberately slow (scrypt by default), so a burst of
+# signups or logins can take over every CPU and stall unrelated requests.
+# Hashing is therefore limited to PASSWORD_HASH_WORKERS at once per process:
+# each hash runs on a thread pool of that size while the request thread
+# waits for the result. The pool is only a concurrency limit; requests that
+# hash still take as long, and queue behind each other in a burst, but
+# requests that don't hash keep their share of the CPU.
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=app.config['PASSWORD_HASH_WORKERS'],
+                                               thread_name_prefix='password-hash')
+    return _executor
+
+
+def _run(function, *args):
+    if app.config['PASSWORD_HASH_WORKERS'] <= 0:
+        return function(*args)
+    return _get_executor().submit(function, *args).result()
+
+
+def hash_password(password):
+    """Hash a password for storage, waiting for a free password hashing slot."""
+    return _run(generate_password_hash, password)
+
+
+def verify_password(password_hash, password):
+    """
+    Check a password against a stored hash, waiting for a free password hashing slot.
+
+    Returns:
+        True if the password matches. Accounts without a password hash
+        (guest accounts) never match, and no hashing is done for them.
+    """
+    if not password_hash:
+        return False
+    return _run(check_password_hash, password_hash, password)
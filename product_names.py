@@ -0,0 +1,202 @@
+import re
+import math
+import time
+import threading
+from collections import defaultdict, namedtuple
+
+from app import app, db
+from models import Product
+from cache import invalidate_on_commit
+
+# In-memory trigram index over product names, used to resolve spoken product
+# names ("add the braille shirt to my cart") to a product id without a
+# database round trip. Lookups tolerate typos and partial names: a product
+# matches when enough of the spoken text's trigrams occur in its name.
+
+ProductMatch = namedtuple('ProductMatch', ['id', 'name', 'score'])
+
+_word_pattern = re.compile(r'\w+', re.UNICODE)
+
+# Upper bound on the number of names scored per lookup
+MAX_CANDIDATES = 500
+
+# Filler words that are often spoken but never identify a product
+STOPWORDS = frozenset(['a', 'an', 'the', 'some', 'one', 'my', 'this', 'that', 'please'])
+
+
+def trigrams(text):
+    """Split text into the set of word trigrams used by the index (pg_trgm style padding)."""
+    grams = set()
+    for word in _word_pattern.findall(text.lower()):
+        if word in STOPWORDS:
+            continue
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class ProductNameIndex:
+    """
+    Trigram inverted index from product names to product ids.
+
+    Candidates are generated with prefix filtering: to reach a coverage of
+    ``threshold`` a name must share at least one of the rarest trigrams of the
+    query, so only those posting lists are read before exact scoring. At most
+    MAX_CANDIDATES names are scored, so lookups stay fast for queries made of
+    very common words.
+    """
+
+    def __init__(self):
+        self._postings = defaultdict(set)
+        self._grams = {}
+        self._names = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._names)
+
+    def add(self, product_id, name):
+        """Add or replace a product's name."""
+        with self._lock:
+            self.remove(product_id)
+            grams = frozenset(trigrams(name))
+            self._grams[product_id] = grams
+            self._names[product_id] = name
+            for gram in grams:
+                self._postings[gram].add(product_id)
+
+    def remove(self, product_id):
+        with self._lock:
+            grams = self._grams.pop(product_id, None)
+            self._names.pop(product_id, None)
+            for gram in grams or ():
+                posting = self._postings.get(gram)
+                if posting is not None:
+                    posting.discard(product_id)
+                    if not posting:
+                        del self._postings[gram]
+
+    def _candidates(self, postings, probes):
+        """
+        Collect at most MAX_CANDIDATES product ids that can reach the coverage threshold.
+
+        Reads the ``probes`` rarest posting lists. If together they hold more
+        than MAX_CANDIDATES ids the query is made of common trigrams, so the
+        pool is narrowed by intersecting posting lists, rarest first. A list
+        that would empty the pool is skipped, because it usually comes from a
+        misspelt word. If the pool is still too big its members all share the
+        same trigrams, and the lowest ids are kept so a repeated lookup scores
+        the same names.
+        """
+        probe_postings = postings[:probes]
+        if sum(len(posting) for posting in probe_postings) <= MAX_CANDIDATES:
+            return set().union(*probe_postings)
+
+        candidates = postings[0]
+        for posting in postings[1:]:
+            if len(candidates) <= MAX_CANDIDATES:
+                break
+            narrowed = candidates & posting
+            if narrowed:
+                candidates = narrowed
+        if len(candidates) <= MAX_CANDIDATES:
+            return candidates
+        return sorted(candidates)[:MAX_CANDIDATES]
+
+    def search(self, text, limit=5, threshold=0.5):
+        """
+        Find the products whose names best match the text.
+
+        Args:
+            text: Spoken or typed product name
+            limit: Maximum number of matches to return
+            threshold: Minimum fraction of the text's trigrams found in a name
+
+        Returns:
+            List of ProductMatch, best first. The score is the Dice similarity
+            between the text and the product name.
+        """
+        query = trigrams(text)
+        if not query:
+            return []
+
+        min_overlap = max(1, math.ceil(threshold * len(query)))
+        with self._lock:
+            postings = sorted((self._postings[gram] for gram in query if gram in self._postings), key=len)
+            candidates = self._candidates(postings, len(query) - min_overlap + 1)
+
+            matches = []
+            for product_id in candidates:
+                grams = self._grams[product_id]
+                overlap = len(query & grams)
+                if overlap < min_overlap:
+                    continue
+                dice = 2 * overlap / (len(query) + len(grams))
+                matches.append((overlap, dice, product_id))
+
+            matches.sort(key=lambda match: (-match[0], -match[1], match[2]))
+            return [ProductMatch(product_id, self._names[product_id], round(dice, 3))
+                    for _, dice, product_id in matches[:limit]]
+
+
+_index = ProductNameIndex()
+_index_lock = threading.Lock()
+_built_at = None
+_rebuilding = False
+
+
+def _build_index():
+    index = ProductNameIndex()
+    for product_id, name in db.session.query(Product.id, Product.name):
+        index.add(product_id, name)
+    return index
+
+
+def _rebuild_in_background():
+    global _index, _built_at, _rebuilding
+    try:
+        with app.app_context():
+            _index, _built_at = _build_index(), time.monotonic()
+    finally:
+        _rebuilding = False
+
+
+def get_index():
+    """
+    Get the process-wide product name index, building it on first use.
+
+    The index is updated incrementally when products are committed by this
+    process. After PRODUCT_NAME_INDEX_TTL seconds it is rebuilt from the
+    database on a background thread, to pick up changes made by other
+    workers, while lookups keep using the current index.
+    """
+    global _index, _built_at, _rebuilding
+    if _built_at is None:
+        with _index_lock:
+            if _built_at is None:
+                _index, _built_at = _build_index(), time.monotonic()
+    elif time.monotonic() - _built_at > app.config['PRODUCT_NAME_INDEX_TTL'] and not _rebuilding:
+        with _index_lock:
+            if not _rebuilding:
+                _rebuilding = True
+                threading.Thread(target=_rebuild_in_background, daemon=True).start()
+    return _index
+
+
+def resolve(text):
+    """Resolve a spoken product name to the best matching ProductMatch, or None."""
+    matches = get_index().search(text, limit=1)
+    return matches[0] if matches else None
+
+
+def _apply_product_changes(changes):
+    if _built_at is None:
+        return
+    for operation, (product_id, name) in changes:
+        if operation == 'delete':
+            _index.remove(product_id)
+        else:
+            _index.add(product_id, name)
+
+
+invalidate_on_commit(Product, _apply_product_changes, snapshot=lambda product: (product.id, product.name))
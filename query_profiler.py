@@ -0,0 +1,177 @@
+import os
+import re
+import sys
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app import app
+
+# Query profiling for development and tests. While enabled (QUERY_PROFILER=1,
+# or app.testing), every SQL statement issued during a request is recorded
+# with a fingerprint of its shape (literals and IN lists stripped) and the
+# application line that issued it. When one shape repeats N+1 style within a
+# request, a warning names the statement and the line to fix. Views can
+# declare a query budget with @query_budget(n), and tests can wrap a request
+# in assert_max_queries(n); going over either raises QueryBudgetExceeded
+# under app.testing and logs a warning otherwise.
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PARAMETER_LIST = re.compile(r'\((?:\s*(?:\?|%s|%\(\w+\)s|:\w+)\s*,?)+\)')
+_WHITESPACE = re.compile(r'\s+')
+
+# Active query logs for the current request or assert_max_queries() block
+_active_logs = ContextVar('query_profiler_logs', default=())
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a request or block issues more queries than its budget."""
+
+
+class QueryLog:
+    """Statements recorded by one request or profiling block."""
+
+    def __init__(self):
+        self.statements = []  # (fingerprint, statement, location)
+
+    def __len__(self):
+        return len(self.statements)
+
+    def repeated(self, threshold):
+        """
+        Find statement shapes issued at least threshold times.
+
+        Returns:
+            List of (count, fingerprint, location) tuples, most repeated first,
+            where location is the first application line that issued the shape
+        """
+        counts = Counter(fingerprint for fingerprint, _, _ in self.statements)
+        locations = {}
+        for fingerprint, _, location in self.statements:
+            locations.setdefault(fingerprint, location)
+        return [(count, fingerprint, locations[fingerprint])
+                for fingerprint, count in counts.most_common() if count >= threshold]
+
+    def report(self):
+        """Summarize the recorded statements, one line per shape."""
+        lines = [f"{len(self.statements)} queries:"]
+        for count, fingerprint, location in self.repeated(1):
+            lines.append(f"  {count}x {fingerprint} (at {location})")
+        return '\n'.join(lines)
+
+
+def fingerprint(statement):
+    """Normalize a SQL statement so statements that differ only in their parameters compare equal."""
+    statement = _STRING_LITERAL.sub('?', statement)
+    statement = _NUMBER_LITERAL.sub('?', statement)
+    statement = _PARAMETER_LIST.sub('(?)', statement)
+    return _WHITESPACE.sub(' ', statement).strip()
+
+
+def _application_frame():
+    """File and line of the innermost caller that is application code rather than a library."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(ROOT) and filename != __file__ and 'site-packages' not in filename:
+            return f"{os.path.relpath(filename, ROOT)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return 'unknown'
+
+
+def is_enabled():
+    return app.config['QUERY_PROFILER'] or app.testing
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    logs = _active_logs.get()
+    if not logs:
+        return
+    entry = (fingerprint(statement), statement, _application_frame())
+    for log in logs:
+        log.statements.append(entry)
+
+
+@contextmanager
+def count_queries():
+    """Record the statements issued inside the block. Yields the QueryLog."""
+    log = QueryLog()
+    token = _active_logs.set(_active_logs.get() + (log,))
+    try:
+        yield log
+    finally:
+        _active_logs.reset(token)
+
+
+def _over_budget(log, max_queries, what):
+    message = f"{what} issued {len(log)} queries, over its budget of {max_queries}\n{log.report()}"
+    if app.testing:
+        raise QueryBudgetExceeded(message)
+    logging.warning(message)
+
+
+@contextmanager
+def assert_max_queries(max_queries):
+    """
+    Fail if the block issues more than max_queries statements.
+
+    For tests, e.g.:
+        with assert_max_queries(3):
+            client.get('/cart')
+
+    Yields:
+        The QueryLog of the block
+    """
+    with count_queries() as log:
+        yield log
+    if len(log) > max_queries:
+        _over_budget(log, max_queries, 'Block')
+
+
+def query_budget(max_queries):
+    """
+    Declare the most queries a view may issue; checked only while profiling is enabled.
+
+    The budget has to hold on a worker's first requests too, when the
+    process-wide caches (logged-in identity, category map) are still empty
+    and each costs a query.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not is_enabled():
+                return view(*args, **kwargs)
+            with count_queries() as log:
+                response = view(*args, **kwargs)
+            if len(log) > max_queries:
+                _over_budget(log, max_queries, f"View {request.endpoint}")
+            return response
+        return wrapper
+    return decorator
+
+
+@app.before_request
+def _start_request_log():
+    if is_enabled():
+        g.query_log = QueryLog()
+        _active_logs.set(_active_logs.get() + (g.query_log,))
+
+
+@app.teardown_request
+def _report_request_log(exc):
+    log = g.pop('query_log', None)
+    if log is None:
+        return
+    _active_logs.set(tuple(active for active in _active_logs.get() if active is not log))
+    for count, shape, location in log.repeated(app.config['QUERY_N_PLUS_ONE_THRESHOLD']):
+        logging.warning(f"Possible N+1 in {request.endpoint}: {count}x {shape} (at {location})")
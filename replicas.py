@@ -0,0 +1,195 @@
+import time
+import logging
+import itertools
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import current_app, g, request, has_request_context, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+
+import db_engine
+
+# Read replica routing. With DATABASE_REPLICA_URLS set, views decorated
+# with @read_only (and code inside a reading() block) send their SELECTs to
+# a replica; everything else, and every write, uses the primary. A request
+# picks one replica and keeps it, so all its reads see the same snapshot.
+# Replicas are taken round-robin, skipping any that failed a health check or
+# dropped a connection until a later check passes.
+#
+# Replicas lag behind the primary, so a client that just wrote something
+# gets a short-lived cookie that sends its reads to the primary until the
+# replicas have caught up (READ_AFTER_WRITE_SECONDS). Process-wide caches
+# are filled inside on_primary() blocks, so a worker never caches a stale
+# replica row for every later request.
+
+PIN_COOKIE = 'read_primary_until'
+_SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class Replica:
+    """One replica engine and its last known health."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.healthy = True
+        self.checked_at = 0.0
+        self._check_lock = threading.Lock()
+        event.listen(engine, 'handle_error', self._on_error)
+
+    def is_available(self, interval):
+        """Health of the replica, checked with SELECT 1 if the last check is older than interval seconds."""
+        if time.monotonic() - self.checked_at >= interval and self._check_lock.acquire(blocking=False):
+            # Other threads keep using the last result while one thread checks
+            try:
+                self._check()
+            finally:
+                self._check_lock.release()
+        return self.healthy
+
+    def _check(self):
+        try:
+            with self.engine.connect() as connection:
+                connection.exec_driver_sql('SELECT 1')
+        except Exception as e:
+            self._mark(False, e)
+        else:
+            self._mark(True)
+
+    def _mark(self, healthy, error=None):
+        self.checked_at = time.monotonic()
+        if healthy != self.healthy:
+            if healthy:
+                logging.info(f"Read replica {self.engine.url} is healthy again")
+            else:
+                logging.warning(f"Read replica {self.engine.url} is unhealthy: {error}")
+        self.healthy = healthy
+
+    def _on_error(self, context):
+        if context.is_disconnect:
+            self._mark(False, context.original_exception)
+
+
+class ReplicaRouter:
+    """Round-robin choice among the healthy replicas."""
+
+    def __init__(self, replicas, health_check_interval):
+        self.replicas = replicas
+        self.health_check_interval = health_check_interval
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def choose(self):
+        """Get the engine of the next healthy replica, or None if none is healthy."""
+        with self._lock:
+            start = next(self._counter)
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(start + offset) % len(self.replicas)]
+            if replica.is_available(self.health_check_interval):
+                return replica.engine
+        return None
+
+
+def _reads_from_replica(clause):
+    # Only statements known to be SELECTs; DML and textual SQL stay on the primary
+    return clause is not None and getattr(clause, 'is_select', False)
+
+
+def _replica_engine():
+    if not has_app_context() or not g.get('read_only'):
+        return None
+    if 'replica_engine' not in g:
+        router = current_app.extensions.get('replicas')
+        g.replica_engine = router.choose() if router is not None else None
+    return g.replica_engine
+
+
+class RoutingSession(Session):
+    """Session that sends the SELECTs of read-only code to a replica."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and _reads_from_replica(clause):
+            engine = _replica_engine()
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _remember_write(session, flush_context):
+    if has_app_context():
+        g.wrote_to_primary = True
+
+
+def _pinned_to_primary():
+    if not has_request_context():
+        return False
+    try:
+        return float(request.cookies.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+@contextmanager
+def reading():
+    """Send the SELECTs inside the block to a replica, unless the client is pinned to the primary."""
+    if not has_app_context() or g.get('read_only') or _pinned_to_primary():
+        yield
+        return
+    g.read_only = True
+    try:
+        yield
+    finally:
+        g.read_only = False
+
+
+@contextmanager
+def on_primary():
+    """
+    Send the SELECTs inside the block to the primary, even within read-only code.
+
+    For filling process-wide caches: a worker keeps what it loads until the
+    entry expires, so it must not keep a lagging replica's copy.
+    """
+    if not has_app_context() or not g.get('read_only'):
+        yield
+        return
+    g.read_only = False
+    try:
+        yield
+    finally:
+        g.read_only = True
+
+
+def read_only(view):
+    """Decorate a view that never writes, so its queries may be served by a replica."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with reading():
+            return view(*args, **kwargs)
+    return wrapper
+
+
+def _pin_after_write(response):
+    if request.method not in _SAFE_METHODS or g.get('wrote_to_primary'):
+        seconds = current_app.config['READ_AFTER_WRITE_SECONDS']
+        response.set_cookie(PIN_COOKIE, str(int(time.time() + seconds)), max_age=seconds,
+                            httponly=True, samesite='Lax',
+                            secure=current_app.config['SESSION_COOKIE_SECURE'])
+    return response
+
+
+def init_app(app):
+    """Create the replica engines listed in DATABASE_REPLICA_URLS. Does nothing if there are none."""
+    urls = app.config['DATABASE_REPLICA_URLS']
+    if not urls:
+        return
+    replicas = []
+    for url in urls:
+        if url.startswith('postgres://'):
+            url = url.replace('postgres://', 'postgresql://', 1)
+        replicas.append(Replica(create_engine(url, **db_engine.engine_options(url, app.config))))
+    app.extensions['replicas'] = ReplicaRouter(replicas, app.config['REPLICA_HEALTH_CHECK_INTERVAL'])
+    app.after_request(_pin_after_write)
+    logging.info(f"Routing read-only views to {len(replicas)} read replicas")
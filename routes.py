@@ -1,11 +1,25 @@
 from flask import render_template, request, redirect, url_for, flash, session, jsonify
 from app import app, db
-from models import User, Category, Product, CartItem, Order, OrderItem
+from models import User, Category, Product, Order
 from forms import LoginForm, SignupForm
 from flask_login import login_user, logout_user, current_user, login_required
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.exc import IntegrityError
 import voice_commands
 import stripe_integration
+import search
+import pagination
+import catalog
+import shopping_cart
+import orders
+import product_names
+import fulfillment
+import accounts
+import http_cache
+import fragments
+import assets  # noqa: F401
+import metrics  # noqa: F401
+import query_profiler
+import replicas
 import os
 import logging
 
@@ -79,77 +93,71 @@ def create_sample_data():
 
 # Home page
 @app.route('/')
+@replicas.read_only
+@query_profiler.query_budget(4)
+@http_cache.catalog_page
 def index():
     latest_products = Product.query.order_by(Product.id.desc()).limit(4).all()
-    categories = Category.query.all()
+    categories = catalog.get_categories()
     return render_template('index.html', latest_products=latest_products, categories=categories)
 
 # Products page
 @app.route('/products')
+@replicas.read_only
+@query_profiler.query_budget(4)
+@http_cache.catalog_page
 def products():
     category_id = request.args.get('category', type=int)
     search_query = request.args.get('search', '')
+    sort = request.args.get('sort', '')
+    per_page = request.args.get('per_page', app.config['PRODUCTS_PER_PAGE'], type=int)
+    per_page = max(1, min(per_page, app.config['PRODUCTS_MAX_PER_PAGE']))
     
     # Base query
     product_query = Product.query
+    relevance = None
     
     # Apply filters
     if category_id:
         product_query = product_query.filter_by(category_id=category_id)
     
     if search_query:
-        product_query = product_query.filter(Product.name.ilike(f'%{search_query}%') | 
-                                            Product.description.ilike(f'%{search_query}%'))
+        product_query, relevance = search.search_products(product_query, search_query)
     
-    products = product_query.all()
-    categories = Category.query.all()
+    # Fetch a single page using the cursor from the previous/next link
+    sort, keys = pagination.sort_keys(sort, relevance)
+    page = pagination.paginate(product_query, sort, keys, per_page,
+                               after=request.args.get('after'),
+                               before=request.args.get('before'))
+    categories = catalog.get_categories()
+    
+    sort_options = [name for name in pagination.SORT_LABELS
+                    if name != 'relevance' or relevance is not None]
     
     return render_template('products.html', 
-                          products=products, 
+                          products=page.items, 
+                          page=page,
+                          sort_options=sort_options,
+                          sort_labels=pagination.SORT_LABELS,
                           categories=categories, 
                           current_category=category_id,
+                          current_category_name=catalog.category_name(category_id),
                           search_query=search_query)
 
 # Product detail page
 @app.route('/product/<int:product_id>')
+@replicas.read_only
+@query_profiler.query_budget(4)
+@http_cache.catalog_page
 def product_detail(product_id):
     product = Product.query.get_or_404(product_id)
     return render_template('product_detail.html', product=product)
 
 # Cart management
 @app.route('/cart')
+@query_profiler.query_budget(2)
 def view_cart():
-    cart_items = []
-    total = 0
-    
-    # Handle cart differently based on authentication status
-    if current_user.is_authenticated:
-        # Get cart items from database for authenticated users
-        db_cart_items = CartItem.query.filter_by(user_id=current_user.id).all()
-        
-        for item in db_cart_items:
-            subtotal = item.product.price * item.quantity
-            cart_items.append({
-                'product': item.product,
-                'quantity': item.quantity,
-                'subtotal': subtotal
-            })
-            total += subtotal
-    else:
-        # Use session cart for non-authenticated users
-        cart = session.get('cart', [])
-        
-        for item in cart:
-            product = Product.query.get(item['product_id'])
-            if product:
-                subtotal = product.price * item['quantity']
-                cart_items.append({
-                    'product': product,
-                    'quantity': item['quantity'],
-                    'subtotal': subtotal
-                })
-                total += subtotal
-    
+    cart_items, total = shopping_cart.load_cart()
     return render_template('cart.html', cart_items=cart_items, total=total)
 
 @app.route('/add_to_cart', methods=['POST'])
@@ -161,27 +169,12 @@ def add_to_cart():
         flash('Invalid product selected', 'error')
         return redirect(url_for('products'))
     
-    product = Product.query.get_or_404(product_id)
+    # Read the name now: committing expires the product
+    product_name = Product.query.get_or_404(product_id).name
     
     if current_user.is_authenticated:
         # Add to database cart for authenticated users
-        cart_item = CartItem.query.filter_by(
-            user_id=current_user.id, 
-            product_id=product_id
-        ).first()
-        
-        if cart_item:
-            # Update existing cart item
-            cart_item.quantity += quantity
-        else:
-            # Create new cart item
-            cart_item = CartItem(
-                user_id=current_user.id,
-                product_id=product_id,
-                quantity=quantity
-            )
-            db.session.add(cart_item)
-        
+        shopping_cart.add_item(current_user.id, product_id, quantity)
         db.session.commit()
     else:
         # Use session cart for anonymous users
@@ -203,7 +196,7 @@ def add_to_cart():
         
         session['cart'] = cart
     
-    flash(f'{product.name} added to your cart!', 'success')
+    flash(f'{product_name} added to your cart!', 'success')
     return redirect(url_for('view_cart'))
 
 @app.route('/update_cart', methods=['POST'])
@@ -217,18 +210,8 @@ def update_cart():
     
     if current_user.is_authenticated:
         # Update database cart for authenticated users
-        cart_item = CartItem.query.filter_by(
-            user_id=current_user.id, 
-            product_id=product_id
-        ).first()
-        
-        if cart_item:
-            if quantity > 0:
-                cart_item.quantity = quantity
-                db.session.commit()
-            else:
-                db.session.delete(cart_item)
-                db.session.commit()
+        shopping_cart.set_quantity(current_user.id, product_id, quantity)
+        db.session.commit()
     else:
         # Use session cart for anonymous users
         cart = session.get('cart', [])
@@ -250,14 +233,8 @@ def update_cart():
 def remove_from_cart(product_id):
     if current_user.is_authenticated:
         # Remove from database cart for authenticated users
-        cart_item = CartItem.query.filter_by(
-            user_id=current_user.id, 
-            product_id=product_id
-        ).first()
-        
-        if cart_item:
-            db.session.delete(cart_item)
-            db.session.commit()
+        shopping_cart.remove_item(current_user.id, product_id)
+        db.session.commit()
     else:
         # Use session cart for anonymous users
         cart = session.get('cart', [])
@@ -274,100 +251,66 @@ def remove_from_cart(product_id):
 
 # Checkout process
 @app.route('/checkout')
+@query_profiler.query_budget(2)
 def checkout():
-    cart_items = []
-    total = 0
+    cart_items, total = shopping_cart.load_cart()
     
-    if current_user.is_authenticated:
-        # Get cart items from database for authenticated users
-        db_cart_items = CartItem.query.filter_by(user_id=current_user.id).all()
-        
-        if not db_cart_items:
-            flash('Your cart is empty', 'info')
-            return redirect(url_for('products'))
-        
-        for item in db_cart_items:
-            subtotal = item.product.price * item.quantity
-            cart_items.append({
-                'product': item.product,
-                'quantity': item.quantity,
-                'subtotal': subtotal
-            })
-            total += subtotal
-    else:
-        # Use session cart for anonymous users
-        cart = session.get('cart', [])
-        if not cart:
-            flash('Your cart is empty', 'info')
-            return redirect(url_for('products'))
-        
-        for item in cart:
-            product = Product.query.get(item['product_id'])
-            if product:
-                subtotal = product.price * item['quantity']
-                cart_items.append({
-                    'product': product,
-                    'quantity': item['quantity'],
-                    'subtotal': subtotal
-                })
-                total += subtotal
-    
-    return render_template('checkout.html', cart_items=cart_items, total=total)
+    if not cart_items:
+        flash('Your cart is empty', 'info')
+        return redirect(url_for('products'))
+    
+    # One-time token so a form submitted twice only places one order
+    return render_template('checkout.html', cart_items=cart_items, total=total,
+                           checkout_token=orders.new_checkout_token())
 
 @app.route('/create-checkout-session', methods=['POST'])
 def create_checkout_session():
     """
     Create a Stripe checkout session and redirect to Stripe's hosted checkout page
     """
+    cart_items, total = shopping_cart.load_cart()
+    
+    if not cart_items:
+        flash('Your cart is empty', 'info')
+        return redirect(url_for('products'))
+    
     # Prepare items for Stripe
     stripe_items = []
-    
-    if current_user.is_authenticated:
-        # Get cart items from database for authenticated users
-        db_cart_items = CartItem.query.filter_by(user_id=current_user.id).all()
-        
-        if not db_cart_items:
-            flash('Your cart is empty', 'info')
-            return redirect(url_for('products'))
-        
-        for item in db_cart_items:
-            stripe_items.append({
-                'name': item.product.name,
-                'description': item.product.description,
-                'amount': item.product.price,
-                'quantity': item.quantity
-            })
-    else:
-        # Use session cart for anonymous users
-        cart = session.get('cart', [])
-        if not cart:
-            flash('Your cart is empty', 'info')
-            return redirect(url_for('products'))
-        
-        for item in cart:
-            product = Product.query.get(item['product_id'])
-            if product:
-                stripe_items.append({
-                    'name': product.name,
-                    'description': product.description,
-                    'amount': product.price,
-                    'quantity': item['quantity']
-                })
+    for item in cart_items:
+        stripe_items.append({
+            'name': item['product'].name,
+            'description': item['product'].description,
+            'amount': item['product'].price,
+            'quantity': item['quantity']
+        })
     
     # Get domain for success and cancel URLs
     domain_url = request.host_url.rstrip('/')
     
+    # A resubmitted form reuses the Stripe session created for the same cart
+    user_id = current_user.id if current_user.is_authenticated else None
+    key = orders.idempotency_key(user_id, request.form.get('checkout_token'), orders.cart_signature(cart_items))
+    
     # Create Stripe checkout session
     checkout_session = stripe_integration.create_checkout_session(
         items=stripe_items,
         success_url=f"{domain_url}{url_for('payment_success')}?session_id={{CHECKOUT_SESSION_ID}}",
-        cancel_url=f"{domain_url}{url_for('payment_cancel')}"
+        cancel_url=f"{domain_url}{url_for('payment_cancel')}",
+        idempotency_key=key
     )
     
     if checkout_session is None:
         flash('An error occurred while processing your payment. Please try again.', 'danger')
         return redirect(url_for('checkout'))
     
+    # Snapshot the cart so the order can be written from the webhook
+    fulfillment.record_checkout(checkout_session.id, user_id, cart_items, total)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent duplicate submit already recorded this session
+        db.session.rollback()
+    
     # Store session ID in user's session for later reference
     session['stripe_checkout_id'] = checkout_session.id
     
@@ -381,77 +324,43 @@ def process_order():
     email = request.form.get('email')
     address = request.form.get('address')
     
-    cart_items = []
-    total = 0
+    # A resubmitted form goes to the order it already placed
+    key = orders.idempotency_key(current_user.id if current_user.is_authenticated else email,
+                                 request.form.get('checkout_token'))
+    order_id = orders.find_order_for_key(key)
+    if order_id is not None:
+        return redirect(url_for('confirmation', order_id=order_id))
+    
+    cart_items, total = shopping_cart.load_cart()
+    
+    if not cart_items:
+        flash('Your cart is empty', 'info')
+        return redirect(url_for('products'))
     
     if current_user.is_authenticated:
-        # Get cart items from database for authenticated users
-        db_cart_items = CartItem.query.filter_by(user_id=current_user.id).all()
-        
-        if not db_cart_items:
-            flash('Your cart is empty', 'info')
-            return redirect(url_for('products'))
-        
-        for item in db_cart_items:
-            subtotal = item.product.price * item.quantity
-            cart_items.append({
-                'product': item.product,
-                'quantity': item.quantity
-            })
-            total += subtotal
-        
         user_id = current_user.id
     else:
-        # Use session cart for anonymous users
-        cart = session.get('cart', [])
-        if not cart:
-            flash('Your cart is empty', 'info')
-            return redirect(url_for('products'))
+        # Guest checkout: record the order against a guest account for the email
+        user_id = accounts.get_or_create_guest(email, name)
+    
+    # Create order and its items
+    try:
+        order_id = orders.create_order(user_id, cart_items, total, address, idempotency_key=key)
         
-        for item in cart:
-            product = Product.query.get(item['product_id'])
-            if product:
-                cart_items.append({
-                    'product': product,
-                    'quantity': item['quantity']
-                })
-                total += product.price * item['quantity']
+        # Clear the cart
+        shopping_cart.clear_cart()
         
-        # For demo purposes, create a user if not exists
-        user = User.query.filter_by(email=email).first()
-        if not user:
-            user = User(username=name, email=email)
-            user.set_password('temporary')  # Set a temporary password for guest users
-            db.session.add(user)
-            db.session.flush()
-        user_id = user.id
-    
-    # Create order
-    order = Order(user_id=user_id, total_amount=total, shipping_address=address)
-    db.session.add(order)
-    db.session.flush()
-    
-    # Add order items
-    for item in cart_items:
-        product = item['product']
-        order_item = OrderItem(
-            order_id=order.id,
-            product_id=product.id,
-            product_name=product.name,
-            quantity=item['quantity'],
-            price=product.price
-        )
-        db.session.add(order_item)
-    
-    # Clear the cart
-    if current_user.is_authenticated:
-        CartItem.query.filter_by(user_id=current_user.id).delete()
-    else:
-        session.pop('cart', None)
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent duplicate submit placed the order first
+        db.session.rollback()
+        order_id = orders.find_order_for_key(key)
+        if order_id is None:
+            raise
+        return redirect(url_for('confirmation', order_id=order_id))
     
-    db.session.commit()
     flash('Your order has been placed successfully!', 'success')
-    return redirect(url_for('confirmation', order_id=order.id))
+    return redirect(url_for('confirmation', order_id=order_id))
 
 @app.route('/confirmation/<int:order_id>')
 def confirmation(order_id):
@@ -467,93 +376,53 @@ def payment_success():
         flash('Payment session not found.', 'error')
         return redirect(url_for('checkout'))
     
-    # Retrieve the session from Stripe
-    checkout_session = stripe_integration.retrieve_session(session_id)
-    
-    if checkout_session is None or checkout_session.payment_status != 'paid':
-        flash('Payment verification failed. Please try again or contact support.', 'error')
+    # Already fulfilled sessions are answered from memory, without Stripe or the database
+    known, order_id = fulfillment.order_for_session(session_id)
+    if not known:
+        flash('Payment session not found.', 'error')
         return redirect(url_for('checkout'))
     
-    # Process the order based on the successful payment
-    cart_items = []
-    total = 0
-    address = checkout_session.customer_details.address.line1
-    
-    if current_user.is_authenticated:
-        # Get cart items from database for authenticated users
-        db_cart_items = CartItem.query.filter_by(user_id=current_user.id).all()
-        
-        for item in db_cart_items:
-            subtotal = item.product.price * item.quantity
-            cart_items.append({
-                'product': item.product,
-                'quantity': item.quantity
-            })
-            total += subtotal
-        
-        user_id = current_user.id
-    else:
-        # Use session cart for anonymous users
-        cart = session.get('cart', [])
-        if not cart:
-            flash('Your cart is empty', 'info')
-            return redirect(url_for('products'))
-        
-        for item in cart:
-            product = Product.query.get(item['product_id'])
-            if product:
-                cart_items.append({
-                    'product': product,
-                    'quantity': item['quantity']
-                })
-                total += product.price * item['quantity']
+    if order_id is None and app.config['FULFILL_INLINE']:
+        # No webhook configured: verify the payment with Stripe and write the order now
+        checkout_session = stripe_integration.retrieve_session(session_id)
         
-        # Create a user with email from Stripe checkout session
-        email = checkout_session.customer_details.email
-        name = checkout_session.customer_details.name or email.split('@')[0]
+        if checkout_session is None or checkout_session.payment_status != 'paid':
+            flash('Payment verification failed. Please try again or contact support.', 'error')
+            return redirect(url_for('checkout'))
         
-        user = User.query.filter_by(email=email).first()
-        if not user:
-            user = User(username=name, email=email)
-            user.set_password('temporary')  # Set a temporary password for guest users
-            db.session.add(user)
-            db.session.flush()
-        user_id = user.id
-    
-    # Create order with payment information
-    order = Order(
-        user_id=user_id, 
-        total_amount=total, 
-        shipping_address=address,
-        status='Paid'  # Mark as paid since payment was successful
-    )
-    db.session.add(order)
-    db.session.flush()
+        details = checkout_session.customer_details
+        order_id = fulfillment.fulfill_session(session_id, details.email, details.name,
+                                               details.address.line1 if details.address else None)
     
-    # Add order items
-    for item in cart_items:
-        product = item['product']
-        order_item = OrderItem(
-            order_id=order.id,
-            product_id=product.id,
-            product_name=product.name,
-            quantity=item['quantity'],
-            price=product.price
-        )
-        db.session.add(order_item)
-    
-    # Clear the cart
-    if current_user.is_authenticated:
-        CartItem.query.filter_by(user_id=current_user.id).delete()
-    else:
+    # The paid cart now lives in the payment session, so clear the visitor's copy
+    if not current_user.is_authenticated:
         session.pop('cart', None)
     
     # Remove checkout session ID from session
     session.pop('stripe_checkout_id', None)
     
-    db.session.commit()
+    if order_id is None:
+        # The webhook hasn't been processed yet; the page reloads until the order exists
+        return render_template('payment_success.html', pending=True)
+    
     flash('Your payment was successful! Your order has been placed.', 'success')
-    return redirect(url_for('confirmation', order_id=order.id))
+    return redirect(url_for('confirmation', order_id=order_id))
+
+@app.route('/stripe/webhook', methods=['POST'])
+def stripe_webhook():
+    """Receive Stripe webhook events and queue paid checkouts for fulfillment"""
+    secret = app.config['STRIPE_WEBHOOK_SECRET']
+    if not secret:
+        return jsonify({'success': False, 'message': 'Webhooks are not configured'}), 404
+    
+    event = stripe_integration.parse_webhook_event(request.get_data(),
+                                                   request.headers.get('Stripe-Signature', ''),
+                                                   secret)
+    if event is None:
+        return jsonify({'success': False, 'message': 'Invalid signature'}), 400
+    
+    fulfillment.enqueue_event(event)
+    return jsonify({'success': True})
 
 @app.route('/payment-cancel')
 def payment_cancel():
@@ -565,14 +434,88 @@ def payment_cancel():
     return redirect(url_for('checkout'))
 
 # Voice command endpoints
+def parse_voice_command(command_text):
+    """Parse a voice command and resolve any product it names to a product id."""
+    result = voice_commands.process_command(command_text)
+    
+    # Resolve "add X to cart" to a concrete product so the client can add it directly
+    if result.get('action') == 'cart':
+        match = product_names.resolve(result['data']['product'])
+        if match:
+            result['data']['product_id'] = match.id
+            result['data']['product_name'] = match.name
+    
+    return result
+
 @app.route('/process_voice_command', methods=['POST'])
 def process_voice_command():
     command_text = request.form.get('command', '')
     if not command_text:
         return jsonify({'success': False, 'message': 'No command provided'})
     
-    result = voice_commands.process_command(command_text)
-    return jsonify(result)
+    return jsonify(parse_voice_command(command_text))
+
+@app.route('/process_voice_commands', methods=['POST'])
+def process_voice_commands():
+    """
+    Parse a batch of recognized utterances in one request.
+    
+    Expects a JSON body {"utterances": [...], "min_confidence": 0.0} where each
+    utterance is a string or {"text": ..., "confidence": ...}. Returns the
+    parsed results in the same order. Repeated utterances are parsed once and
+    marked as duplicates, and utterances recognized with a confidence below
+    min_confidence are skipped.
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'success': False, 'message': 'Expected a JSON object'}), 400
+    utterances = payload.get('utterances')
+    if not isinstance(utterances, list) or not utterances:
+        return jsonify({'success': False, 'message': 'No commands provided'}), 400
+    if len(utterances) > app.config['VOICE_BATCH_LIMIT']:
+        return jsonify({'success': False, 'message': 'Too many commands in one request'}), 400
+    
+    min_confidence = payload.get('min_confidence') or 0
+    try:
+        if isinstance(min_confidence, bool):
+            raise ValueError(min_confidence)
+        min_confidence = float(min_confidence)
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'min_confidence must be a number'}), 400
+    
+    results = []
+    parsed = {}
+    
+    for utterance in utterances:
+        if isinstance(utterance, dict):
+            command_text = utterance.get('text') or ''
+            confidence = utterance.get('confidence')
+        else:
+            command_text = utterance
+            confidence = None
+        if not isinstance(command_text, str):
+            results.append({'success': False,
+                            'error': 'Each utterance must be a string or an object with a "text" string'})
+            continue
+        if isinstance(confidence, bool) or not isinstance(confidence, (int, float)):
+            confidence = None
+        
+        key = command_text.lower().strip()
+        if not key:
+            result = {'success': False, 'message': 'No command provided'}
+        elif confidence is not None and confidence < min_confidence:
+            result = {'success': False, 'skipped': True,
+                      'message': "I'm not sure I heard that correctly. Please try again."}
+        elif key in parsed:
+            result = dict(parsed[key], duplicate=True)
+        else:
+            result = parsed[key] = parse_voice_command(command_text)
+        
+        if confidence is not None:
+            result = dict(result, confidence=confidence)
+        results.append(result)
+    
+    return jsonify({'success': True, 'results': results})
 
 # Authentication routes
 @app.route('/login', methods=['GET', 'POST'])
@@ -603,10 +546,14 @@ def signup():
     
     form = SignupForm()
     if form.validate_on_submit():
-        user = User(username=form.username.data, email=form.email.data)
+        # Signing up with the email of an earlier guest checkout takes over that account and its orders
+        user = accounts.get_guest(form.email.data)
+        if user is None:
+            user = User(email=form.email.data)
+            db.session.add(user)
+        user.username = form.username.data
         user.set_password(form.password.data)
         
-        db.session.add(user)
         db.session.commit()
         
         flash('Your account has been created! You can now log in.', 'success')
@@ -637,6 +584,9 @@ def set_accessibility():
     
     return jsonify({'success': True})
 
+app.add_template_global(catalog.category_name)
+app.add_template_global(fragments.cached_product_card)
+
 @app.context_processor
 def inject_accessibility_settings():
     default_settings = {
@@ -0,0 +1,139 @@
+import re
+import logging
+
+from sqlalchemy import text, func, literal_column, table, column, type_coerce, Float
+from app import db
+from models import Product
+
+# This module provides ranked full-text search over the product catalog.
+# SQLite uses an FTS5 external-content table kept in sync by triggers,
+# PostgreSQL uses a GIN index over a tsvector expression.
+
+FTS_TABLE = 'product_fts'
+PG_INDEX = 'ix_product_search'
+
+_fts = table(FTS_TABLE, column('rowid'), column('rank', Float))
+
+_token_pattern = re.compile(r'\w+', re.UNICODE)
+
+_sqlite_setup = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, description, audio_description,
+        content='product', content_rowid='id',
+        tokenize='porter unicode61'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON product BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, description, audio_description)
+        VALUES (new.id, new.name, new.description, new.audio_description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description, audio_description)
+        VALUES ('delete', old.id, old.name, old.description, old.audio_description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description, audio_description)
+        VALUES ('delete', old.id, old.name, old.description, old.audio_description);
+        INSERT INTO {FTS_TABLE}(rowid, name, description, audio_description)
+        VALUES (new.id, new.name, new.description, new.audio_description);
+    END""",
+]
+
+
+def _dialect():
+    return db.session.get_bind(mapper=Product.__mapper__).dialect.name
+
+
+def _pg_document():
+    return func.to_tsvector(
+        literal_column("'english'"),
+        func.coalesce(Product.name, '') + ' ' +
+        func.coalesce(Product.description, '') + ' ' +
+        func.coalesce(Product.audio_description, '')
+    )
+
+
+def _tokens(search_query):
+    return _token_pattern.findall(search_query.lower())
+
+
+def init_search(connection=None):
+    """
+    Create the full-text index for the configured database if it is missing.
+
+    Safe to call on every startup: the SQLite table and triggers are only
+    created (and back-filled from existing products) the first time, and the
+    PostgreSQL index uses IF NOT EXISTS.
+
+    Args:
+        connection: Connection to create the index on, in its open
+            transaction, which the caller commits. Without one the index is
+            created through db.session and committed.
+    """
+    executor = db.session if connection is None else connection
+    dialect = _dialect() if connection is None else connection.dialect.name
+
+    if dialect == 'sqlite':
+        exists = executor.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {'name': FTS_TABLE}
+        ).first()
+        for statement in _sqlite_setup:
+            executor.execute(text(statement))
+        if not exists:
+            executor.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+            logging.info("Built SQLite FTS5 product search index")
+    elif dialect == 'postgresql':
+        executor.execute(text(
+            f"CREATE INDEX IF NOT EXISTS {PG_INDEX} ON product USING GIN ("
+            "to_tsvector('english', coalesce(name, '') || ' ' || coalesce(description, '') "
+            "|| ' ' || coalesce(audio_description, '')))"
+        ))
+    else:
+        logging.warning(f"No full-text search index for dialect {dialect}; using LIKE scans")
+
+    if connection is None:
+        db.session.commit()
+
+
+def search_products(query, search_query):
+    """
+    Restrict a Product query to rows matching the search text.
+
+    Every word in the search text must match (as a prefix) in the name,
+    description or audio description.
+
+    Args:
+        query: A Product query to filter
+        search_query: Raw text from the search box or a voice command
+
+    Returns:
+        Tuple of (filtered query, relevance expression). Ordering by the
+        relevance expression ascending puts the best matches first. The
+        expression is None when the backend cannot rank results.
+    """
+    tokens = _tokens(search_query)
+    if not tokens:
+        return query.filter(db.false()), None
+
+    dialect = _dialect()
+
+    if dialect == 'sqlite':
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        query = query.join(_fts, _fts.c.rowid == Product.id).filter(
+            literal_column(FTS_TABLE).op('MATCH')(match)
+        )
+        return query, _fts.c.rank
+
+    if dialect == 'postgresql':
+        ts_query = func.to_tsquery(
+            literal_column("'english'"), ' & '.join(f'{token}:*' for token in tokens)
+        )
+        document = _pg_document()
+        query = query.filter(document.op('@@')(ts_query))
+        return query, type_coerce(-func.ts_rank(document, ts_query), Float)
+
+    for token in tokens:
+        query = query.filter(Product.name.ilike(f'%{token}%') |
+                             Product.description.ilike(f'%{token}%') |
+                             Product.audio_description.ilike(f'%{token}%'))
+    return query, None
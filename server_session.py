@@ -0,0 +1,208 @@
+import os
+import abc
+import time
+import zlib
+import sqlite3
+import secrets
+import logging
+import threading
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from flask_login import user_logged_in
+from itsdangerous import Signer, BadSignature
+from werkzeug.datastructures import CallbackDict
+
+# Server-side sessions. Flask's default session is the whole session dict,
+# serialized and signed into the cookie on every request, so the anonymous
+# cart makes every request carry a cookie that grows with the cart. Here the
+# cookie only carries a signed random session id, and the data lives in a
+# server-side store as zlib-compressed tagged JSON, written only when the
+# session changed. The cookie stays the same size however big the cart is.
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session dict that remembers its id and whether it was modified."""
+
+    def __init__(self, initial=None, sid=None, new=False, expires=None):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.expires = expires
+        self.modified = False
+        self.rotated_from = None
+
+    def regenerate(self):
+        """Move the session to a new id, e.g. on login, so a previously known id stops working."""
+        if self.rotated_from is None:
+            self.rotated_from = self.sid
+        self.sid = _new_session_id()
+        self.modified = True
+
+
+class SessionStore(abc.ABC):
+    """
+    Interface of a server-side session store. Values are opaque bytes.
+
+    Stores must be safe to use from several threads.
+    """
+
+    @abc.abstractmethod
+    def load(self, sid):
+        """Get (data, expires) stored for a session id, or None if it is unknown or expired."""
+
+    @abc.abstractmethod
+    def save(self, sid, data, expires):
+        """Store data for a session id until the ``expires`` unix timestamp."""
+
+    @abc.abstractmethod
+    def delete(self, sid):
+        """Forget a session id."""
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Session store in a local SQLite file, shared by all workers on the host.
+
+    Args:
+        path: Database file path
+        cleanup_interval: Seconds between purges of expired sessions
+    """
+
+    def __init__(self, path, cleanup_interval=600):
+        self.path = path
+        self.cleanup_interval = cleanup_interval
+        self._local = threading.local()
+        self._next_cleanup = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connection() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS session '
+                               '(id TEXT PRIMARY KEY, data BLOB NOT NULL, expires REAL NOT NULL)')
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def load(self, sid):
+        return self._connection().execute('SELECT data, expires FROM session WHERE id = ? AND expires > ?',
+                                          (sid, time.time())).fetchone()
+
+    def save(self, sid, data, expires):
+        connection = self._connection()
+        connection.execute('INSERT OR REPLACE INTO session (id, data, expires) VALUES (?, ?, ?)',
+                           (sid, data, expires))
+        now = time.time()
+        if now >= self._next_cleanup:
+            self._next_cleanup = now + self.cleanup_interval
+            connection.execute('DELETE FROM session WHERE expires <= ?', (now,))
+
+    def delete(self, sid):
+        self._connection().execute('DELETE FROM session WHERE id = ?', (sid,))
+
+
+def _new_session_id():
+    return secrets.token_urlsafe(32)
+
+
+class ServerSessionInterface(SessionInterface):
+    """
+    Flask session interface keeping session data in a SessionStore.
+
+    The cookie holds the session id signed with the app's secret key. Empty
+    sessions are never stored and get no cookie, and sessions are only
+    written back when they changed or half of their lifetime has passed.
+    """
+
+    serializer = TaggedJSONSerializer()
+    salt = 'server-session'
+
+    def __init__(self, store):
+        self.store = store
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt=self.salt, key_derivation='hmac')
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode('ascii')
+            except BadSignature:
+                sid = None
+            if sid:
+                try:
+                    stored = self.store.load(sid)
+                    if stored is not None:
+                        data, expires = stored
+                        return ServerSession(self.serializer.loads(zlib.decompress(data).decode('utf-8')),
+                                             sid=sid, expires=expires)
+                except Exception as e:
+                    logging.error(f"Error loading session: {str(e)}")
+        return ServerSession(sid=_new_session_id(), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.rotated_from is not None:
+            self.store.delete(session.rotated_from)
+
+        if not session:
+            # Nothing to keep: drop the stored session and its cookie, if there were any
+            if not session.new:
+                self.store.delete(session.sid)
+            if not session.new or session.rotated_from is not None:
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app),
+                                       httponly=self.get_cookie_httponly(app),
+                                       samesite=self.get_cookie_samesite(app))
+            return
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        # Unchanged sessions are only written back to push out their expiry once half of it has passed
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        if session.modified or session.new or session.expires - time.time() < lifetime / 2:
+            data = zlib.compress(self.serializer.dumps(dict(session)).encode('utf-8'))
+            self.store.save(session.sid, data, time.time() + lifetime)
+
+        # The id doesn't change when the data does, so the cookie is only sent when the id is new
+        refresh = session.permanent and app.config['SESSION_REFRESH_EACH_REQUEST']
+        if session.new or session.rotated_from is not None or refresh:
+            response.set_cookie(
+                name,
+                self._signer(app).sign(session.sid).decode('ascii'),
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
+
+
+def _rotate_on_login(sender, user, **extra):
+    from flask import session
+    if isinstance(session, ServerSession):
+        session.regenerate()
+
+
+def init_app(app):
+    """Install the session backend selected by the SESSION_BACKEND config value ('sqlite' or 'cookie')."""
+    backend = app.config['SESSION_BACKEND']
+    if backend == 'cookie':
+        return
+    if backend != 'sqlite':
+        raise ValueError(f"Unknown SESSION_BACKEND {backend!r}")
+    path = app.config['SESSION_DB_PATH'] or os.path.join(app.instance_path, 'sessions.db')
+    app.session_interface = ServerSessionInterface(SQLiteSessionStore(path))
+    user_logged_in.connect(_rotate_on_login, app)
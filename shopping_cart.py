@@ -0,0 +1,132 @@
+from flask import session
+from flask_login import current_user
+from sqlalchemy import delete, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import joinedload
+
+from app import db
+from models import Product, CartItem
+
+# Shared cart loading for the cart, checkout and order placement routes.
+# Products for every line are fetched in a single query: a JOIN for the
+# database cart of logged-in users, an IN (...) lookup for the session cart
+# of anonymous visitors.
+#
+# Database cart writes are single atomic statements: adding is an
+# INSERT ... ON CONFLICT (user_id, product_id) DO UPDATE that increments the
+# quantity, and removing is a DELETE ... RETURNING. Concurrent adds of the
+# same product (a double click, voice and mouse together) therefore sum up
+# instead of losing an update or creating a second line.
+
+_UPSERT_DIALECTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+
+def load_cart():
+    """
+    Load the current visitor's cart with its products and prices.
+
+    Lines whose product no longer exists are dropped.
+
+    Returns:
+        Tuple of (cart_items, total) where cart_items is a list of dicts with keys:
+            - product: Product object
+            - quantity: Number of items
+            - subtotal: product.price * quantity
+    """
+    if current_user.is_authenticated:
+        db_cart_items = (CartItem.query
+                         .options(joinedload(CartItem.product))
+                         .filter_by(user_id=current_user.id)
+                         .order_by(CartItem.id)
+                         .all())
+        lines = [(item.product, item.quantity) for item in db_cart_items]
+    else:
+        cart = session.get('cart', [])
+        product_ids = [item['product_id'] for item in cart]
+        products = {}
+        if product_ids:
+            products = {product.id: product
+                        for product in Product.query.filter(Product.id.in_(product_ids))}
+        lines = [(products.get(item['product_id']), item['quantity']) for item in cart]
+
+    cart_items = []
+    total = 0
+    for product, quantity in lines:
+        if product is None:
+            continue
+        subtotal = product.price * quantity
+        cart_items.append({
+            'product': product,
+            'quantity': quantity,
+            'subtotal': subtotal
+        })
+        total += subtotal
+
+    return cart_items, total
+
+
+def clear_cart():
+    """Empty the current visitor's cart. The caller commits the session."""
+    if current_user.is_authenticated:
+        CartItem.query.filter_by(user_id=current_user.id).delete()
+    else:
+        session.pop('cart', None)
+
+
+def add_item(user_id, product_id, quantity):
+    """
+    Add quantity of a product to a user's database cart. The caller commits the session.
+
+    Returns:
+        The line's quantity after the add
+    """
+    dialect = db.session.get_bind(mapper=CartItem.__mapper__).dialect.name
+    insert = _UPSERT_DIALECTS.get(dialect)
+    if insert is None:
+        # No upsert support: read, modify and write the line
+        cart_item = CartItem.query.filter_by(user_id=user_id, product_id=product_id).first()
+        if cart_item is None:
+            cart_item = CartItem(user_id=user_id, product_id=product_id, quantity=0)
+            db.session.add(cart_item)
+        cart_item.quantity += quantity
+        db.session.flush()
+        return cart_item.quantity
+
+    statement = insert(CartItem).values(user_id=user_id, product_id=product_id, quantity=quantity)
+    statement = statement.on_conflict_do_update(
+        index_elements=[CartItem.user_id, CartItem.product_id],
+        set_={'quantity': CartItem.quantity + statement.excluded.quantity},
+    ).returning(CartItem.quantity)
+    return db.session.execute(statement).scalar()
+
+
+def set_quantity(user_id, product_id, quantity):
+    """
+    Set the quantity of a line in a user's database cart, removing it if quantity is 0 or less.
+
+    The caller commits the session.
+
+    Returns:
+        True if the cart had a line for the product
+    """
+    if quantity <= 0:
+        return remove_item(user_id, product_id) is not None
+    return db.session.execute(
+        update(CartItem)
+        .where(CartItem.user_id == user_id, CartItem.product_id == product_id)
+        .values(quantity=quantity)
+    ).rowcount > 0
+
+
+def remove_item(user_id, product_id):
+    """
+    Remove a product's line from a user's database cart. The caller commits the session.
+
+    Returns:
+        The removed line's quantity, or None if there was no line for the product
+    """
+    return db.session.execute(
+        delete(CartItem)
+        .where(CartItem.user_id == user_id, CartItem.product_id == product_id)
+        .returning(CartItem.quantity)
+    ).scalar()
@@ -59,8 +59,12 @@ function initVoiceControl() {
     
     // Handle results
     recognition.onresult = function(event) {
-        const command = event.results[0][0].transcript;
-        processVoiceCommand(command);
+        for (let i = event.resultIndex; i < event.results.length; i++) {
+            if (event.results[i].isFinal) {
+                const alternative = event.results[i][0];
+                processVoiceCommand(alternative.transcript, alternative.confidence);
+            }
+        }
     };
     
     // Handle errors
@@ -144,29 +148,55 @@ function addVoiceCommandButton() {
     document.body.appendChild(button);
 }
 
+// Recognized phrases waiting to be sent to the server in one batch
+const voiceCommandQueue = [];
+let voiceCommandTimer = null;
+const VOICE_BATCH_DELAY_MS = 150;
+
 /**
- * Process voice command by sending to server
+ * Queue a voice command; queued commands are sent to the server together
  */
-function processVoiceCommand(command) {
+function processVoiceCommand(command, confidence) {
     console.log('Processing voice command:', command);
     announceToScreenReader(`Command received: ${command}`);
     
-    // Send to server for processing
-    const formData = new FormData();
-    formData.append('command', command);
+    voiceCommandQueue.push({text: command, confidence: confidence});
+    clearTimeout(voiceCommandTimer);
+    voiceCommandTimer = setTimeout(flushVoiceCommands, VOICE_BATCH_DELAY_MS);
+}
+
+/**
+ * Send all queued voice commands to the server and act on the results in order
+ */
+function flushVoiceCommands() {
+    const utterances = voiceCommandQueue.splice(0, voiceCommandQueue.length);
+    if (utterances.length === 0) {
+        return;
+    }
     
-    fetch('/process_voice_command', {
+    fetch('/process_voice_commands', {
         method: 'POST',
-        body: formData
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({utterances: utterances})
     })
     .then(response => response.json())
     .then(data => {
-        if (data.success) {
-            announceToScreenReader(data.message);
-            executeCommandAction(data.action, data.data);
-        } else {
+        if (!data.success) {
             announceToScreenReader(data.message);
+            return;
         }
+        
+        data.results.forEach(result => {
+            // The server parsed repeated phrases once; act on them once too
+            if (result.duplicate) {
+                return;
+            }
+            
+            announceToScreenReader(result.message);
+            if (result.success) {
+                executeCommandAction(result.action, result.data);
+            }
+        });
     })
     .catch(error => {
         console.error('Error processing voice command:', error);
@@ -208,8 +238,17 @@ function executeCommandAction(action, data) {
                         window.location.href = `/products?search=${encodeURIComponent(data.category)}`;
                     }
                 }
+            } else if (data.page) {
+                // Follow the listing's previous/next page link
+                if (!followPageLink(data.page === 'next' ? 'next' : 'prev')) {
+                    announceToScreenReader(`There is no ${data.page} page`);
+                }
             } else if (data.direction) {
-                // Navigate browser history
+                // On paginated listings go back/forward moves between pages,
+                // elsewhere it navigates browser history
+                if (followPageLink(data.direction === 'forward' ? 'next' : 'prev')) {
+                    break;
+                }
                 if (data.direction === 'back') {
                     window.history.back();
                 } else if (data.direction === 'forward') {
@@ -219,7 +258,10 @@ function executeCommandAction(action, data) {
             break;
             
         case 'cart':
-            if (data.operation === 'add') {
+            if (data.operation === 'add' && data.product_id) {
+                // The server resolved the spoken name to a product
+                addProductToCart(data.product_id);
+            } else if (data.operation === 'add') {
                 // Find product by name
                 const addButton = [...document.querySelectorAll('.add-to-cart-button')]
                     .find(btn => {
@@ -266,6 +308,40 @@ function executeCommandAction(action, data) {
     }
 }
 
+/**
+ * Add a product to the cart by posting the same form the product cards use
+ */
+function addProductToCart(productId) {
+    const form = document.createElement('form');
+    form.method = 'post';
+    form.action = '/add_to_cart';
+    
+    const fields = {'product_id': productId, 'quantity': 1};
+    for (const [name, value] of Object.entries(fields)) {
+        const input = document.createElement('input');
+        input.type = 'hidden';
+        input.name = name;
+        input.value = value;
+        form.appendChild(input);
+    }
+    
+    document.body.appendChild(form);
+    form.submit();
+}
+
+/**
+ * Follow the rel="next"/rel="prev" pagination link on the page, if any
+ */
+function followPageLink(rel) {
+    const link = document.querySelector(`a[rel="${rel}"]`);
+    if (!link) {
+        return false;
+    }
+    
+    window.location.href = link.href;
+    return true;
+}
+
 /**
  * Increase text size and return new size
  */
@@ -1,14 +1,162 @@
 import os
-import stripe
+import json
+import time
+import uuid
 import logging
+import threading
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
 
-# Initialize Stripe with the secret key
-stripe.api_key = os.environ.get('STRIPE_SECRET_KEY')
+import metrics
 
-def create_checkout_session(items, success_url, cancel_url):
+# stripe and requests are imported when first needed: they take a noticeable
+# share of worker startup and most workers never talk to Stripe before
+# their first requests are served.
+
+# Payment gateway configuration
+PAYMENT_GATEWAY = os.environ.get('PAYMENT_GATEWAY', 'stripe')  # 'stripe' or 'fake'
+STRIPE_CONNECT_TIMEOUT = float(os.environ.get('STRIPE_CONNECT_TIMEOUT', 3))
+STRIPE_READ_TIMEOUT = float(os.environ.get('STRIPE_READ_TIMEOUT', 10))
+STRIPE_MAX_RETRIES = int(os.environ.get('STRIPE_MAX_RETRIES', 2))
+STRIPE_CONNECTION_POOL_SIZE = int(os.environ.get('STRIPE_CONNECTION_POOL_SIZE', 10))
+# Most Stripe calls in flight at once per process (0 for no limit). Calls run
+# on a thread pool of this size while the request thread waits for the
+# result, so this caps concurrency rather than freeing the request thread.
+STRIPE_THREAD_POOL_SIZE = int(os.environ.get('STRIPE_THREAD_POOL_SIZE', 0))
+# How long a request waits for one call, queueing and retries included, when the limit is set
+STRIPE_CALL_DEADLINE = float(os.environ.get('STRIPE_CALL_DEADLINE', 30))
+
+
+class StripeGateway:
+    """
+    Stripe API client with a shared keep-alive connection pool, explicit
+    connect/read timeouts and a bounded number of network retries.
+    """
+
+    def __init__(self, api_key, connect_timeout=STRIPE_CONNECT_TIMEOUT, read_timeout=STRIPE_READ_TIMEOUT,
+                 max_retries=STRIPE_MAX_RETRIES, pool_size=STRIPE_CONNECTION_POOL_SIZE):
+        import stripe
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        http_client = stripe.RequestsClient(timeout=(connect_timeout, read_timeout), session=session)
+        self.client = stripe.StripeClient(api_key, http_client=http_client, max_network_retries=max_retries)
+
+    def create_checkout_session(self, line_items, success_url, cancel_url, idempotency_key=None):
+        options = {'idempotency_key': idempotency_key} if idempotency_key else None
+        return self.client.v1.checkout.sessions.create(params={
+            'payment_method_types': ['card'],
+            'line_items': line_items,
+            'mode': 'payment',
+            'success_url': success_url,
+            'cancel_url': cancel_url,
+            'automatic_tax': {'enabled': True}
+        }, options=options)
+
+    def retrieve_session(self, session_id):
+        return self.client.v1.checkout.sessions.retrieve(session_id)
+
+    def create_payment_intent(self, amount, currency, metadata):
+        return self.client.v1.payment_intents.create(params={
+            'amount': amount,
+            'currency': currency,
+            'metadata': metadata
+        })
+
+
+class FakeGateway:
+    """
+    Offline stand-in for Stripe, for local development and load tests.
+
+    Checkout sessions are always paid. Their hosted page URL is the success
+    URL itself, so a client following the redirect lands straight on
+    payment_success. It keeps no state, so any worker can "retrieve" a
+    session created by another one.
+    """
+
+    prefix = 'cs_fake_'
+
+    def __init__(self, email=None, name=None, address=None):
+        self.email = email or os.environ.get('FAKE_GATEWAY_EMAIL', 'load-test@example.com')
+        self.name = name or os.environ.get('FAKE_GATEWAY_NAME', 'Load Test')
+        self.address = address or os.environ.get('FAKE_GATEWAY_ADDRESS', '1 Test Street')
+
+    def _session(self, session_id, url=None):
+        return SimpleNamespace(
+            id=session_id,
+            url=url,
+            payment_status='paid',
+            customer_details=SimpleNamespace(
+                email=self.email,
+                name=self.name,
+                address=SimpleNamespace(line1=self.address)
+            )
+        )
+
+    def create_checkout_session(self, line_items, success_url, cancel_url, idempotency_key=None):
+        session_id = self.prefix + (idempotency_key or uuid.uuid4().hex)
+        return self._session(session_id, url=success_url.replace('{CHECKOUT_SESSION_ID}', session_id))
+
+    def retrieve_session(self, session_id):
+        if not session_id.startswith(self.prefix):
+            raise ValueError(f"Unknown checkout session {session_id}")
+        return self._session(session_id)
+
+    def create_payment_intent(self, amount, currency, metadata):
+        return SimpleNamespace(id='pi_fake_' + uuid.uuid4().hex, amount=amount,
+                               currency=currency, metadata=metadata, status='succeeded')
+
+
+_gateway = None
+_executor = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway():
+    """Get the process-wide payment gateway selected by PAYMENT_GATEWAY."""
+    global _gateway, _executor
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                if STRIPE_THREAD_POOL_SIZE > 0:
+                    _executor = ThreadPoolExecutor(max_workers=STRIPE_THREAD_POOL_SIZE,
+                                                   thread_name_prefix='stripe')
+                if PAYMENT_GATEWAY == 'fake':
+                    _gateway = FakeGateway()
+                else:
+                    _gateway = StripeGateway(os.environ.get('STRIPE_SECRET_KEY'))
+    return _gateway
+
+
+def _call(method, *args, **kwargs):
+    """
+    Run a gateway call, limited to STRIPE_THREAD_POOL_SIZE calls at once if set.
+
+    The request thread still blocks until the call finishes; with the limit
+    set it gives up after STRIPE_CALL_DEADLINE seconds, although the call
+    itself keeps its pool thread until Stripe answers or times out.
+    """
+    gateway = get_gateway()
+    call = getattr(gateway, method)
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        if _executor is None:
+            result = call(*args, **kwargs)
+        else:
+            result = _executor.submit(call, *args, **kwargs).result(timeout=STRIPE_CALL_DEADLINE)
+        outcome = 'ok'
+        return result
+    finally:
+        metrics.observe_stripe_call(method, time.perf_counter() - start, outcome)
+
+
+def create_checkout_session(items, success_url, cancel_url, idempotency_key=None):
     """
     Create a Stripe checkout session for payment processing.
-    
+
     Args:
         items: List of dictionaries containing product details with keys:
             - name: Product name
@@ -17,7 +165,9 @@ def create_checkout_session(items, success_url, cancel_url):
             - quantity: Number of items
         success_url: URL to redirect after successful payment
         cancel_url: URL to redirect if payment is cancelled
-        
+        idempotency_key: Optional key; retrying with the same key returns the
+            session created by the first call instead of a new one
+
     Returns:
         Checkout session ID or None if an error occurs
     """
@@ -36,19 +186,11 @@ def create_checkout_session(items, success_url, cancel_url):
                 },
                 'quantity': item['quantity'],
             })
-        
+
         # Create the checkout session
-        checkout_session = stripe.checkout.Session.create(
-            payment_method_types=['card'],
-            line_items=line_items,
-            mode='payment',
-            success_url=success_url,
-            cancel_url=cancel_url,
-            automatic_tax={'enabled': True}
-        )
-        
-        return checkout_session
-    
+        return _call('create_checkout_session', line_items, success_url, cancel_url,
+                     idempotency_key=idempotency_key)
+
     except Exception as e:
         logging.error(f"Error creating Stripe checkout session: {str(e)}")
         return None
@@ -56,15 +198,15 @@ def create_checkout_session(items, success_url, cancel_url):
 def retrieve_session(session_id):
     """
     Retrieve a checkout session by ID.
-    
+
     Args:
         session_id: The Stripe checkout session ID
-        
+
     Returns:
         Session object or None if an error occurs
     """
     try:
-        return stripe.checkout.Session.retrieve(session_id)
+        return _call('retrieve_session', session_id)
     except Exception as e:
         logging.error(f"Error retrieving Stripe session: {str(e)}")
         return None
@@ -72,36 +214,58 @@ def retrieve_session(session_id):
 def create_payment_intent(amount, currency='usd', metadata=None):
     """
     Create a payment intent directly.
-    
+
     Args:
         amount: Amount in dollars (will be converted to cents)
         currency: 3-letter currency code
         metadata: Additional data to attach to the payment
-        
+
     Returns:
         Payment intent object or None if an error occurs
     """
     try:
-        return stripe.PaymentIntent.create(
-            amount=int(amount * 100),  # Convert to cents
-            currency=currency,
-            metadata=metadata or {}
-        )
+        return _call('create_payment_intent', int(amount * 100), currency, metadata or {})  # Convert to cents
     except Exception as e:
         logging.error(f"Error creating payment intent: {str(e)}")
         return None
 
+def parse_webhook_event(payload, signature, secret):
+    """
+    Verify a webhook request's Stripe-Signature header and decode its event.
+
+    Signatures older than Stripe's default tolerance (5 minutes) are rejected.
+
+    Args:
+        payload: Raw request body (bytes)
+        signature: Value of the Stripe-Signature header
+        secret: Endpoint signing secret (whsec_...)
+
+    Returns:
+        Event as a dict, or None if the signature or payload is invalid
+    """
+    import stripe
+
+    try:
+        payload = payload.decode('utf-8')
+        # Without a tolerance the signed timestamp is not checked and a captured request could be replayed
+        stripe.WebhookSignature.verify_header(payload, signature, secret,
+                                              tolerance=stripe.Webhook.DEFAULT_TOLERANCE)
+        return json.loads(payload)
+    except Exception as e:
+        logging.warning(f"Rejected Stripe webhook: {str(e)}")
+        return None
+
 def format_stripe_error(error):
     """
     Format Stripe errors for display to the user
-    
+
     Args:
         error: Stripe error object
-        
+
     Returns:
         Human-readable error message
     """
     if hasattr(error, 'user_message'):
         return error.user_message
-    
-    return "An error occurred while processing your payment. Please try again."
\ No newline at end of file
+
+    return "An error occurred while processing your payment. Please try again."
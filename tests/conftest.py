@@ -0,0 +1,88 @@
+import os
+import sys
+import uuid
+import tempfile
+
+import pytest
+
+# The app reads its configuration from the environment at import time, so
+# the test database and session store are set up before it is imported.
+# One throwaway SQLite database is created and seeded for the whole run;
+# tests create their own users and products with unique names.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORKDIR = tempfile.mkdtemp(prefix='accessible-ecommerce-tests-')
+os.environ.update({
+    'DATABASE_URL': 'sqlite:///' + os.path.join(WORKDIR, 'test.db'),
+    'SESSION_DB_PATH': os.path.join(WORKDIR, 'sessions.db'),
+    'JINJA_BYTECODE_CACHE_DIR': '',
+    'PAYMENT_GATEWAY': 'fake',
+    'LOG_LEVEL': 'WARNING',
+})
+for name in ('STRIPE_WEBHOOK_SECRET', 'DATABASE_REPLICA_URLS', 'METRICS_TOKEN', 'SERVER_TIMING', 'SESSION_BACKEND'):
+    os.environ.pop(name, None)
+
+from app import app as flask_app, db  # noqa: E402
+import database  # noqa: E402
+from models import User, Category, Product  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app():
+    flask_app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with flask_app.app_context():
+        database.init_db()
+        database.seed_db()
+    return flask_app
+
+
+@pytest.fixture
+def app_context(app):
+    with app.app_context():
+        yield
+        db.session.rollback()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def unique(prefix):
+    return f'{prefix}-{uuid.uuid4().hex[:8]}'
+
+
+@pytest.fixture
+def make_user(app):
+    """Create a user with a password and return its id."""
+    def make(password='correct-horse-battery'):
+        with app.app_context():
+            name = unique('user')
+            user = User(username=name, email=f'{name}@example.com')
+            user.set_password(password)
+            db.session.add(user)
+            db.session.commit()
+            return user.id
+    return make
+
+
+@pytest.fixture
+def make_product(app):
+    """Create a product and return its id."""
+    def make(name=None, price=10.0, **fields):
+        with app.app_context():
+            category_id = fields.pop('category_id', None) or Category.query.first().id
+            product = Product(name=name or unique('Product'), description=fields.pop('description', 'Test product'),
+                              price=price, category_id=category_id, **fields)
+            db.session.add(product)
+            db.session.commit()
+            return product.id
+    return make
+
+
+def login(client, user_id):
+    """Log a test client in as a user without going through the login form."""
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
@@ -0,0 +1,76 @@
+from sqlalchemy import event
+
+from app import db
+from models import Order, User
+import accounts
+import orders
+import passwords
+from tests.conftest import unique
+
+
+def test_passwords_hash_and_verify():
+    password_hash = passwords.hash_password('correct-horse-battery')
+    assert password_hash != 'correct-horse-battery'
+    assert passwords.verify_password(password_hash, 'correct-horse-battery')
+    assert not passwords.verify_password(password_hash, 'wrong-password')
+    assert not passwords.verify_password(None, 'correct-horse-battery')
+
+
+def test_hashing_runs_inline_without_a_limit(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'PASSWORD_HASH_WORKERS', 0)
+    assert passwords.verify_password(passwords.hash_password('secret-words'), 'secret-words')
+
+
+def test_guest_account_has_no_password(app_context):
+    email = f"{unique('guest')}@example.com"
+    user_id = accounts.get_or_create_guest(email, 'Sam Guest')
+    db.session.commit()
+    assert accounts.get_or_create_guest(email) == user_id
+
+    user = db.session.get(User, user_id)
+    assert user.username.startswith('Sam Guest-')
+    assert user.password_hash is None and user.is_guest
+    assert not user.check_password('')
+    assert accounts.get_guest(email).id == user_id
+
+
+def test_signing_up_with_a_guest_email_keeps_its_orders(client, app):
+    email = f"{unique('guest')}@example.com"
+    with app.app_context():
+        guest_id = accounts.get_or_create_guest(email)
+        order_id = orders.create_order(guest_id, [], 0.0, '1 Test Street')
+        db.session.commit()
+
+    username = unique('member')
+    response = client.post('/signup', data={'username': username, 'email': email, 'password': 'long-password',
+                                            'confirm_password': 'long-password'})
+    assert response.status_code == 302
+
+    with app.app_context():
+        user = db.session.get(User, guest_id)
+        assert user.username == username and not user.is_guest
+        assert user.check_password('long-password')
+        assert db.session.get(Order, order_id).user_id == guest_id
+        assert accounts.get_guest(email) is None
+
+
+def test_guest_creation_race_uses_the_winning_row(app_context):
+    email = f"{unique('race')}@example.com"
+    winner = unique('winner')
+    lookups = []
+
+    def insert_competing_guest(conn, cursor, statement, parameters, context, executemany):
+        # Another checkout inserts the same guest right after the first lookup
+        if statement.lstrip().startswith('SELECT user.id') and email in parameters:
+            lookups.append(statement)
+            if len(lookups) == 1:
+                conn.exec_driver_sql('INSERT INTO user (username, email) VALUES (?, ?)', (winner, email))
+
+    event.listen(db.engine, 'after_cursor_execute', insert_competing_guest)
+    try:
+        user_id = accounts.get_or_create_guest(email, 'Loser')
+    finally:
+        event.remove(db.engine, 'after_cursor_execute', insert_competing_guest)
+    assert len(lookups) == 2
+    assert db.session.get(User, user_id).username == winner
+    assert User.query.filter_by(email=email).count() == 1
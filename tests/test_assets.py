@@ -0,0 +1,50 @@
+import gzip
+import json
+
+import pytest
+
+import assets
+
+
+@pytest.mark.parametrize('source, expected', [
+    ('var  total = a +  b;  // sum\n', 'var total=a+b;'),
+    ('x = a + +b;\ny = a - -b;', 'x=a+ +b;\ny=a- -b;'),
+    ("s = 'a  // not a comment';", "s='a  // not a comment';"),
+    ('t = `a  ${ b  +  c }  d`;', 't=`a  ${b+c}  d`;'),
+    ('if (/a b/.test(s)) return /x y/g;', 'if(/a b/.test(s))return/x y/g;'),
+    ('half = i++ / 2 / 1;', 'half=i++/2/1;'),
+    ('half = i-- / 2;', 'half=i--/2;'),
+    ('ratio = (a) / b / c;', 'ratio=(a)/b/c;'),
+    ('a = b /* one\n   two */ c()', 'a=b\nc()'),
+    ('a = b /* inline */ + c', 'a=b+c'),
+])
+def test_minify_js(source, expected):
+    assert assets.minify_js(source) == expected + '\n'
+
+
+def test_minify_css():
+    source = '/* theme */\nbody  {\n  color: red ;\n  margin: 0 auto;\n}\na > b , c { x: y }\n'
+    assert assets.minify_css(source) == 'body{color:red;margin:0 auto}a>b,c{x:y}\n'
+
+
+@pytest.fixture
+def dist_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(assets, 'DIST_DIR', str(tmp_path))
+    monkeypatch.setattr(assets, 'MANIFEST_PATH', str(tmp_path / 'manifest.json'))
+    monkeypatch.setattr(assets, '_manifest', None)
+    return tmp_path
+
+
+def test_built_assets_are_hashed_and_served_compressed(client, app, dist_dir):
+    manifest = assets.build_assets()
+    hashed = manifest['js/voice_control.js']
+    assert json.loads((dist_dir / 'manifest.json').read_text()) == manifest
+
+    with app.test_request_context('/'):
+        assert assets.asset_url('js/voice_control.js') == f'/assets/{hashed}'
+
+    response = client.get(f'/assets/{hashed}', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Cache-Control'] == assets.IMMUTABLE_CACHE_CONTROL
+    assert gzip.decompress(response.data) == (dist_dir / hashed).read_bytes()
+    assert client.get(f'/assets/{hashed}.gz').status_code == 404
@@ -0,0 +1,54 @@
+from flask import session
+from flask_login import login_user
+
+from app import app, db
+from models import User, CartItem
+import accounts
+import shopping_cart
+import query_profiler
+
+
+def test_session_cart_loads_all_products_in_one_query(app_context, make_product):
+    ids = [make_product(price=2.5) for _ in range(20)]
+    with app.test_request_context():
+        session['cart'] = [{'product_id': product_id, 'quantity': 2} for product_id in ids]
+        session['cart'].append({'product_id': 999999, 'quantity': 1})  # deleted product
+        with query_profiler.count_queries() as log:
+            cart_items, total = shopping_cart.load_cart()
+    assert len(log) == 1
+    assert [item['product'].id for item in cart_items] == ids
+    assert total == 20 * 2 * 2.5
+
+
+def test_database_cart_loads_lines_and_products_in_one_query(app_context, make_user, make_product):
+    user_id = make_user()
+    ids = [make_product(price=1.0) for _ in range(10)]
+    db.session.add_all(CartItem(user_id=user_id, product_id=product_id, quantity=3) for product_id in ids)
+    db.session.commit()
+
+    with app.test_request_context():
+        login_user(accounts.load_identity(user_id))
+        with query_profiler.count_queries() as log:
+            cart_items, total = shopping_cart.load_cart()
+            names = [item['product'].name for item in cart_items]
+    assert len(log) == 1
+    assert len(names) == 10
+    assert total == 30.0
+
+
+def test_clear_cart_empties_the_database_cart(app_context, make_user, make_product):
+    user_id = make_user()
+    db.session.add(CartItem(user_id=user_id, product_id=make_product(), quantity=1))
+    db.session.commit()
+    with app.test_request_context():
+        login_user(db.session.get(User, user_id))
+        shopping_cart.clear_cart()
+        db.session.commit()
+    assert CartItem.query.filter_by(user_id=user_id).count() == 0
+
+
+def test_clear_cart_empties_the_session_cart(app_context):
+    with app.test_request_context():
+        session['cart'] = [{'product_id': 1, 'quantity': 1}]
+        shopping_cart.clear_cart()
+        assert 'cart' not in session
@@ -0,0 +1,61 @@
+import threading
+
+from app import db
+from models import CartItem
+import shopping_cart
+from tests.conftest import login
+
+
+def _quantities(user_id):
+    return [(line.product_id, line.quantity) for line in CartItem.query.filter_by(user_id=user_id).order_by(CartItem.id)]
+
+
+def test_adding_twice_sums_into_one_line(app_context, make_user, make_product):
+    user_id, product_id = make_user(), make_product()
+    assert shopping_cart.add_item(user_id, product_id, 2) == 2
+    assert shopping_cart.add_item(user_id, product_id, 3) == 5
+    db.session.commit()
+    assert _quantities(user_id) == [(product_id, 5)]
+
+
+def test_concurrent_adds_are_not_lost(app, make_user, make_product):
+    user_id, product_id = make_user(), make_product()
+
+    def add():
+        with app.app_context():
+            shopping_cart.add_item(user_id, product_id, 1)
+            db.session.commit()
+
+    threads = [threading.Thread(target=add) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with app.app_context():
+        assert _quantities(user_id) == [(product_id, 8)]
+
+
+def test_set_quantity_updates_or_removes_the_line(app_context, make_user, make_product):
+    user_id, product_id = make_user(), make_product()
+    assert not shopping_cart.set_quantity(user_id, product_id, 4)
+    shopping_cart.add_item(user_id, product_id, 1)
+    assert shopping_cart.set_quantity(user_id, product_id, 4)
+    assert _quantities(user_id) == [(product_id, 4)]
+    assert shopping_cart.set_quantity(user_id, product_id, 0)
+    assert _quantities(user_id) == []
+
+
+def test_remove_item_returns_the_removed_quantity(app_context, make_user, make_product):
+    user_id, product_id = make_user(), make_product()
+    shopping_cart.add_item(user_id, product_id, 6)
+    assert shopping_cart.remove_item(user_id, product_id) == 6
+    assert shopping_cart.remove_item(user_id, product_id) is None
+
+
+def test_add_to_cart_route_sums_quantities(client, app, make_user, make_product):
+    user_id, product_id = make_user(), make_product()
+    login(client, user_id)
+    for quantity in (1, 2):
+        assert client.post('/add_to_cart', data={'product_id': product_id, 'quantity': quantity}).status_code == 302
+    with app.app_context():
+        assert _quantities(user_id) == [(product_id, 3)]
@@ -0,0 +1,44 @@
+import time
+
+from app import db
+from models import Category
+from cache import TTLCache
+import catalog
+import query_profiler
+
+
+def test_categories_are_read_once_and_dropped_on_commit(app_context):
+    catalog.get_categories()
+    with query_profiler.count_queries() as log:
+        names = [category.name for category in catalog.get_categories()]
+    assert len(log) == 0
+    assert 'Books' in names
+
+    category = Category(name='Cached Category Test', description='')
+    db.session.add(category)
+    db.session.commit()
+    assert catalog.category_name(category.id) == 'Cached Category Test'
+
+
+def test_rolled_back_write_keeps_the_cache(app_context):
+    catalog.get_categories()
+    db.session.add(Category(name='Rolled Back Category', description=''))
+    db.session.flush()
+    db.session.rollback()
+    with query_profiler.count_queries() as log:
+        names = [category.name for category in catalog.get_categories()]
+    assert len(log) == 0
+    assert 'Rolled Back Category' not in names
+
+
+def test_ttl_cache_expires_and_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=0.05)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1  # 'b' is now the least recently used
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    time.sleep(0.06)
+    assert cache.get('a') is None
+    assert cache.get_or_set('a', lambda: 4) == 4
@@ -0,0 +1,29 @@
+import os
+import sys
+import sqlite3
+import subprocess
+
+from models import Category, Product
+from tests.conftest import ROOT
+
+
+def test_importing_the_app_leaves_the_database_alone(tmp_path):
+    path = tmp_path / 'untouched.db'
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{path}')
+    subprocess.run([sys.executable, '-c', 'import main'], cwd=ROOT, env=env, check=True)
+    with sqlite3.connect(path) as connection:
+        assert connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall() == []
+
+
+def test_init_and_seed_commands_can_run_again(app):
+    runner = app.test_cli_runner()
+    with app.app_context():
+        categories, products = Category.query.count(), Product.query.count()
+
+    result = runner.invoke(args=['init-db'])
+    assert result.exit_code == 0 and 'Database initialized' in result.output
+    result = runner.invoke(args=['seed-db'])
+    assert result.exit_code == 0 and 'Sample data loaded' in result.output
+
+    with app.app_context():
+        assert (Category.query.count(), Product.query.count()) == (categories, products)
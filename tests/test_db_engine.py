@@ -0,0 +1,42 @@
+import logging
+
+from app import db
+import db_engine
+
+
+def _config(app, **overrides):
+    return dict(app.config, **overrides)
+
+
+def test_sqlite_uses_the_default_pool(app):
+    assert db_engine.engine_options('sqlite:///shop.db', app.config) == {}
+
+
+def test_postgresql_gets_a_sized_pool_and_statement_timeout(app):
+    config = _config(app, DB_POOL_SIZE=7, DB_MAX_OVERFLOW=3, DB_STATEMENT_TIMEOUT_MS=5000, DB_PREPARE_THRESHOLD=None)
+    options = db_engine.engine_options('postgresql://shop@db/shop', config)
+    assert (options['pool_size'], options['max_overflow']) == (7, 3)
+    assert options['connect_args'] == {'options': '-c statement_timeout=5000'}
+
+
+def test_prepare_threshold_needs_psycopg_3(app, caplog):
+    config = _config(app, DB_STATEMENT_TIMEOUT_MS=0, DB_PREPARE_THRESHOLD=5)
+    options = db_engine.engine_options('postgresql+psycopg://shop@db/shop', config)
+    assert options['connect_args'] == {'prepare_threshold': 5}
+
+    with caplog.at_level(logging.WARNING):
+        options = db_engine.engine_options('postgresql+psycopg2://shop@db/shop', config)
+    assert 'connect_args' not in options
+    assert 'DB_PREPARE_THRESHOLD needs the psycopg 3 driver' in caplog.text
+
+
+def test_other_backends_are_pinged_and_recycled(app):
+    options = db_engine.engine_options('mysql://shop@db/shop', _config(app, DB_POOL_RECYCLE=120))
+    assert options == {'pool_recycle': 120, 'pool_pre_ping': True}
+
+
+def test_sqlite_connections_get_the_pragmas(app_context):
+    with db.engine.connect() as connection:
+        assert connection.exec_driver_sql('PRAGMA journal_mode').scalar() == 'wal'
+        assert connection.exec_driver_sql('PRAGMA synchronous').scalar() == 1  # NORMAL
+        assert connection.exec_driver_sql('PRAGMA busy_timeout').scalar() > 0
@@ -0,0 +1,37 @@
+from flask import session
+
+from app import db
+from models import Product
+import fragments
+
+
+def test_card_is_rendered_once(app, make_product):
+    product_id = make_product(name='Fragment Kettle', price=12.5)
+    with app.test_request_context('/'):
+        product = db.session.get(Product, product_id)
+        first = fragments.cached_product_card(product, 'listing')
+        product.name = 'Renamed without committing'
+        assert fragments.cached_product_card(product, 'listing') is first
+        db.session.rollback()
+    assert 'Fragment Kettle' in first and '$12.50' in first
+
+
+def test_product_commit_rerenders_cards(app, make_product):
+    product_id = make_product(price=3.0)
+    with app.test_request_context('/'):
+        product = db.session.get(Product, product_id)
+        assert '$3.00' in fragments.cached_product_card(product, 'featured')
+        product.price = 4.0
+        db.session.commit()
+    with app.test_request_context('/'):
+        product = db.session.get(Product, product_id)
+        assert '$4.00' in fragments.cached_product_card(product, 'featured')
+
+
+def test_accessibility_mode_gets_its_own_card(app, make_product):
+    product_id = make_product()
+    with app.test_request_context('/'):
+        product = db.session.get(Product, product_id)
+        default = fragments.cached_product_card(product, 'listing')
+        session['accessibility'] = {'high_contrast': True}
+        assert fragments.cached_product_card(product, 'listing') is not default
@@ -0,0 +1,131 @@
+import hmac
+import json
+import time
+import hashlib
+
+import pytest
+
+from app import db
+from models import CartItem, Order, PaymentSession, Product, WebhookEvent
+import fulfillment
+from tests.conftest import unique
+
+SECRET = 'whsec_test'
+
+
+def _paid_event(stripe_session_id, event_type='checkout.session.completed'):
+    return {
+        'id': unique('evt'),
+        'type': event_type,
+        'data': {'object': {
+            'id': stripe_session_id,
+            'payment_status': 'paid',
+            'customer_details': {'email': 'buyer@example.com', 'name': 'Buyer', 'address': {'line1': '1 Test Street'}},
+        }},
+    }
+
+
+def _record_checkout(user_id, product_id, quantity=2):
+    stripe_session_id = unique('cs_test')
+    product = db.session.get(Product, product_id)
+    fulfillment.record_checkout(stripe_session_id, user_id, [{'product': product, 'quantity': quantity}],
+                                product.price * quantity)
+    db.session.commit()
+    return stripe_session_id
+
+
+def _event_row(event):
+    return WebhookEvent.query.filter_by(event_id=event['id']).one()
+
+
+def test_enqueue_event_ignores_duplicates_and_other_types(app_context):
+    event = _paid_event(unique('cs_test'))
+    assert fulfillment.enqueue_event(event)
+    assert not fulfillment.enqueue_event(event)
+    assert not fulfillment.enqueue_event(dict(event, id=unique('evt'), type='charge.refunded'))
+    assert WebhookEvent.query.filter_by(event_id=event['id']).count() == 1
+
+
+def test_worker_fulfills_queued_checkout(app_context, make_user, make_product):
+    user_id = make_user()
+    product_id = make_product(price=4.0)
+    stripe_session_id = _record_checkout(user_id, product_id)
+    db.session.add(CartItem(user_id=user_id, product_id=product_id, quantity=2))
+    db.session.commit()
+    assert fulfillment.order_for_session(stripe_session_id) == (True, None)
+
+    event = _paid_event(stripe_session_id)
+    fulfillment.enqueue_event(event)
+    fulfillment.process_pending_events()
+
+    row = _event_row(event)
+    assert (row.status, row.attempts) == ('done', 1)
+    known, order_id = fulfillment.order_for_session(stripe_session_id)
+    order = db.session.get(Order, order_id)
+    assert known and (order.user_id, order.total_amount, order.status) == (user_id, 8.0, 'Paid')
+    assert CartItem.query.filter_by(user_id=user_id).count() == 0
+
+
+def test_fulfilling_a_session_twice_writes_one_order(app_context, make_user, make_product):
+    stripe_session_id = _record_checkout(make_user(), make_product())
+    first = fulfillment.fulfill_session(stripe_session_id, None, None, None)
+    second = fulfillment.fulfill_session(stripe_session_id, None, None, None)
+    assert first == second
+    assert PaymentSession.query.filter_by(stripe_session_id=stripe_session_id).one().order_id == first
+
+
+def test_failing_event_is_retried_then_parked(app_context, monkeypatch):
+    monkeypatch.setattr(fulfillment, 'MAX_ATTEMPTS', 2)
+    event = _paid_event(unique('cs_unknown'))
+    fulfillment.enqueue_event(event)
+
+    fulfillment.process_pending_events()
+    row = _event_row(event)
+    assert (row.status, row.attempts) == ('pending', 1)
+    assert 'No checkout recorded' in row.last_error
+
+    fulfillment.process_pending_events()
+    db.session.refresh(row)
+    assert (row.status, row.attempts) == ('failed', 2)
+
+
+def _signature(payload, secret=SECRET, age=0):
+    timestamp = int(time.time()) - age
+    digest = hmac.new(secret.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256).hexdigest()
+    return f't={timestamp},v1={digest}'
+
+
+@pytest.fixture
+def webhook_secret(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'STRIPE_WEBHOOK_SECRET', SECRET)
+
+
+def test_webhook_queues_signed_events(client, webhook_secret, app_context):
+    event = _paid_event(unique('cs_test'))
+    payload = json.dumps(event)
+    response = client.post('/stripe/webhook', data=payload, content_type='application/json',
+                           headers={'Stripe-Signature': _signature(payload)})
+    assert response.status_code == 200
+    assert _event_row(event).status == 'pending'
+
+
+def test_webhook_rejects_bad_signatures(client, webhook_secret, app_context):
+    event = _paid_event(unique('cs_test'))
+    payload = json.dumps(event)
+    response = client.post('/stripe/webhook', data=payload, content_type='application/json',
+                           headers={'Stripe-Signature': _signature(payload, secret='whsec_other')})
+    assert response.status_code == 400
+    assert WebhookEvent.query.filter_by(event_id=event['id']).count() == 0
+
+
+def test_webhook_rejects_replayed_old_signatures(client, webhook_secret, app_context):
+    event = _paid_event(unique('cs_test'))
+    payload = json.dumps(event)
+    response = client.post('/stripe/webhook', data=payload, content_type='application/json',
+                           headers={'Stripe-Signature': _signature(payload, age=3600)})
+    assert response.status_code == 400
+    assert WebhookEvent.query.filter_by(event_id=event['id']).count() == 0
+
+
+def test_webhook_is_not_found_without_a_secret(client):
+    assert client.post('/stripe/webhook', data='{}').status_code == 404
@@ -0,0 +1,31 @@
+from collections import defaultdict
+
+from benchmarks import funnel
+
+
+def test_virtual_user_completes_every_step(app, make_product):
+    products = [(make_product(name=f'Funnel Lamp {n}'), f'Funnel Lamp {n}') for n in range(3)]
+    samples, errors = defaultdict(list), defaultdict(int)
+
+    def record(name, seconds, ok):
+        samples[name].append(seconds)
+        if not ok:
+            errors[name] += 1
+
+    funnel.run_user(funnel.InProcessClient(app), products, 2, record)
+
+    assert set(samples) == set(funnel.STEPS)
+    assert len(samples['add_to_cart']) == 4
+    assert dict(errors) == {}
+
+
+def test_summarize_reports_percentiles_per_step():
+    samples = {'index': [n / 1000 for n in range(100, 0, -1)], 'search': [0.5]}
+    results = funnel.summarize(samples, {'index': 2}, elapsed=10.0)
+
+    assert list(results) == ['index', 'search']
+    index = results['index']
+    assert (index['count'], index['errors'], index['throughput']) == (100, 2, 10.0)
+    assert (index['p50_ms'], index['p95_ms'], index['p99_ms']) == (50.0, 95.0, 99.0)
+    assert results['search']['p99_ms'] == 500.0
+    assert funnel.percentile([], 0.5) == 0.0
@@ -0,0 +1,40 @@
+from app import db
+from models import Product
+import catalog
+
+
+def test_revalidation_gets_not_modified(client):
+    first = client.get('/products')
+    assert first.status_code == 200 and first.headers['ETag']
+    assert first.cache_control.public and first.cache_control.s_maxage
+
+    again = client.get('/products', headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+    assert again.headers['ETag'] == first.headers['ETag']
+
+
+def test_catalog_write_changes_the_etag(client, app, make_product):
+    product_id = make_product()
+    etag = client.get(f'/product/{product_id}').headers['ETag']
+    with app.app_context():
+        version = catalog.catalog_version()
+        db.session.get(Product, product_id).price = 99.0
+        db.session.commit()
+    with app.app_context():
+        assert catalog.catalog_version() == version + 1
+
+    response = client.get(f'/product/{product_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_session_state_makes_pages_private(client, make_product):
+    etag = client.get('/products').headers['ETag']
+    client.post('/add_to_cart', data={'product_id': make_product(), 'quantity': 1})
+    # The page showing the "added to cart" message is never cached
+    assert 'ETag' not in client.get('/products').headers
+
+    response = client.get('/products', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.cache_control.private and response.cache_control.no_cache
+    assert 'Cookie' in response.vary
@@ -0,0 +1,37 @@
+from app import db
+from models import User
+import accounts
+import query_profiler
+from tests.conftest import login
+
+
+def test_identity_is_loaded_once(app_context, make_user):
+    user_id = make_user()
+    with query_profiler.count_queries() as log:
+        first = accounts.load_identity(user_id)
+        second = accounts.load_identity(user_id)
+    assert len(log) == 1
+    assert first is second and first.id == user_id and first.is_authenticated
+
+
+def test_committing_a_user_refreshes_its_identity(app_context, make_user):
+    user_id = make_user()
+    accounts.load_identity(user_id)
+    db.session.get(User, user_id).accessibility_prefs = {'high_contrast': True}
+    db.session.commit()
+    assert accounts.load_identity(user_id).accessibility_prefs == {'high_contrast': True}
+
+
+def test_unknown_user_is_not_logged_in(app_context):
+    assert accounts.load_identity(10 ** 9) is None
+
+
+def test_logged_in_request_uses_the_cached_identity(client, app, make_user):
+    user_id = make_user()
+    login(client, user_id)
+    with app.app_context():
+        username = accounts.load_identity(user_id).username
+    with query_profiler.count_queries() as log:
+        response = client.get('/')
+    assert username.encode() in response.data
+    assert not any('FROM user' in statement for _, statement, _ in log.statements)
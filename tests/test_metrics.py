@@ -0,0 +1,52 @@
+import pytest
+
+import metrics
+
+
+@pytest.fixture
+def metrics_token(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', 'scrape-token')
+    return {'Authorization': 'Bearer scrape-token'}
+
+
+def _requests(endpoint, status):
+    return dict(metrics.REQUESTS._values).get((endpoint, str(status)), 0)
+
+
+def test_metrics_are_not_found_without_a_token(client):
+    assert client.get('/metrics').status_code == 404
+    assert client.get('/metrics', headers={'Authorization': 'Bearer '}).status_code == 404
+
+
+def test_metrics_need_the_token(client, metrics_token):
+    assert client.get('/metrics').status_code == 404
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 404
+
+    client.get('/products')
+    response = client.get('/metrics', headers=metrics_token)
+    assert response.status_code == 200
+    assert 'http_requests_total{endpoint="products",status="200"}' in response.text
+    assert 'db_statements_total{endpoint="products"}' in response.text
+
+
+def _fail(*args, **kwargs):
+    raise RuntimeError('boom')
+
+
+@pytest.mark.parametrize('propagate', [True, False])
+def test_unhandled_exceptions_are_counted_once_as_500(client, app, monkeypatch, propagate):
+    monkeypatch.setitem(app.view_functions, 'payment_cancel', _fail)
+    monkeypatch.setitem(app.config, 'PROPAGATE_EXCEPTIONS', propagate)
+    before = _requests('payment_cancel', 500)
+    if propagate:
+        with pytest.raises(RuntimeError):
+            client.get('/payment-cancel')
+    else:
+        assert client.get('/payment-cancel').status_code == 500
+    assert _requests('payment_cancel', 500) == before + 1
+
+
+def test_server_timing_header(client, app, monkeypatch):
+    monkeypatch.setitem(app.config, 'SERVER_TIMING', True)
+    timing = client.get('/products').headers['Server-Timing']
+    assert timing.startswith('app;dur=') and 'queries"' in timing and 'tpl;dur=' in timing
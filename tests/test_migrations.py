@@ -0,0 +1,63 @@
+from sqlalchemy import inspect, text
+
+from app import db
+from models import CartItem, Product, SchemaVersion
+import migrations
+import search
+
+
+def _set_version(version):
+    db.session.execute(SchemaVersion.__table__.update().where(SchemaVersion.id == 1).values(version=version))
+    db.session.commit()
+
+
+def _index_names(table):
+    return {index['name'] for index in inspect(db.engine).get_indexes(table)}
+
+
+def test_upgrade_merges_duplicate_cart_lines(app_context, make_user, make_product):
+    user_id, product_id = make_user(), make_product()
+    db.session.execute(text('DROP INDEX uq_cart_item_user_product'))
+    db.session.execute(text('INSERT INTO cart_item (user_id, product_id, quantity) VALUES (:u, :p, 2), (:u, :p, 3)'),
+                       {'u': user_id, 'p': product_id})
+    _set_version(2)
+
+    assert migrations.upgrade() == [3, 4]
+    assert migrations.current_version() == migrations.LATEST_VERSION
+    assert [line.quantity for line in CartItem.query.filter_by(user_id=user_id)] == [5]
+    assert 'uq_cart_item_user_product' in _index_names('cart_item')
+
+
+def test_each_migration_commits_once_with_its_version(app_context, monkeypatch, make_product):
+    product_id = make_product(name='Migrated Lantern')
+    db.session.execute(text(f'DROP TABLE {search.FTS_TABLE}'))
+    for suffix in ('ai', 'ad', 'au'):
+        db.session.execute(text(f'DROP TRIGGER {search.FTS_TABLE}_{suffix}'))
+    _set_version(0)
+
+    commits = []
+    real_commit = db.session.commit
+
+    def commit():
+        commits.append(db.session.get(SchemaVersion, 1).version)
+        real_commit()
+
+    monkeypatch.setattr(db.session, 'commit', commit)
+    assert migrations.upgrade() == [1, 2, 3, 4]
+    assert commits == [1, 2, 3, 4]
+
+    query, _ = search.search_products(Product.query, 'migrated lantern')
+    assert [product.id for product in query] == [product_id]
+
+
+def test_main_queries_use_indexes(app_context):
+    results = migrations.check_query_plans()
+    assert results
+    assert [description for description, plan, uses_index in results if not uses_index] == []
+
+
+def test_upgrade_command_reports_up_to_date(app):
+    result = app.test_cli_runner().invoke(args=['db-upgrade'])
+    assert result.exit_code == 0
+    assert 'Database schema is up to date' in result.output
+    assert f'Schema version {migrations.LATEST_VERSION}' in result.output
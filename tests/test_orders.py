@@ -0,0 +1,86 @@
+import re
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from models import Order, OrderItem, PaymentSession, Product
+import fulfillment
+import orders
+import query_profiler
+from tests.conftest import unique
+
+
+def _lines(*product_ids):
+    return [{'product': db.session.get(Product, product_id), 'quantity': quantity}
+            for quantity, product_id in enumerate(product_ids, start=1)]
+
+
+def test_create_order_writes_order_and_items_in_two_statements(app_context, make_user, make_product):
+    user_id = make_user()
+    lines = _lines(make_product(price=5.0), make_product(price=7.0), make_product(price=1.0))
+    with query_profiler.count_queries() as log:
+        order_id = orders.create_order(user_id, lines, 22.0, '1 Test Street')
+    db.session.commit()
+    assert len(log) == 2
+
+    order = db.session.get(Order, order_id)
+    assert (order.user_id, order.total_amount, order.status) == (user_id, 22.0, 'Pending')
+    items = OrderItem.query.filter_by(order_id=order_id).order_by(OrderItem.id).all()
+    assert [(item.quantity, item.price) for item in items] == [(1, 5.0), (2, 7.0), (3, 1.0)]
+
+
+def test_idempotency_key_allows_only_one_order(app_context, make_user, make_product):
+    user_id = make_user()
+    key = orders.idempotency_key(user_id, orders.new_checkout_token())
+    lines = _lines(make_product())
+    order_id = orders.create_order(user_id, lines, 10.0, 'Street', idempotency_key=key)
+    db.session.commit()
+
+    with pytest.raises(IntegrityError):
+        orders.create_order(user_id, lines, 10.0, 'Street', idempotency_key=key)
+        db.session.flush()
+    db.session.rollback()
+    assert orders.find_order_for_key(key) == order_id
+
+
+def test_idempotency_key_depends_on_owner_and_token():
+    token = orders.new_checkout_token()
+    assert orders.idempotency_key(1, token) == orders.idempotency_key(1, token)
+    assert orders.idempotency_key(1, token) != orders.idempotency_key(2, token)
+    assert orders.idempotency_key(1, None) is None
+
+
+def _checkout(client):
+    token = re.search(rb'name="checkout_token" value="(\w+)"', client.get('/checkout').data).group(1).decode()
+    return {'name': 'Test Buyer', 'email': f"{unique('buyer')}@example.com", 'address': '1 Test Street',
+            'checkout_token': token}
+
+
+def test_resubmitted_order_form_places_one_order(client, app, make_product):
+    client.post('/add_to_cart', data={'product_id': make_product(price=3.0), 'quantity': 2})
+    form = _checkout(client)
+    first = client.post('/process_order', data=form)
+    assert first.status_code == 302 and '/confirmation/' in first.location
+    second = client.post('/process_order', data=form)
+    assert second.location == first.location
+
+    order_id = int(first.location.rsplit('/', 1)[1])
+    with app.app_context():
+        assert db.session.get(Order, order_id).total_amount == 6.0
+        assert Order.query.filter_by(user_id=db.session.get(Order, order_id).user_id).count() == 1
+    assert client.get('/cart').data.count(b'/remove_from_cart/') == 0
+
+
+def test_retried_checkout_keeps_first_cart_snapshot(app_context, make_user, make_product):
+    user_id = make_user()
+    stripe_session_id = unique('cs_test')
+    first, second = _lines(make_product(price=2.0)), _lines(make_product(price=9.0))
+    fulfillment.record_checkout(stripe_session_id, user_id, first, 2.0)
+    db.session.commit()
+    fulfillment.record_checkout(stripe_session_id, user_id, second, 9.0)
+    db.session.commit()
+
+    payment = PaymentSession.query.filter_by(stripe_session_id=stripe_session_id).one()
+    assert payment.total_amount == 2.0
+    assert [line['product_id'] for line in payment.line_items] == [first[0]['product'].id]
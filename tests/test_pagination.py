@@ -0,0 +1,94 @@
+import re
+import json
+import base64
+
+import pytest
+
+from models import Product
+import pagination
+import search
+from tests.conftest import unique
+
+
+def _cursor(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+def _page_ids(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    return [int(product_id) for product_id in re.findall(rb'href="/product/(\d+)"', response.data)]
+
+
+@pytest.mark.parametrize('payload', [
+    ['newest', []],
+    ['newest', [None]],
+    ['newest', [{}]],
+    ['newest', [True]],
+    ['newest', ['7']],
+    ['newest', [1, 2]],
+    ['price_low', [1]],
+    ['price_low', ['cheap', 1]],
+    ['price_low', [float('nan'), 1]],
+    ['price_low', [1.5, 2.5]],
+    ['price_high', [1, 2]],  # wrong sort for the page
+    'not a list',
+])
+def test_malformed_cursor_restarts_at_the_first_page(client, payload):
+    sort = 'price_low' if 'price_low' in str(payload) else 'newest'
+    first_page = _page_ids(client, f'/products?sort={sort}&per_page=3')
+    assert _page_ids(client, f'/products?sort={sort}&per_page=3&after={_cursor(payload)}') == first_page
+
+
+def test_garbage_cursor_restarts_at_the_first_page(client):
+    assert _page_ids(client, '/products?after=%%%not-base64') == _page_ids(client, '/products')
+
+
+def test_decode_cursor_checks_count_and_types(app_context):
+    _, keys = pagination.sort_keys('price_low')
+    assert pagination.decode_cursor(_cursor(['price_low', [9.5, 3]]), 'price_low', keys) == [9.5, 3]
+    assert pagination.decode_cursor(_cursor(['price_low', [9, 3]]), 'price_low', keys) == [9, 3]
+    assert pagination.decode_cursor(_cursor(['price_low', [9.5]]), 'price_low', keys) is None
+    assert pagination.decode_cursor(_cursor(['price_low', [9.5, 3.5]]), 'price_low', keys) is None
+
+
+def test_pages_walk_the_catalog_forward_and_back(app_context, client):
+    all_ids = [product.id for product in Product.query.order_by(Product.price, Product.id)]
+    seen = []
+    url = '/products?sort=price_low&per_page=2'
+    pages = []
+    while url:
+        response = client.get(url)
+        ids = [int(i) for i in re.findall(rb'href="/product/(\d+)"', response.data)]
+        pages.append((url, ids))
+        seen.extend(ids)
+        next_link = re.search(rb'href="([^"]*after=[^"]*)"', response.data)
+        url = next_link.group(1).decode().replace('&amp;', '&') if next_link else None
+    assert seen == all_ids
+
+    # The previous link of the second page leads back to the first page
+    second_page = client.get(pages[1][0])
+    previous = re.search(rb'href="([^"]*before=[^"]*)"', second_page.data).group(1).decode().replace('&amp;', '&')
+    assert _page_ids(client, previous) == pages[0][1]
+
+
+def test_relevance_sorted_search_walks_to_the_last_page(client, make_product):
+    word = unique('zephyrine').replace('-', '')
+    ids = {make_product(name=f'{word} lamp {n}', description=f'{word} ' * (n % 4 + 1)) for n in range(12)}
+    seen = []
+    url = f'/products?search={word}&per_page=5'
+    for _ in range(len(ids)):
+        response = client.get(url)
+        seen.extend(int(i) for i in re.findall(rb'href="/product/(\d+)"', response.data))
+        next_link = re.search(rb'href="([^"]*after=[^"]*)"', response.data)
+        if next_link is None:
+            break
+        url = next_link.group(1).decode().replace('&amp;', '&')
+    assert len(seen) == len(set(seen))
+    assert set(seen) == ids
+
+
+def test_relevance_cursor_decodes(app_context):
+    _, relevance = search.search_products(Product.query, 'lamp')
+    _, keys = pagination.sort_keys('relevance', relevance)
+    assert pagination.decode_cursor(_cursor(['relevance', [-1.25, 7]]), 'relevance', keys) == [-1.25, 7]
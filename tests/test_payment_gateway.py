@@ -0,0 +1,75 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import stripe_integration
+
+
+def test_fake_checkout_session_redirects_to_success_url(app):
+    session = stripe_integration.create_checkout_session(
+        [{'name': 'Mug', 'description': 'A mug', 'amount': 9.5, 'quantity': 2}],
+        'https://shop.test/success?session_id={CHECKOUT_SESSION_ID}', 'https://shop.test/cart',
+        idempotency_key='key-1')
+    assert session.id == 'cs_fake_key-1'
+    assert session.url == 'https://shop.test/success?session_id=cs_fake_key-1'
+
+
+def test_fake_session_can_be_retrieved_by_any_worker(app):
+    session = stripe_integration.retrieve_session('cs_fake_abc')
+    assert session.id == 'cs_fake_abc'
+    assert session.payment_status == 'paid'
+    assert stripe_integration.retrieve_session('cs_live_abc') is None
+
+
+class _SlowGateway:
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.running = 0
+        self.most_running = 0
+        self._lock = threading.Lock()
+
+    def retrieve_session(self, session_id):
+        with self._lock:
+            self.running += 1
+            self.most_running = max(self.most_running, self.running)
+        time.sleep(self.seconds)
+        with self._lock:
+            self.running -= 1
+        return session_id
+
+
+@pytest.fixture
+def limited_gateway(monkeypatch):
+    """Swap in a slow gateway behind a concurrency limit of one call."""
+    def install(seconds, deadline=30):
+        gateway = _SlowGateway(seconds)
+        executor = ThreadPoolExecutor(max_workers=1)
+        monkeypatch.setattr(stripe_integration, '_gateway', gateway)
+        monkeypatch.setattr(stripe_integration, '_executor', executor)
+        monkeypatch.setattr(stripe_integration, 'STRIPE_CALL_DEADLINE', deadline)
+        return gateway
+    yield install
+    if stripe_integration._executor is not None:
+        stripe_integration._executor.shutdown(wait=True)
+
+
+def test_thread_pool_limits_concurrent_calls(limited_gateway):
+    gateway = limited_gateway(0.05)
+    results = []
+    threads = [threading.Thread(target=lambda n=n: results.append(stripe_integration.retrieve_session(f'cs_{n}')))
+               for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(results) == ['cs_0', 'cs_1', 'cs_2', 'cs_3']
+    assert gateway.most_running == 1
+
+
+def test_call_gives_up_after_deadline(limited_gateway):
+    limited_gateway(0.5, deadline=0.05)
+    start = time.perf_counter()
+    assert stripe_integration.retrieve_session('cs_slow') is None
+    assert time.perf_counter() - start < 0.4
@@ -0,0 +1,59 @@
+from app import db
+from models import Product
+import product_names
+
+
+def test_index_tolerates_typos_and_partial_names():
+    index = product_names.ProductNameIndex()
+    index.add(1, 'Braille T-Shirt')
+    index.add(2, 'Audio Book Reader')
+    index.add(3, 'Audio Cookbook')
+    assert index.search('brail tshirt')[0].id == 1
+    assert index.search('the audio cook book')[0].id == 3
+    assert index.search('garden hose') == []
+
+
+def test_index_replaces_and_removes_names():
+    index = product_names.ProductNameIndex()
+    index.add(1, 'Tactile Kitchen Timer')
+    index.add(1, 'Talking Scale')
+    assert index.search('kitchen timer') == []
+    assert index.search('talking scale')[0].id == 1
+    index.remove(1)
+    assert len(index) == 0 and index.search('talking scale') == []
+
+
+def test_resolve_follows_committed_product_changes(app_context, make_product):
+    product_names.get_index()
+    product_id = make_product(name='Zebra Striped Magnifier')
+    assert product_names.resolve('zebra magnifier').id == product_id
+
+    db.session.get(Product, product_id).name = 'Ocelot Spotted Magnifier'
+    db.session.commit()
+    assert product_names.resolve('ocelot magnifier').id == product_id
+    match = product_names.resolve('zebra striped')
+    assert match is None or match.id != product_id
+
+
+def test_voice_command_endpoint_returns_the_product_id(client, make_product):
+    product_id = make_product(name='Quokka Audio Speaker')
+    data = client.post('/process_voice_command', data={'command': 'add quokka speaker to cart'}).get_json()
+    assert data['action'] == 'cart'
+    assert data['data']['product_id'] == product_id
+
+
+def test_lookups_score_at_most_max_candidates(monkeypatch):
+    adjectives = ['braille', 'audio', 'large', 'tactile', 'talking', 'soft', 'bright', 'portable']
+    nouns = ['lamp', 'shirt', 'watch', 'clock', 'reader', 'scale', 'timer', 'speaker']
+    index = product_names.ProductNameIndex()
+    for product_id in range(20000):
+        name = f'{adjectives[product_id % 8]} {nouns[product_id // 8 % 8]} {adjectives[product_id // 64 % 8]} {product_id}'
+        index.add(product_id, name)
+
+    scored = []
+    candidates = index._candidates
+    monkeypatch.setattr(index, '_candidates', lambda *args: scored.append(len(candidates(*args))) or candidates(*args))
+    for text in ('lamp', 'braille shirt', 'talking clock soft', 'brail shrt', 'tactile 1234'):
+        assert index.search(text)
+    assert scored and max(scored) <= product_names.MAX_CANDIDATES
+    assert index.search('tactile lamp bright 19843')[0].id == 19843
@@ -0,0 +1,79 @@
+import logging
+
+import pytest
+
+from app import db
+from models import CartItem, Product
+import accounts
+import catalog
+import query_profiler
+from tests.conftest import login
+
+
+def _cold_caches():
+    # A worker's first request: nothing cached yet
+    accounts._identities.clear()
+    catalog.invalidate_categories()
+
+
+@pytest.fixture
+def logged_in_with_cart(client, app, make_user, make_product):
+    user_id = make_user()
+    with app.app_context():
+        db.session.add_all(CartItem(user_id=user_id, product_id=make_product(), quantity=1) for _ in range(50))
+        db.session.commit()
+    login(client, user_id)
+    return client
+
+
+def test_fingerprint_ignores_literals_and_in_lists():
+    assert (query_profiler.fingerprint("SELECT * FROM t WHERE id IN (?, ?, ?) AND name = 'x'  AND n > 3")
+            == query_profiler.fingerprint("SELECT * FROM t WHERE id IN (?) AND name = 'y' AND n > 40")
+            == 'SELECT * FROM t WHERE id IN (?) AND name = ? AND n > ?')
+
+
+def test_assert_max_queries_raises_under_testing(app_context):
+    with pytest.raises(query_profiler.QueryBudgetExceeded, match='issued 2 queries, over its budget of 1'):
+        with query_profiler.assert_max_queries(1):
+            Product.query.first()
+            Product.query.count()
+
+
+def test_cart_of_50_lines_on_cold_caches(logged_in_with_cart):
+    _cold_caches()
+    with query_profiler.assert_max_queries(3):
+        response = logged_in_with_cart.get('/cart')
+    assert response.status_code == 200
+    assert response.data.count(b'/remove_from_cart/') == 50
+
+
+def test_checkout_on_cold_caches(logged_in_with_cart):
+    _cold_caches()
+    with query_profiler.assert_max_queries(3):
+        assert logged_in_with_cart.get('/checkout').status_code == 200
+
+
+@pytest.mark.parametrize('path', ['/', '/products', '/products?search=chair', '/product/1'])
+def test_catalog_pages_stay_in_budget_on_cold_caches(client, make_user, path):
+    login(client, make_user())
+    _cold_caches()
+    assert client.get(path).status_code == 200
+
+
+def test_n_plus_one_is_reported(client, monkeypatch, caplog):
+    real_get_categories = catalog.get_categories
+
+    def get_categories_one_by_one():
+        # A regression that loads each listed product's name with its own query
+        for product_id in range(1, 7):
+            db.session.query(Product.name).filter_by(id=product_id).scalar()
+        return real_get_categories()
+
+    monkeypatch.setattr(catalog, 'get_categories', get_categories_one_by_one)
+    monkeypatch.setattr(query_profiler, '_over_budget', lambda log, max_queries, what: None)
+    with caplog.at_level(logging.WARNING):
+        assert client.get('/products').status_code == 200
+    warnings = [record.getMessage() for record in caplog.records if 'Possible N+1' in record.getMessage()]
+    assert len(warnings) == 1
+    assert warnings[0].startswith('Possible N+1 in products: 6x SELECT product.name')
+    assert 'test_query_profiler.py' in warnings[0]
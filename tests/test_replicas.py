@@ -0,0 +1,75 @@
+import sqlite3
+import time
+
+import pytest
+from flask import g
+from sqlalchemy import create_engine, make_url
+
+from app import db
+from models import Category, User
+import catalog
+import replicas
+from tests.conftest import login, unique
+
+
+@pytest.fixture
+def replica(app, tmp_path, monkeypatch):
+    """
+    Route read-only views to a snapshot copy of the test database.
+
+    Anything written after the fixture runs exists on the primary only, like
+    rows a lagging replica hasn't received yet.
+    """
+    path = tmp_path / 'replica.db'
+    with sqlite3.connect(make_url(app.config['SQLALCHEMY_DATABASE_URI']).database) as primary, \
+            sqlite3.connect(path) as copy:
+        primary.backup(copy)
+    engine = create_engine(f'sqlite:///{path}')
+    monkeypatch.setitem(app.extensions, 'replicas', replicas.ReplicaRouter([replicas.Replica(engine)], 30))
+    yield engine
+    engine.dispose()
+
+
+def test_read_only_views_read_from_the_replica(client, replica, make_product):
+    product_id = make_product()
+    assert client.get(f'/product/{product_id}').status_code == 404
+
+
+def test_pinned_client_reads_from_the_primary(client, replica, make_product):
+    product_id = make_product()
+    client.set_cookie(replicas.PIN_COOKIE, str(int(time.time()) + 60))
+    assert client.get(f'/product/{product_id}').status_code == 200
+
+
+def test_unhealthy_replica_falls_back_to_the_primary(client, app, tmp_path, monkeypatch, make_product):
+    engine = create_engine(f'sqlite:///{tmp_path}/missing/replica.db')
+    monkeypatch.setitem(app.extensions, 'replicas', replicas.ReplicaRouter([replicas.Replica(engine)], 30))
+    product_id = make_product()
+    assert client.get(f'/product/{product_id}').status_code == 200
+
+
+def test_category_cache_is_filled_from_the_primary(client, app, replica):
+    with app.app_context():
+        category = Category(name=unique('Category'), description='Only on the primary')
+        db.session.add(category)
+        db.session.commit()
+        category_id = category.id
+
+    assert client.get('/products').status_code == 200
+    assert category_id in catalog.get_category_map()
+
+
+def test_identity_cache_is_filled_from_the_primary(client, app, replica, make_user):
+    user_id = make_user()
+    with app.app_context():
+        username = db.session.get(User, user_id).username
+    login(client, user_id)
+    assert username.encode() in client.get('/').data
+
+
+def test_on_primary_restores_read_only(app):
+    with app.test_request_context('/'):
+        with replicas.reading():
+            with replicas.on_primary():
+                assert not g.read_only
+            assert g.read_only
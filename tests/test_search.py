@@ -0,0 +1,45 @@
+from app import db
+from models import Product
+import search
+
+
+def _names(search_query):
+    query, _ = search.search_products(Product.query, search_query)
+    return {product.name for product in query}
+
+
+def test_every_word_must_match_as_a_prefix(app_context):
+    assert 'Braille T-Shirt' in _names('brail shirt')
+    assert 'Braille T-Shirt' not in _names('braille smartphone')
+
+
+def test_matches_description_and_audio_description(app_context):
+    assert 'Tactile Kitchen Timer' in _names('vibration')
+
+
+def test_empty_search_matches_nothing(app_context):
+    assert _names('  !! ') == set()
+
+
+def test_index_follows_product_updates(app_context, make_product):
+    product_id = make_product(name='Searchable Gadget')
+    assert 'Searchable Gadget' in _names('searchable')
+
+    db.session.get(Product, product_id).name = 'Renamed Gadget'
+    db.session.commit()
+    assert 'Renamed Gadget' not in _names('searchable')
+    assert 'Renamed Gadget' in _names('renamed')
+
+
+def test_relevance_ranks_better_matches_first(app_context, make_product):
+    make_product(name='Ranking Ranking Widget', description='ranking ranking ranking')
+    make_product(name='Plain Widget', description='mentions ranking once')
+    query, relevance = search.search_products(Product.query, 'ranking')
+    names = [product.name for product in query.order_by(relevance)]
+    assert names.index('Ranking Ranking Widget') < names.index('Plain Widget')
+
+
+def test_products_page_searches(client, app):
+    response = client.get('/products?search=audio')
+    assert response.status_code == 200
+    assert b'Audio Cookbook' in response.data
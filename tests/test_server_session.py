@@ -0,0 +1,93 @@
+import os
+
+import pytest
+from flask import Flask, session
+
+import server_session
+
+
+@pytest.fixture
+def session_app(tmp_path):
+    """A bare app with the 'sqlite' session backend, which the shop app leaves off by default."""
+    app = Flask(__name__, instance_path=str(tmp_path))
+    app.secret_key = 'test-secret'
+    app.config.update(SESSION_BACKEND='sqlite', SESSION_DB_PATH=None)
+    server_session.init_app(app)
+
+    @app.route('/put/<int:count>')
+    def put(count):
+        session['cart'] = {str(n): n for n in range(count)}
+        return ''
+
+    @app.route('/get')
+    def get():
+        return str(len(session.get('cart', {})))
+
+    @app.route('/rotate')
+    def rotate():
+        session.regenerate()
+        return ''
+
+    return app
+
+
+def _session_cookie(client):
+    return client.get_cookie('session')
+
+
+def test_cookie_backend_is_the_default(app):
+    assert app.config['SESSION_BACKEND'] == 'cookie'
+    assert not isinstance(app.session_interface, server_session.ServerSessionInterface)
+
+
+def test_cookie_holds_only_a_session_id(session_app, tmp_path):
+    client = session_app.test_client()
+    client.get('/put/500')
+    cookie = _session_cookie(client).value
+    assert len(cookie) < 100
+    assert client.get('/get').data == b'500'
+    assert os.path.exists(tmp_path / 'sessions.db')
+
+    # Changing the data keeps the same id, so no new cookie is sent
+    assert 'Set-Cookie' not in client.get('/put/3').headers
+    assert client.get('/get').data == b'3'
+
+
+def test_empty_session_gets_no_cookie(session_app):
+    client = session_app.test_client()
+    assert 'Set-Cookie' not in client.get('/get').headers
+
+
+def test_tampered_cookie_starts_a_new_session(session_app):
+    client = session_app.test_client()
+    client.get('/put/2')
+    client.set_cookie('session', _session_cookie(client).value + 'x')
+    assert client.get('/get').data == b'0'
+
+
+def test_regenerated_session_drops_the_old_id(session_app):
+    client = session_app.test_client()
+    client.get('/put/2')
+    old_cookie = _session_cookie(client).value
+    client.get('/rotate')
+    assert _session_cookie(client).value != old_cookie
+    assert client.get('/get').data == b'2'
+
+    client.set_cookie('session', old_cookie)
+    assert client.get('/get').data == b'0'
+
+
+def test_unknown_backend_is_rejected(tmp_path):
+    app = Flask(__name__, instance_path=str(tmp_path))
+    app.config.update(SESSION_BACKEND='redis', SESSION_DB_PATH=None)
+    with pytest.raises(ValueError):
+        server_session.init_app(app)
+
+
+def test_incomplete_store_cannot_be_created():
+    class LoadOnlyStore(server_session.SessionStore):
+        def load(self, sid):
+            return None
+
+    with pytest.raises(TypeError):
+        LoadOnlyStore()
@@ -0,0 +1,47 @@
+import pytest
+
+
+def _post(client, payload):
+    return client.post('/process_voice_commands', json=payload)
+
+
+def test_batch_parses_in_order_and_marks_duplicates(client):
+    response = _post(client, {'utterances': ['go to cart', {'text': 'Go to cart', 'confidence': 0.9}, 'hum']})
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert results[0]['data'] == {'location': 'cart'}
+    assert results[1]['duplicate'] and results[1]['confidence'] == 0.9
+    assert not results[2]['success']
+
+
+def test_low_confidence_utterances_are_skipped(client):
+    results = _post(client, {'utterances': [{'text': 'go back', 'confidence': 0.2}, 'go back'],
+                             'min_confidence': '0.5'}).get_json()['results']
+    assert results[0]['skipped']
+    assert results[1]['action'] == 'navigate'
+
+
+@pytest.mark.parametrize('payload', [
+    ['go to cart'],
+    'go to cart',
+    None,
+    {'utterances': 'go to cart'},
+    {'utterances': []},
+    {'utterances': ['go to cart'], 'min_confidence': 'high'},
+    {'utterances': ['go to cart'], 'min_confidence': [0.5]},
+    {'utterances': ['go to cart'], 'min_confidence': True},
+])
+def test_malformed_bodies_are_rejected(client, payload):
+    assert _post(client, payload).status_code == 400
+
+
+def test_too_many_utterances_are_rejected(client, app):
+    assert _post(client, {'utterances': ['go back'] * (app.config['VOICE_BATCH_LIMIT'] + 1)}).status_code == 400
+
+
+def test_malformed_utterances_get_an_error_entry(client):
+    response = _post(client, {'utterances': [{'text': 5}, 7, ['go back'], {'text': 'go back', 'confidence': 'x'}]})
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert all('error' in result for result in results[:3])
+    assert results[3]['action'] == 'navigate'
@@ -0,0 +1,37 @@
+import pytest
+
+import voice_commands
+
+
+@pytest.mark.parametrize('command, action, data', [
+    ('Search for braille books', 'search', {'search_term': 'braille books'}),
+    ('show me electronics products', 'navigate', {'location': 'category', 'category': 'electronics'}),
+    ('add the audio cookbook to my cart', 'cart', {'operation': 'add', 'product': 'the audio cookbook'}),
+    ('go to checkout', 'navigate', {'location': 'checkout'}),
+    ('next page', 'navigate', {'page': 'next'}),
+    ('go back', 'navigate', {'direction': 'back'}),
+    ('please increase text size', 'accessibility', {'setting': 'text_size', 'value': 'increase'}),
+    ('disable high contrast', 'accessibility', {'setting': 'high_contrast', 'value': False}),
+])
+def test_commands_map_to_actions(command, action, data):
+    result = voice_commands.process_command(command)
+    assert result['success']
+    assert (result['action'], result['data']) == (action, data)
+
+
+def test_unknown_command_fails():
+    assert not voice_commands.process_command('sing me a song')['success']
+
+
+def test_earlier_rules_win():
+    # "search" is tried before "add ... to cart"
+    assert voice_commands.process_command('search for add-ons to cart')['action'] == 'search'
+
+
+def test_parses_are_cached_but_results_are_fresh():
+    first = voice_commands.process_command('add tactile timer to cart')
+    first['data']['product_id'] = 1
+    hits = voice_commands._parse.cache_info().hits
+    second = voice_commands.process_command('  ADD tactile timer to cart ')
+    assert voice_commands._parse.cache_info().hits == hits + 1
+    assert 'product_id' not in second['data']
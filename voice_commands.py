@@ -1,7 +1,105 @@
 import re
 import logging
+from functools import lru_cache
 
 # This module processes voice commands for the e-commerce website
+#
+# The grammar is compiled once at import. Rules are tried in priority order
+# and the first one whose pattern occurs anywhere in the command wins. Each
+# rule keeps its own compiled pattern rather than being merged into one big
+# alternation: re.search can then skip ahead to the rule's leading literal,
+# which a merged ".*?(...)|.*?(...)" pattern cannot.
+
+PARSE_CACHE_SIZE = 1024
+
+
+def _search(groups):
+    search_term = groups['search_term'].strip()
+    return 'search', {'search_term': search_term}, f'Searching for {search_term}'
+
+
+def _category(groups):
+    category = groups['category'].strip()
+    return 'navigate', {'location': 'category', 'category': category}, f'Showing {category} products'
+
+
+def _cart(groups):
+    product = groups['product'].strip()
+    return 'cart', {'operation': 'add', 'product': product}, f'Adding {product} to your cart'
+
+
+def _go_to(groups):
+    location = groups['location']
+    return 'navigate', {'location': location}, f'Going to {location}'
+
+
+def _page(groups):
+    page = groups['page']
+    return 'navigate', {'page': page}, f'Going to {page} page'
+
+
+def _direction(groups):
+    direction = groups['direction']
+    return 'navigate', {'direction': direction}, f'Going {direction}'
+
+
+def _checkout(groups):
+    return 'navigate', {'location': 'checkout'}, 'Proceeding to checkout'
+
+
+def _text_size(groups):
+    change = groups['size_change']
+    return 'accessibility', {'setting': 'text_size', 'value': change}, f'{change.capitalize()}ing text size'
+
+
+def _high_contrast(groups):
+    enable = groups['contrast'] == 'enable'
+    return ('accessibility', {'setting': 'high_contrast', 'value': enable},
+            f'{"Enabling" if enable else "Disabling"} high contrast mode')
+
+
+def _voice_commands(groups):
+    enable = groups['voice'] == 'enable'
+    return ('accessibility', {'setting': 'voice_commands', 'value': enable},
+            f'{"Enabling" if enable else "Disabling"} voice commands')
+
+
+def _read_page(groups):
+    return 'accessibility', {'setting': 'read_page', 'value': True}, 'Reading page content'
+
+
+# Rules in priority order: (name, pattern, handler)
+_RULES = [
+    # Search commands
+    ('search', r'search (?:for )?(?P<search_term>.*)', _search),
+    # Category navigation
+    ('show_category', r'show (?:me )?(?P<category>.*?)(?:\s+products|category)', _category),
+    # Add to cart
+    ('add_to_cart', r'add (?P<product>.*?) to (?:my )?cart', _cart),
+    # Navigation commands
+    ('go_to', r'go to (?:my )?(?P<location>cart|checkout|home|products)', _go_to),
+    ('page_turn', r'(?:go to )?(?:the )?(?P<page>next|previous) page', _page),
+    ('history', r'go (?P<direction>back|forward)', _direction),
+    ('checkout', r'checkout|pay now|proceed to payment|complete(?: my)? purchase', _checkout),
+    # Accessibility commands
+    ('text_size', r'(?P<size_change>increase|decrease) text size', _text_size),
+    ('high_contrast', r'(?P<contrast>enable|disable) high contrast', _high_contrast),
+    ('voice_commands', r'(?P<voice>enable|disable) voice commands', _voice_commands),
+    ('read_page', r'(?:read|describe) (?:this|page)', _read_page),
+]
+
+_GRAMMAR = tuple((re.compile(pattern), handler) for _, pattern, handler in _RULES)
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse(command):
+    """Match a normalized command against the grammar, returning (handler, groups) or None."""
+    for pattern, handler in _GRAMMAR:
+        match = pattern.search(command)
+        if match:
+            return handler, match.groupdict()
+    return None
+
 
 def process_command(command_text):
     """
@@ -12,6 +110,7 @@ def process_command(command_text):
     - Show me [category]
     - Add [product] to cart
     - Go to [page name]
+    - Next/previous page
     - Increase/decrease text size
     - Enable/disable high contrast
     - Checkout
@@ -19,87 +118,13 @@ def process_command(command_text):
     - Complete purchase
     """
     command = command_text.lower().strip()
-    logging.debug(f"Processing voice command: {command}")
+    logging.debug("Processing voice command: %s", command)
     
-    # Search commands
-    search_match = re.search(r'search (?:for )?(.*)', command)
-    if search_match:
-        search_term = search_match.group(1).strip()
-        return {
-            'success': True,
-            'action': 'search',
-            'data': {'search_term': search_term},
-            'message': f'Searching for {search_term}'
-        }
-    
-    # Category navigation
-    category_match = re.search(r'show (?:me )?(.*?)(?:\s+products|category)', command)
-    if category_match:
-        category = category_match.group(1).strip()
-        return {
-            'success': True,
-            'action': 'navigate',
-            'data': {'location': 'category', 'category': category},
-            'message': f'Showing {category} products'
-        }
-    
-    # Add to cart
-    cart_match = re.search(r'add (.*?) to (?:my )?cart', command)
-    if cart_match:
-        product = cart_match.group(1).strip()
-        return {
-            'success': True,
-            'action': 'cart',
-            'data': {'operation': 'add', 'product': product},
-            'message': f'Adding {product} to your cart'
-        }
-    
-    # Navigation commands
-    nav_matches = {
-        r'go to (?:my )?(cart|checkout|home|products)': lambda m: (
-            'navigate', {'location': m.group(1)}, f'Going to {m.group(1)}'
-        ),
-        r'go (back|forward)': lambda m: (
-            'navigate', {'direction': m.group(1)}, f'Going {m.group(1)}'
-        ),
-        r'(checkout|pay now|proceed to payment|complete( my)? purchase)': lambda m: (
-            'navigate', {'location': 'checkout'}, 'Proceeding to checkout'
-        )
-    }
-    
-    for pattern, handler in nav_matches.items():
-        match = re.search(pattern, command)
-        if match:
-            action, data, message = handler(match)
-            return {'success': True, 'action': action, 'data': data, 'message': message}
-    
-    # Accessibility commands
-    accessibility_matches = {
-        r'(increase|decrease) text size': lambda m: (
-            'accessibility', {'setting': 'text_size', 'value': m.group(1)}, 
-            f'{m.group(1).capitalize()}ing text size'
-        ),
-        r'(enable|disable) high contrast': lambda m: (
-            'accessibility', 
-            {'setting': 'high_contrast', 'value': m.group(1) == 'enable'}, 
-            f'{"Enabling" if m.group(1) == "enable" else "Disabling"} high contrast mode'
-        ),
-        r'(enable|disable) voice commands': lambda m: (
-            'accessibility', 
-            {'setting': 'voice_commands', 'value': m.group(1) == 'enable'}, 
-            f'{"Enabling" if m.group(1) == "enable" else "Disabling"} voice commands'
-        ),
-        r'(read|describe) (this|page)': lambda m: (
-            'accessibility', {'setting': 'read_page', 'value': True},
-            'Reading page content'
-        )
-    }
-    
-    for pattern, handler in accessibility_matches.items():
-        match = re.search(pattern, command)
-        if match:
-            action, data, message = handler(match)
-            return {'success': True, 'action': action, 'data': data, 'message': message}
+    parsed = _parse(command)
+    if parsed is not None:
+        handler, groups = parsed
+        action, data, message = handler(groups)
+        return {'success': True, 'action': action, 'data': data, 'message': message}
     
     # If no command matched
     return {